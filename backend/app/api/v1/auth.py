@@ -8,7 +8,7 @@ from loguru import logger
 
 # 导入安全相关函数
 from app.core.security import get_current_user
-from app.core.hash_utils import get_student_id_for_display
+from app.core.hash_utils import get_student_id_for_display, hash_student_id
 from app.db.database import delete_session_by_hash
 from app.services.scheduler import scheduler
 
@@ -135,6 +135,14 @@ async def login_for_access_token(form_data: UserLogin, request: Request):
             client_ip=client_ip,
         )
 
+        # 登录成功后在后台预取本学期课程表，不影响登录响应
+        try:
+            from app.services.semester_timetable import semester_timetable
+
+            semester_timetable.schedule_prefetch(hash_student_id(form_data.student_id))
+        except Exception as e:
+            logger.warning(f"安排课程表预取失败: {e}")
+
         return {
             "access_token": access_token,
             "refresh_token": refresh_token,
@@ -304,6 +312,11 @@ async def logout(
 
         # 删除数据库中的session信息
         session_deleted = delete_session_by_hash(current_user_hash)
+
+        # 清除该用户的学期课程表缓存
+        from app.services.semester_timetable import semester_timetable
+
+        semester_timetable.invalidate(current_user_hash)
         if session_deleted:
             logger.info(f"用户 {current_user_hash} 的session信息已从数据库中删除")
         else:
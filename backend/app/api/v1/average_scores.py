@@ -1,13 +1,19 @@
-from typing import Optional, Dict, Any
-from fastapi import APIRouter, Query, Depends
+from typing import Optional, Dict, Any, Tuple
+from fastapi import APIRouter, Query, Depends, Request
 from pydantic import BaseModel
 from app.core.security import get_current_user
 from app.services.average_scores import average_scores_service
+from app.utils.http_cache import CachedJSONResponder, HTTP_CACHE_MAX_AGE
 from loguru import logger
 
 
 router = APIRouter()
 
+# 平均分为静态数据集，响应只取决于数据库版本和查询参数；接口需要登录，只允许私有缓存
+average_scores_responder = CachedJSONResponder(
+    "average-scores", cache_control=f"private, max-age={HTTP_CACHE_MAX_AGE}"
+)
+
 
 # Pydantic 响应模型
 class SemesterData(BaseModel):
@@ -33,6 +39,7 @@ class AverageScoreResponse(BaseModel):
     tags=["成绩"],
 )
 async def query_average_scores(
+    request: Request,
     course: str = Query(
         ...,
         description="课程名称或课程代码（必填，支持模糊查询，至少3个字符）",
@@ -54,6 +61,7 @@ async def query_average_scores(
     **权限要求：** 需要有效的JWT Token认证
     **模糊查询：** 所有查询参数都支持模糊匹配
     **长度限制：** 课程名称至少需要3个字符，教师姓名至少需要2个字符，提高查询成功率
+    **HTTP缓存：** 响应带有ETag，携带 If-None-Match 的重复请求在数据未变化时返回304
 
     返回格式：课程->老师->学期->基准人数和平均分
     """
@@ -61,6 +69,23 @@ async def query_average_scores(
         f"收到平均分查询请求，用户: {current_user}, 课程: {course}, 教师: {teacher or '全部'}"
     )
 
+    try:
+        version = average_scores_service.get_db_version()
+    except Exception as e:
+        logger.error(f"平均分查询过程中发生未知错误: {e}")
+        return AverageScoreResponse(code=500, message=f"未知错误: {str(e)}", data={})
+
+    def build() -> Tuple[bytes, bool]:
+        response = _query_average_scores(course, teacher)
+        return response.model_dump_json().encode("utf-8"), response.code != 500
+
+    return average_scores_responder.respond(
+        request, version, (course, (teacher or "").strip()), build
+    )
+
+
+def _query_average_scores(course: str, teacher: Optional[str]) -> AverageScoreResponse:
+    """执行平均分查询并转换为响应模型"""
     try:
         logger.debug("开始查询平均分数据...")
         data = average_scores_service.query_average_scores(course, teacher)
@@ -1,17 +1,64 @@
 # app/api/v1/classtable.py
-from fastapi import APIRouter, Depends, Query, HTTPException
+from fastapi import APIRouter, Depends, Query, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from loguru import logger
 import requests
 from datetime import datetime
+from typing import Optional
 
 from app.services.classtable import ClassTableService
+from app.services.classtable_ics import ClassTableCalendarService
+from app.services.semester_timetable import SemesterSnapshot, semester_timetable
 from app.services.base import get_user_session
+from app.db.database import get_session_by_hash
+from app.core.security import get_current_user
 from app.schemas.classtable import DayClassTableResponse, WeekClassTableResponse
+from app.utils.http_cache import etag_matches, make_etag
 
 # 创建路由器
 router = APIRouter()
 
 
+def _validate_anchor_date(anchor_date: Optional[str]) -> None:
+    """校验学期锚定日期格式"""
+    if anchor_date:
+        try:
+            datetime.strptime(anchor_date, "%Y-%m-%d")
+        except ValueError:
+            logger.warning(f"无效的日期格式: {anchor_date}")
+            raise HTTPException(
+                status_code=400, detail="日期格式无效，请使用 YYYY-MM-DD 格式"
+            )
+
+
+def _calendar_response(request: Request, snapshot: SemesterSnapshot) -> Response:
+    """
+    由学期快照生成日历响应
+
+    快照完整（没有仍在获取的周）时带ETag，If-None-Match 命中返回304；
+    否则不带ETag，先输出已缓存的周，其余周获取完成后继续输出。
+    """
+    headers = {"Cache-Control": "private, no-cache"}
+    if not snapshot.pending:
+        etag = make_etag("classtable-ics", snapshot.digest)
+        headers["ETag"] = etag
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            logger.info("课程表日历未变化，返回304")
+            return Response(status_code=304, headers=headers)
+
+    headers["Content-Disposition"] = 'attachment; filename="classtable.ics"'
+    logger.info(
+        f"课程表日历导出开始，已缓存 {len(snapshot.weeks)} 周，"
+        f"获取中 {len(snapshot.pending)} 周"
+    )
+    return StreamingResponse(
+        ClassTableCalendarService.iter_calendar(snapshot),
+        media_type="text/calendar; charset=utf-8",
+        headers=headers,
+    )
+
+
 @router.get(
     "/classtable/today",
     response_model=DayClassTableResponse,
@@ -89,7 +136,10 @@ router = APIRouter()
         },
     },
 )
-async def get_today_classtable(session: requests.Session = Depends(get_user_session)):
+async def get_today_classtable(
+    session: requests.Session = Depends(get_user_session),
+    student_id_hash: str = Depends(get_current_user),
+):
     """
     获取今天的课程表
 
@@ -100,7 +150,8 @@ async def get_today_classtable(session: requests.Session = Depends(get_user_sess
     需要用户已登录教务系统，通过session验证身份。
 
     ## 数据来源
-    实时从教务系统获取最新的课程表数据。
+    从教务系统获取课程表数据。首次访问后会在后台预取整个学期的课程表，
+    之后的查询直接由缓存返回，缓存过期时返回旧数据并在后台刷新。
 
     ## 返回字段说明
     - **date**: 日期，格式为 YYYY-MM-DD
@@ -126,7 +177,7 @@ async def get_today_classtable(session: requests.Session = Depends(get_user_sess
         logger.info(f"收到今日课程表查询请求，日期: {today}")
 
         # 调用服务获取当天课程
-        day_courses = ClassTableService.get_day_courses(session, today)
+        day_courses = ClassTableService.get_day_courses(session, today, student_id_hash)
 
         logger.info(
             f"今日课程表查询成功，日期: {today}, 课程数: {len(day_courses.courses)}"
@@ -225,6 +276,7 @@ async def get_week_classtable(
         regex=r"^\d{4}-\d{2}-\d{2}$",
     ),
     session: requests.Session = Depends(get_user_session),
+    student_id_hash: str = Depends(get_current_user),
 ):
     """
     获取指定日期所在周的完整课程表
@@ -243,7 +295,8 @@ async def get_week_classtable(
     需要用户已登录教务系统，通过session验证身份。
 
     ## 数据来源
-    实时从教务系统获取最新的课程表数据。
+    从教务系统获取课程表数据。首次访问后会在后台预取整个学期的课程表，
+    之后翻看其他周直接由缓存返回，缓存过期时返回旧数据并在后台刷新。
 
     ## 返回字段说明
     ### 外层结构
@@ -306,7 +359,9 @@ async def get_week_classtable(
             )
 
         # 调用服务获取周课程表
-        week_courses = ClassTableService.get_week_courses(session, query_date)
+        week_courses = ClassTableService.get_week_courses(
+            session, query_date, student_id_hash
+        )
 
         logger.info(
             f"周课程表查询成功，日期: {query_date}, 周数: {week_courses.week_number}"
@@ -319,3 +374,234 @@ async def get_week_classtable(
         logger.error(f"周课程表查询过程中发生错误: {e}")
         error = ClassTableService.handle_service_error(e, "周课程表查询")
         raise error
+
+
+@router.get(
+    "/classtable/ics",
+    summary="导出学期课程表（iCalendar）",
+    description="""
+    将整个学期的课程表导出为 iCalendar (.ics) 文件
+
+    ## 功能说明
+    - 一次返回整个学期所有周的课程，无需逐周调用 /classtable/week
+    - 课程节次按学校作息时间换算为具体上课时间
+    - 响应以流式方式逐周生成
+
+    ## 缓存说明
+    - 响应带有ETag，由学期课程表快照内容计算
+    - 客户端携带 If-None-Match 轮询时，课程表未变化直接返回304
+    - 日历应用订阅无法携带 Authorization 头，请使用 POST /classtable/ics/feed 生成订阅地址
+    """,
+    tags=["课程表"],
+    response_class=StreamingResponse,
+    responses={
+        200: {
+            "description": "iCalendar 文件",
+            "content": {"text/calendar": {}},
+        },
+        304: {"description": "课程表未变化"},
+        401: {"description": "用户未登录或登录已过期"},
+        503: {"description": "教务系统连接失败"},
+        500: {"description": "服务器内部错误"},
+    },
+)
+async def export_classtable_ics(
+    request: Request,
+    anchor_date: Optional[str] = Query(
+        None,
+        description="用于确定学期的日期，格式：YYYY-MM-DD，默认今天",
+        example="2025-01-15",
+        regex=r"^\d{4}-\d{2}-\d{2}$",
+    ),
+    session: requests.Session = Depends(get_user_session),
+    student_id_hash: str = Depends(get_current_user),
+):
+    """
+    导出学期课程表为 iCalendar
+
+    ## 接口说明
+    以 anchor_date 所在周确定学期，从学期课程表缓存生成日历。
+    已缓存的周立即开始输出，缺少的周在后台从教务系统获取，获取完成后继续输出。
+
+    ## 返回说明
+    - Content-Type: text/calendar
+    - 每门课程每次上课对应一个 VEVENT，时间为UTC
+    - ETag 对应学期快照，课程表未变化时条件请求返回304（仅在全部周已缓存时提供）
+    """
+    try:
+        _validate_anchor_date(anchor_date)
+        logger.info(f"收到课程表日历导出请求，锚定日期: {anchor_date or '今天'}")
+
+        snapshot = await run_in_threadpool(
+            semester_timetable.get_semester,
+            student_id_hash,
+            session,
+            anchor_date,
+            False,
+        )
+
+        return _calendar_response(request, snapshot)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"课程表日历导出过程中发生错误: {e}")
+        error = ClassTableService.handle_service_error(e, "课程表日历导出")
+        raise error
+
+
+@router.post(
+    "/classtable/ics/feed",
+    summary="生成课程表日历订阅地址",
+    description="""
+    为当前用户生成课程表日历的订阅地址（webcal 订阅）
+
+    ## 功能说明
+    - 日历应用（iOS/Google/Outlook）订阅时无法携带 Authorization 头，
+      订阅地址中带有每个用户独立的 feed_token 凭证
+    - 每个用户只有一个有效的订阅地址，重新生成后旧地址立即失效
+    - 可通过 DELETE /classtable/ics/feed 撤销
+    """,
+    tags=["课程表"],
+    responses={
+        200: {"description": "订阅地址生成成功"},
+        401: {"description": "用户未登录或登录已过期"},
+        500: {"description": "服务器内部错误"},
+    },
+)
+async def create_classtable_ics_feed(
+    request: Request,
+    student_id_hash: str = Depends(get_current_user),
+):
+    """
+    生成课程表日历订阅地址
+
+    Args:
+        request: HTTP请求对象，用于生成订阅地址
+        student_id_hash: 当前用户的学号hash（通过依赖注入获取，校验Token签名）
+
+    Returns:
+        dict: 包含订阅地址 feed_url
+    """
+    feed_token = await run_in_threadpool(
+        ClassTableCalendarService.issue_feed_token, student_id_hash
+    )
+    feed_url = request.url_for("subscribe_classtable_ics").include_query_params(
+        feed_token=feed_token
+    )
+    return {
+        "success": True,
+        "message": "订阅地址生成成功，旧的订阅地址已失效",
+        "data": {"feed_url": str(feed_url)},
+    }
+
+
+@router.delete(
+    "/classtable/ics/feed",
+    summary="撤销课程表日历订阅地址",
+    tags=["课程表"],
+    responses={
+        200: {"description": "撤销成功"},
+        401: {"description": "用户未登录或登录已过期"},
+    },
+)
+async def revoke_classtable_ics_feed(
+    student_id_hash: str = Depends(get_current_user),
+):
+    """
+    撤销课程表日历订阅地址，已订阅的日历应用之后的请求返回401
+
+    Args:
+        student_id_hash: 当前用户的学号hash（通过依赖注入获取，校验Token签名）
+
+    Returns:
+        dict: 是否撤销了已有的订阅地址
+    """
+    revoked = await run_in_threadpool(
+        ClassTableCalendarService.revoke_feed_token, student_id_hash
+    )
+    return {
+        "success": True,
+        "message": "订阅地址已撤销" if revoked else "当前没有订阅地址",
+        "data": {"revoked": revoked},
+    }
+
+
+@router.get(
+    "/classtable/ics/feed",
+    name="subscribe_classtable_ics",
+    summary="订阅学期课程表（iCalendar）",
+    description="""
+    供日历应用订阅的学期课程表，使用订阅地址中的 feed_token 认证，无需 Authorization 头
+
+    ## 缓存说明
+    - 学期课程表已全部缓存且未过期时，直接按缓存快照校验 If-None-Match，
+      不加载教务系统session，课程表未变化返回304
+    - 缓存不完整时使用服务端保存的教务系统session补齐，
+      session已失效（需在客户端重新登录）时返回401
+    """,
+    tags=["课程表"],
+    response_class=StreamingResponse,
+    responses={
+        200: {
+            "description": "iCalendar 文件",
+            "content": {"text/calendar": {}},
+        },
+        304: {"description": "课程表未变化"},
+        401: {"description": "订阅地址无效、已撤销，或教务系统session已失效"},
+        503: {"description": "教务系统连接失败"},
+        500: {"description": "服务器内部错误"},
+    },
+)
+async def subscribe_classtable_ics(
+    request: Request,
+    feed_token: str = Query(..., min_length=16, description="订阅凭证"),
+    anchor_date: Optional[str] = Query(
+        None,
+        description="用于确定学期的日期，格式：YYYY-MM-DD，默认今天",
+        example="2025-01-15",
+        regex=r"^\d{4}-\d{2}-\d{2}$",
+    ),
+):
+    """
+    按订阅凭证导出学期课程表
+
+    ## 接口说明
+    先按凭证找到学生，再只用内存中的学期快照处理条件请求；
+    快照不完整时才加载该学生的教务系统session，之后与 /classtable/ics 相同。
+    """
+    try:
+        _validate_anchor_date(anchor_date)
+        student_id_hash = await run_in_threadpool(
+            ClassTableCalendarService.resolve_feed_token, feed_token
+        )
+        if student_id_hash is None:
+            logger.warning("课程表订阅凭证无效或已撤销")
+            raise HTTPException(status_code=401, detail="订阅地址无效或已撤销")
+
+        snapshot = semester_timetable.peek_semester(student_id_hash, anchor_date)
+        if snapshot is None:
+            session = await run_in_threadpool(get_session_by_hash, student_id_hash)
+            if session is None:
+                logger.warning(f"订阅用户 {student_id_hash} 的session不存在或已失效")
+                raise HTTPException(
+                    status_code=401, detail="Session不存在或已失效，请重新登录"
+                )
+            snapshot = await run_in_threadpool(
+                semester_timetable.get_semester,
+                student_id_hash,
+                session,
+                anchor_date,
+                False,
+            )
+        else:
+            logger.debug(f"订阅用户 {student_id_hash} 的学期课程表命中缓存")
+
+        return _calendar_response(request, snapshot)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"课程表日历订阅过程中发生错误: {e}")
+        error = ClassTableService.handle_service_error(e, "课程表日历订阅")
+        raise error
@@ -1,13 +1,68 @@
-from fastapi import APIRouter, Depends, HTTPException
-from app.services.course_plan import CoursePlanService
-from app.services.base import get_user_session, BaseEducationService
-from app.core.security import get_current_user_id
-from app.db import database as db
+import gzip
+import json
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse
+from app.services.course_plan import (
+    PLAN_STATUS_CURRENT,
+    PLAN_STATUS_STALE,
+    REFRESH_RUNNING,
+    CachedCoursePlan,
+    CoursePlanRefresh,
+    CoursePlanService,
+)
+from app.services.graduation_progress import GraduationProgressService
+from app.services.base import BaseEducationService
+from app.core.security import get_current_user, get_current_user_id
+from app.utils.http_cache import etag_matches
 from loguru import logger
 
 
 router = APIRouter()
 
+# 培养方案为个人数据，客户端可以缓存但每次使用前需用ETag校验
+COURSE_PLAN_CACHE_CONTROL = "private, no-cache"
+# 响应头中的版本状态，304响应没有响应体时客户端也能得知是否为旧版本
+COURSE_PLAN_STATUS_HEADER = "X-Course-Plan-Status"
+
+
+def _cached_plan_response(
+    request: Request,
+    cached: CachedCoursePlan,
+    refresh: Optional[CoursePlanRefresh] = None,
+) -> Response:
+    """
+    直接返回缓存中压缩好的响应体，不做JSON解码和重新编码
+
+    后台刷新进行中时返回的是旧版本，此时解码响应体并将 status 改为 stale。
+    """
+    stale = (
+        refresh is not None
+        and refresh.status == REFRESH_RUNNING
+        and cached.updated_at < refresh.started_at
+    )
+    headers = {
+        "ETag": cached.etag,
+        "Cache-Control": COURSE_PLAN_CACHE_CONTROL,
+        "Vary": "Accept-Encoding",
+        COURSE_PLAN_STATUS_HEADER: PLAN_STATUS_STALE if stale else PLAN_STATUS_CURRENT,
+    }
+    if etag_matches(request.headers.get("if-none-match"), cached.etag):
+        return Response(status_code=304, headers=headers)
+
+    if stale:
+        content = json.loads(gzip.decompress(cached.body))
+        content["status"] = PLAN_STATUS_STALE
+        content["refresh_started_at"] = refresh.started_at.isoformat()
+        return JSONResponse(content=content, headers=headers)
+
+    if "gzip" in request.headers.get("accept-encoding", "").lower():
+        headers["Content-Encoding"] = "gzip"
+        body = cached.body
+    else:
+        body = gzip.decompress(cached.body)
+    return Response(content=body, media_type="application/json", headers=headers)
+
 
 @router.get(
     "/course-plan",
@@ -16,16 +71,24 @@ router = APIRouter()
     tags=["培养方案"],
 )
 async def get_course_plan(
-    session=Depends(get_user_session), student_id: str = Depends(get_current_user_id)
+    request: Request,
+    student_id_hash: str = Depends(get_current_user),
+    student_id: str = Depends(get_current_user_id),
 ):
     """
     获取培养方案数据
 
     从教务系统获取培养方案页面并解析为结构化数据，包含模块信息、课程详情等。
     会优先从缓存中读取，如果缓存不存在或过期，则从教务系统实时获取。
+    缓存分为进程内一级缓存（gzip压缩的响应体，命中时原样返回，客户端支持gzip时不解压）
+    和数据库二级缓存（按专业共享的模板加个人部分），只有需要实时获取时才加载教务系统session。
+    响应带有基于内容hash的ETag，内容未变化时条件请求返回304。
+    响应中的 status 字段（及 X-Course-Plan-Status 响应头）为 current 表示最新版本，
+    为 stale 表示后台刷新尚未完成、返回的是刷新前的旧版本。
 
     Args:
-        session: 当前用户的教务系统会话（通过依赖注入获取）
+        request: HTTP请求对象，用于处理 Accept-Encoding 和 If-None-Match
+        student_id_hash: 当前用户的学号hash（通过依赖注入获取，校验Token签名）
         student_id: 当前用户的学号（通过依赖注入获取）
 
     Returns:
@@ -34,12 +97,32 @@ async def get_course_plan(
     Raises:
         HTTPException: 当获取或解析失败时抛出相应的HTTP异常
     """
+    session = None
     try:
         logger.info(f"开始为学号 {student_id} 获取培养方案数据...")
-        result = CoursePlanService.get_course_plan_data(session, student_id)
+        cached = CoursePlanService.get_cached_plan(student_id, student_id_hash)
+        if cached:
+            return _cached_plan_response(
+                request, cached, CoursePlanService.get_refresh_job(student_id)
+            )
+
+        # 缓存未命中才需要教务系统session
+        session = BaseEducationService.get_user_session(student_id_hash)
+        result, content_hash = CoursePlanService.fetch_course_plan(
+            session, student_id, student_id_hash
+        )
         logger.info(f"为学号 {student_id} 获取培养方案数据成功")
-        return result
+        return JSONResponse(
+            content=result,
+            headers={
+                "ETag": f'"{content_hash}"',
+                "Cache-Control": COURSE_PLAN_CACHE_CONTROL,
+                COURSE_PLAN_STATUS_HEADER: PLAN_STATUS_CURRENT,
+            },
+        )
 
+    except HTTPException:
+        raise
     except Exception as e:
         # 使用基础服务类统一处理错误
         http_exception = BaseEducationService.handle_service_error(e, "获取培养方案")
@@ -55,13 +138,23 @@ async def get_course_plan(
     description="强制从教务系统重新获取培养方案数据并更新缓存",
     tags=["培养方案"],
 )
-async def refresh_course_plan(student_id: str = Depends(get_current_user_id)):
+async def refresh_course_plan(
+    background: bool = Query(
+        False, description="为true时在后台重新获取，完成前继续返回旧版本"
+    ),
+    student_id_hash: str = Depends(get_current_user),
+    student_id: str = Depends(get_current_user_id),
+):
     """
     主动刷新培养方案缓存
 
-    此接口会删除现有的培养方案缓存，以便下次请求时能从教务系统获取最新的数据。
+    默认删除现有的培养方案缓存，以便下次请求时能从教务系统获取最新的数据。
+    background=true 时不删除缓存，而是使用已保存的教务系统session在后台重新获取，
+    获取完成前 /course-plan 继续返回旧版本（status 为 stale），完成后替换缓存。
 
     Args:
+        background: 是否在后台刷新
+        student_id_hash: 当前用户的学号hash（通过依赖注入获取）
         student_id: 当前用户的学号（通过依赖注入获取）
 
     Returns:
@@ -69,7 +162,15 @@ async def refresh_course_plan(student_id: str = Depends(get_current_user_id)):
     """
     try:
         logger.info(f"收到为学号 {student_id} 刷新培养方案缓存的请求。")
-        success = db.delete_course_plan(student_id)
+        if background:
+            job = CoursePlanService.schedule_refresh(student_id, student_id_hash)
+            return {
+                "success": True,
+                "message": "培养方案正在后台刷新，完成前将继续返回当前缓存。",
+                "data": job.to_dict(),
+            }
+
+        success = CoursePlanService.invalidate(student_id, student_id_hash)
         if success:
             logger.info(f"成功删除学号 {student_id} 的培养方案缓存。")
             return {
@@ -82,3 +183,101 @@ async def refresh_course_plan(student_id: str = Depends(get_current_user_id)):
     except Exception as e:
         logger.error(f"刷新培养方案缓存失败，学号: {student_id}，错误: {e}")
         raise HTTPException(status_code=500, detail="刷新培养方案缓存失败")
+
+
+@router.get(
+    "/course-plan/refresh/status",
+    summary="查询培养方案后台刷新状态",
+    description="返回最近一次后台刷新任务的状态及当前缓存的更新时间",
+    tags=["培养方案"],
+)
+async def get_course_plan_refresh_status(
+    student_id_hash: str = Depends(get_current_user),
+    student_id: str = Depends(get_current_user_id),
+):
+    """
+    查询培养方案后台刷新状态
+
+    Args:
+        student_id_hash: 当前用户的学号hash（通过依赖注入获取，校验Token签名）
+        student_id: 当前用户的学号（通过依赖注入获取）
+
+    Returns:
+        dict: 刷新任务状态（refreshing / succeeded / failed，无任务时为 idle）
+    """
+    job = CoursePlanService.get_refresh_job(student_id)
+    cached = CoursePlanService.get_cached_plan(student_id)
+    data = (
+        job.to_dict()
+        if job
+        else {"status": "idle", "started_at": None, "finished_at": None, "error": None}
+    )
+    data["cached_updated_at"] = cached.updated_at.isoformat() if cached else None
+    return {"success": True, "data": data}
+
+
+@router.get(
+    "/course-plan/progress",
+    summary="计算毕业进度",
+    description="按课程代码关联培养方案与成绩单，返回各模块学分缺口、未通过课程及预计毕业绩点",
+    tags=["培养方案"],
+)
+async def get_graduation_progress(
+    assumed_grade_point: Optional[float] = Query(
+        None, ge=0, le=5, description="剩余学分的预计绩点，默认按当前有效绩点估算"
+    ),
+    student_id_hash: str = Depends(get_current_user),
+    student_id: str = Depends(get_current_user_id),
+):
+    """
+    计算毕业进度
+
+    在服务端完成培养方案与成绩的关联计算，客户端无需分别下载完整的培养方案和成绩数据。
+    培养方案优先从缓存读取，成绩从教务系统实时获取。
+
+    Args:
+        assumed_grade_point: 剩余学分的预计绩点
+        student_id_hash: 当前用户的学号hash（通过依赖注入获取）
+        student_id: 当前用户的学号（通过依赖注入获取）
+
+    Returns:
+        dict: 各模块进度、汇总及绩点预测
+
+    Raises:
+        HTTPException: 当获取或计算失败时抛出相应的HTTP异常
+    """
+    # scraper 依赖验证码识别库，延迟导入避免影响培养方案路由的加载
+    from app.services.scraper import get_grades
+
+    session = None
+    try:
+        logger.info(f"开始为学号 {student_id} 计算毕业进度...")
+        session = BaseEducationService.get_user_session(student_id_hash)
+        plan_result = CoursePlanService.get_course_plan_data(
+            session, student_id, student_id_hash
+        )
+
+        grades_result = get_grades(session=session, semester="")
+        if not grades_result.get("success", False):
+            raise HTTPException(
+                status_code=503,
+                detail=f"获取成绩失败: {grades_result.get('message', '教务系统错误')}",
+            )
+
+        progress = GraduationProgressService.compute(
+            plan_result["data"], grades_result["data"], assumed_grade_point
+        )
+        logger.info(
+            f"学号 {student_id} 的毕业进度计算完成，"
+            f"剩余学分缺口 {progress['summary']['shortfall_credits']}"
+        )
+        return {"success": True, "message": "毕业进度计算完成", "data": progress}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        http_exception = BaseEducationService.handle_service_error(e, "计算毕业进度")
+        raise http_exception
+
+    finally:
+        BaseEducationService.close_session(session)
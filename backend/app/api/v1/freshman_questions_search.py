@@ -8,16 +8,23 @@
 创建时间: 2024
 """
 
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request
 from pydantic import BaseModel, Field
-from typing import Any, Dict, List, Optional
+from starlette.concurrency import run_in_threadpool
+from typing import Any, Dict, List, Optional, Tuple
 from loguru import logger
 
 from app.services.freshman_questions_search import question_search_service
+from app.utils.http_cache import CachedJSONResponder, HTTP_CACHE_MAX_AGE
 
 # 创建API路由器，用于题库搜索相关接口
 router = APIRouter(tags=["题库搜索"])
 
+# 题库接口无需登录，GET 响应只取决于题库版本和查询参数，允许公共缓存
+question_search_responder = CachedJSONResponder(
+    "freshman-question-search", cache_control=f"public, max-age={HTTP_CACHE_MAX_AGE}"
+)
+
 
 class QuestionSearchRequest(BaseModel):
     """
@@ -82,6 +89,76 @@ class QuestionSearchResponse(BaseModel):
     )
 
 
+class QuestionBatchSearchRequest(BaseModel):
+    """
+    题库批量搜索请求数据模型
+
+    用于一次提交多条题目（例如整页试题）进行搜索，
+    所有查询共用同一组 topk 和 threshold 参数。
+
+    Attributes:
+        queries (List[str]): 搜索关键词列表，1-50条
+        topk (int): 每条查询返回的最大结果数量，默认为3，范围1-10
+        threshold (float): 相似度阈值，默认为0.55，范围0-1
+    """
+
+    queries: List[str] = Field(
+        ...,
+        min_length=1,
+        max_length=50,
+        description="搜索关键词列表，1-50条",
+        example=["计算机网络", "曲阜师范大学校训"],
+    )
+    topk: Optional[int] = Field(
+        default=3,
+        ge=1,
+        le=10,
+        description="每条查询返回结果数量，范围1-10",
+        example=3,
+    )
+    threshold: Optional[float] = Field(
+        default=0.55,
+        ge=0,
+        le=1,
+        description="相似度阈值，范围0-1，值越高结果越精确",
+        example=0.55,
+    )
+
+
+class QuestionBatchSearchItem(BaseModel):
+    """
+    批量搜索中单条查询的结果
+
+    Attributes:
+        query (str): 搜索关键词
+        count (int): 实际返回的结果数量
+        results (List[Dict]): 搜索结果列表
+    """
+
+    query: str = Field(description="搜索关键词", example="计算机网络")
+    count: int = Field(description="实际返回的结果数量", example=1)
+    results: List[Dict[str, Any]] = Field(description="搜索结果列表")
+
+
+class QuestionBatchSearchResponse(BaseModel):
+    """
+    题库批量搜索响应数据模型
+
+    Attributes:
+        ok (bool): 请求是否成功
+        topk (int): 每条查询的最大结果数量
+        threshold (float): 使用的相似度阈值
+        count (int): 查询条数
+        items (List[QuestionBatchSearchItem]): 与请求顺序一致的各条查询结果
+    """
+
+    ok: bool = Field(description="请求是否成功", example=True)
+    topk: int = Field(description="返回结果数量", example=3)
+    threshold: float = Field(description="相似度阈值", example=0.55)
+    count: int = Field(description="查询条数", example=2)
+    items: List[QuestionBatchSearchItem] = Field(description="各条查询的搜索结果")
+
+
 @router.post(
     "/freshman-question-search",
     response_model=QuestionSearchResponse,
@@ -124,41 +201,45 @@ async def search_questions(request: QuestionSearchRequest):
         }
     """
     try:
-        logger.info(f"接收到题库搜索请求: {request.query}")
+        return _run_search(request)
+    except HTTPException:
+        # 重新抛出HTTP异常
+        raise
+    except Exception as e:
+        logger.error(f"题库搜索失败: {e}")
+        raise HTTPException(status_code=500, detail=f"搜索失败: {str(e)}")
 
-        # 参数验证
-        if not request.query.strip():
-            raise HTTPException(status_code=400, detail="搜索关键词不能为空")
 
-        if request.topk < 1 or request.topk > 10:
-            raise HTTPException(status_code=400, detail="topk参数必须在1-10之间")
+def _run_search(request: QuestionSearchRequest) -> QuestionSearchResponse:
+    """校验参数并执行单条题库搜索，POST 与 GET 接口共用"""
+    logger.info(f"接收到题库搜索请求: {request.query}")
 
-        if request.threshold < 0 or request.threshold > 1:
-            raise HTTPException(status_code=400, detail="threshold参数必须在0-1之间")
+    # 参数验证
+    if not request.query.strip():
+        raise HTTPException(status_code=400, detail="搜索关键词不能为空")
 
-        # 执行搜索
-        results = question_search_service.search_questions(
-            query=request.query.strip(), topk=request.topk, threshold=request.threshold
-        )
+    if request.topk < 1 or request.topk > 10:
+        raise HTTPException(status_code=400, detail="topk参数必须在1-10之间")
 
-        response = QuestionSearchResponse(
-            ok=True,
-            query=request.query.strip(),
-            topk=request.topk,
-            threshold=request.threshold,
-            count=len(results),
-            results=results,
-        )
+    if request.threshold < 0 or request.threshold > 1:
+        raise HTTPException(status_code=400, detail="threshold参数必须在0-1之间")
 
-        logger.info(f"题库搜索完成，返回 {len(results)} 个结果")
-        return response
+    # 执行搜索
+    results = question_search_service.search_questions(
+        query=request.query.strip(), topk=request.topk, threshold=request.threshold
+    )
 
-    except HTTPException:
-        # 重新抛出HTTP异常
-        raise
-    except Exception as e:
-        logger.error(f"题库搜索失败: {e}")
-        raise HTTPException(status_code=500, detail=f"搜索失败: {str(e)}")
+    response = QuestionSearchResponse(
+        ok=True,
+        query=request.query.strip(),
+        topk=request.topk,
+        threshold=request.threshold,
+        count=len(results),
+        results=results,
+    )
+
+    logger.info(f"题库搜索完成，返回 {len(results)} 个结果")
+    return response
 
 
 @router.get(
@@ -168,6 +249,7 @@ async def search_questions(request: QuestionSearchRequest):
     description="通过URL参数进行题库搜索，适用于简单的搜索场景",
 )
 async def search_questions_get(
+    http_request: Request,
     query: str = Query(
         ...,
         description="搜索关键词，支持中文和英文",
@@ -195,14 +277,16 @@ async def search_questions_get(
 
     通过URL查询参数进行题库搜索，功能与POST接口相同，
     但更适合于简单的搜索场景和第三方集成。
+    响应带有ETag，题库未变化时携带 If-None-Match 的重复请求直接返回304。
 
     Args:
+        http_request (Request): 原始请求，用于处理条件请求头
         query (str): 搜索关键词，长度1-100字符
         topk (int): 返回结果数量，范围1-10，默认3
         threshold (float): 相似度阈值，范围0-1，默认0.55
 
     Returns:
-        QuestionSearchResponse: 与POST接口相同的响应格式
+        QuestionSearchResponse: 与POST接口相同的响应格式（条件请求命中时为304）
 
     Raises:
         HTTPException: 与POST接口相同的异常处理
@@ -212,4 +296,113 @@ async def search_questions_get(
     """
     # 构造请求对象并复用POST接口的逻辑
     request = QuestionSearchRequest(query=query, topk=topk, threshold=threshold)
-    return await search_questions(request)
+
+    try:
+        version = question_search_service.get_db_version()
+
+        def build() -> Tuple[bytes, bool]:
+            response = _run_search(request)
+            return response.model_dump_json().encode("utf-8"), True
+
+        return question_search_responder.respond(
+            http_request, version, (query.strip(), topk, threshold), build
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"题库搜索失败: {e}")
+        raise HTTPException(status_code=500, detail=f"搜索失败: {str(e)}")
+
+
+@router.post(
+    "/freshman-question-search/batch",
+    response_model=QuestionBatchSearchResponse,
+    summary="题库批量搜索",
+    description="一次提交多条关键词进行搜索，服务端使用多进程并行计算相似度",
+)
+async def search_questions_batch(request: QuestionBatchSearchRequest):
+    """
+    题库批量搜索接口
+
+    适用于一次粘贴整页试题的场景，避免前端逐条调用单条搜索接口。
+    查询会被分片交给进程池并行计算，结果顺序与请求中的 queries 顺序一致。
+
+    Args:
+        request (QuestionBatchSearchRequest): 批量搜索请求参数
+            - queries: 搜索关键词列表，必填，1-50条
+            - topk: 每条查询返回结果数量，可选，默认3
+            - threshold: 相似度阈值，可选，默认0.55
+
+    Returns:
+        QuestionBatchSearchResponse: 批量搜索结果响应
+
+    Raises:
+        HTTPException:
+            - 400: 参数验证失败（存在空关键词）
+            - 500: 服务器内部错误
+
+    Example:
+        POST /api/v1/question/freshman-question-search/batch
+        {
+            "queries": ["计算机网络", "曲阜师范大学校训"],
+            "topk": 3,
+            "threshold": 0.55
+        }
+    """
+    try:
+        logger.info(f"接收到题库批量搜索请求，查询数: {len(request.queries)}")
+
+        queries = [q.strip() for q in request.queries]
+        for i, query in enumerate(queries, start=1):
+            if not query:
+                raise HTTPException(
+                    status_code=400, detail=f"第{i}条搜索关键词不能为空"
+                )
+
+        # 进程池计算期间不阻塞事件循环
+        results = await run_in_threadpool(
+            question_search_service.search_questions_batch,
+            queries,
+            request.topk,
+            request.threshold,
+        )
+
+        items = [
+            QuestionBatchSearchItem(query=query, count=len(result), results=result)
+            for query, result in zip(queries, results)
+        ]
+
+        logger.info(f"题库批量搜索完成，共 {len(items)} 条查询")
+        return QuestionBatchSearchResponse(
+            ok=True,
+            topk=request.topk,
+            threshold=request.threshold,
+            count=len(items),
+            items=items,
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"题库批量搜索失败: {e}")
+        raise HTTPException(status_code=500, detail=f"批量搜索失败: {str(e)}")
+
+
+@router.get(
+    "/freshman-question-search/cache-stats",
+    summary="题库搜索缓存统计",
+    description="返回搜索结果缓存的容量、命中次数和命中率",
+)
+async def get_search_cache_stats():
+    """
+    题库搜索缓存统计接口
+
+    Returns:
+        dict: 缓存统计信息
+            - size: 当前缓存条目数
+            - maxsize: 最大缓存条目数
+            - hits / misses: 命中与未命中次数
+            - hit_rate: 命中率
+            - corpus_size: 已加载的题目数量
+    """
+    return {"ok": True, "data": question_search_service.get_cache_stats()}
@@ -2,15 +2,26 @@
 
 import hashlib
 import os
+from functools import lru_cache
+from typing import Optional
 from loguru import logger
 
 # 从环境变量读取盐值，如果没有则使用默认值（生产环境中应该设置环境变量）
 HASH_SALT = os.getenv("STUDENT_ID_SALT", "STUDENT_ID_SALT")
+# 学号hash的缓存条目数（同一请求中登录、Token签发、数据库查询会多次计算同一学号）
+STUDENT_ID_HASH_CACHE_SIZE = int(os.getenv("STUDENT_ID_HASH_CACHE_SIZE", "4096"))
+
+
+@lru_cache(maxsize=STUDENT_ID_HASH_CACHE_SIZE)
+def _salted_sha256(student_id: str) -> str:
+    # 使用学号 + 盐值进行SHA256哈希
+    combined = f"{student_id}{HASH_SALT}"
+    return hashlib.sha256(combined.encode("utf-8")).hexdigest()
 
 
 def hash_student_id(student_id: str) -> str:
     """
-    对学号进行安全哈希处理
+    对学号进行安全哈希处理（结果有界缓存，不记录明文学号）
 
     Args:
         student_id: 明文学号
@@ -21,12 +32,25 @@ def hash_student_id(student_id: str) -> str:
     if not student_id or not isinstance(student_id, str):
         raise ValueError("学号不能为空且必须是字符串")
 
-    # 使用学号 + 盐值进行SHA256哈希
-    combined = f"{student_id}{HASH_SALT}"
-    hash_value = hashlib.sha256(combined.encode("utf-8")).hexdigest()
+    return _salted_sha256(student_id)
+
 
-    logger.debug(f"学号哈希处理完成: {student_id} -> {hash_value}")
-    return hash_value
+def resolve_student_id_hash(
+    student_id: Optional[str], student_id_hash: Optional[str] = None
+) -> str:
+    """
+    优先使用调用方已计算好的学号hash，没有时再由明文学号计算
+
+    Args:
+        student_id: 明文学号
+        student_id_hash: 已知的学号hash（如认证依赖返回的值）
+
+    Returns:
+        str: 学号hash
+    """
+    if student_id_hash:
+        return student_id_hash
+    return hash_student_id(student_id)
 
 
 def verify_student_id(student_id: str, hash_value: str) -> bool:
@@ -48,9 +72,9 @@ def verify_student_id(student_id: str, hash_value: str) -> bool:
         is_match = calculated_hash == hash_value
 
         if is_match:
-            logger.debug(f"学号验证成功: {student_id}")
+            logger.debug("学号验证成功: {}", get_student_id_for_display(hash_value))
         else:
-            logger.warning(f"学号验证失败: {student_id}")
+            logger.warning("学号验证失败: {}", get_student_id_for_display(hash_value))
 
         return is_match
     except Exception as e:
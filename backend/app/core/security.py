@@ -6,11 +6,14 @@ import jwt
 import os
 import secrets
 import hashlib
+import time
 from datetime import datetime, timedelta, timezone
 from typing import Optional, Set
 import ipaddress
 from loguru import logger
 from app.core.hash_utils import hash_student_id
+from app.core.token_revocation import token_revocation_store
+from app.utils.lru_cache import LRUCache
 
 reusable_oauth2 = HTTPBearer()
 
@@ -39,8 +42,39 @@ logger.info(
     f"安全配置加载完成: 算法={ALGORITHM}, Access Token过期时间={ACCESS_TOKEN_EXPIRE_MINUTES}分钟, Refresh Token过期时间={REFRESH_TOKEN_EXPIRE_DAYS}天"
 )
 
-# Token黑名单（在生产环境中应该使用Redis等持久化存储）
-BLACKLISTED_TOKENS: Set[str] = set()
+# 已验证Token缓存条目数，同一Token在过期前重复请求时跳过签名校验和解析
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "4096"))
+# 每个Token缓存的已通过IP验证的地址数量上限
+_TOKEN_CACHE_MAX_IPS = 8
+
+
+class VerifiedToken:
+    """已通过签名和声明校验的Token"""
+
+    __slots__ = ("payload", "token_type", "verified_ips")
+
+    def __init__(self, payload: dict, token_type: str):
+        self.payload = payload
+        self.token_type = token_type
+        # 已通过白名单和IP绑定校验的客户端IP
+        self.verified_ips: Set[str] = set()
+
+
+# Token摘要 -> VerifiedToken，条目在Token过期时失效
+_verified_tokens = LRUCache(maxsize=TOKEN_CACHE_SIZE)
+
+
+def _token_digest(token: str) -> bytes:
+    """缓存键使用Token的摘要，不在内存中保留完整Token作为键"""
+    return hashlib.sha256(token.encode()).digest()
+
+
+def _remember_verified_token(digest: bytes, entry: VerifiedToken) -> None:
+    """缓存已验证的Token直到其过期时间"""
+    remaining = entry.payload["exp"] - time.time()
+    if remaining > 0:
+        _verified_tokens.set(digest, entry, ttl=remaining)
+
 
 # 安全配置
 MAX_LOGIN_ATTEMPTS = int(os.getenv("MAX_LOGIN_ATTEMPTS", "5"))
@@ -171,18 +205,46 @@ def create_refresh_token(data: dict, client_ip: Optional[str] = None) -> str:
 
 
 # --- Token验证和管理函数 ---
+def _read_unverified_claims(token: str) -> Optional[dict]:
+    """不校验签名和过期时间读取Token声明，仅用于撤销"""
+    try:
+        return jwt.decode(
+            token,
+            options={"verify_signature": False, "verify_exp": False},
+        )
+    except jwt.InvalidTokenError:
+        return None
+
+
 def blacklist_token(token: str) -> None:
-    """将Token添加到黑名单"""
+    """
+    将Token加入黑名单
+
+    撤销记录按 jti 保存在所有worker共享的数据库中，直到Token过期后被清理。
+    """
     logger.info(f"将Token加入黑名单: {token[:20]}...")
-    BLACKLISTED_TOKENS.add(token)
-    logger.debug(f"当前黑名单Token数量: {len(BLACKLISTED_TOKENS)}")
+    _verified_tokens.pop(_token_digest(token))
+    claims = _read_unverified_claims(token)
+    if not claims or not claims.get("jti") or not claims.get("exp"):
+        # 无法解析的Token本身不会通过验证，无需记录
+        logger.warning("Token缺少jti或exp，无需加入黑名单")
+        return
+    token_revocation_store.revoke(claims["jti"], int(claims["exp"]))
 
 
 def is_token_blacklisted(token: str) -> bool:
     """检查Token是否在黑名单中"""
-    is_blacklisted = token in BLACKLISTED_TOKENS
+    claims = _read_unverified_claims(token)
+    if not claims or not claims.get("jti"):
+        return False
+    return _is_jti_revoked(claims["jti"], token)
+
+
+def _is_jti_revoked(jti: str, token: str) -> bool:
+    """按 jti 检查撤销记录"""
+    is_blacklisted = token_revocation_store.is_revoked(jti)
     if is_blacklisted:
-        logger.warning(f"检测到黑名单Token: {token[:20]}...")
+        logger.warning("检测到黑名单Token: {}...", token[:20])
     return is_blacklisted
 
 
@@ -196,7 +258,7 @@ def validate_ip_address(client_ip: str, token_ip_hash: Optional[str]) -> bool:
     is_valid = current_ip_hash == token_ip_hash
 
     if is_valid:
-        logger.debug(f"IP地址验证通过: {client_ip}")
+        logger.debug("IP地址验证通过: {}", client_ip)
     else:
         logger.warning(
             f"IP地址验证失败: 当前IP={client_ip}, Token中IP哈希={token_ip_hash[:16]}..."
@@ -235,12 +297,48 @@ def check_ip_whitelist(client_ip: str) -> bool:
         return False
 
 
+def _raise_token_revoked() -> None:
+    logger.warning("Token在黑名单中，验证失败")
+    raise HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Token已被撤销，请重新登录",
+    )
+
+
+def _validate_client_ip(client_ip: str, payload: dict) -> None:
+    """
+    检查IP白名单和Token的IP绑定
+
+    Raises:
+        HTTPException: IP不在白名单中或与Token绑定的IP不一致
+    """
+    # 检查IP白名单
+    if not check_ip_whitelist(client_ip):
+        logger.warning("IP {} 不在白名单中", client_ip)
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="访问被拒绝：IP地址不在允许列表中",
+        )
+
+    # 验证IP绑定
+    token_ip_hash = payload.get("ip_hash")
+    if not validate_ip_address(client_ip, token_ip_hash):
+        logger.warning("IP地址绑定验证失败: {}", client_ip)
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token与当前IP地址不匹配",
+        )
+
+
 def decode_and_validate_token(
     token: str, client_ip: Optional[str] = None, token_type: str = "access"
 ) -> dict:
     """
     解码并验证JWT Token的完整性和安全性。
 
+    验证通过的Token按摘要缓存到过期为止，同一Token再次请求时跳过签名校验和解析，
+    只重新检查黑名单和尚未验证过的客户端IP。
+
     Args:
         token: JWT Token字符串
         client_ip: 客户端IP地址
@@ -252,15 +350,21 @@ def decode_and_validate_token(
     Raises:
         HTTPException: 当Token无效时
     """
-    logger.debug(f"开始验证Token，类型: {token_type}, IP: {client_ip}")
-
-    # 检查Token是否在黑名单中
-    if is_token_blacklisted(token):
-        logger.warning("Token在黑名单中，验证失败")
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Token已被撤销，请重新登录",
-        )
+    logger.debug("开始验证Token，类型: {}, IP: {}", token_type, client_ip)
+
+    digest = _token_digest(token)
+    cached = _verified_tokens.get(digest)
+    if cached is not None and cached.token_type == token_type:
+        # 其他worker撤销的Token不会清除本进程的缓存，每次都需检查撤销记录
+        if _is_jti_revoked(cached.payload["jti"], token):
+            _verified_tokens.pop(digest)
+            _raise_token_revoked()
+        if client_ip and client_ip not in cached.verified_ips:
+            _validate_client_ip(client_ip, cached.payload)
+            if len(cached.verified_ips) < _TOKEN_CACHE_MAX_IPS:
+                cached.verified_ips.add(client_ip)
+        logger.debug("Token验证缓存命中，用户hash: {}", cached.payload["sub"])
+        return cached.payload
 
     try:
         # 解码JWT Token
@@ -272,6 +376,10 @@ def decode_and_validate_token(
             options={"require": ["exp", "iat", "nbf", "jti", "type", "sub"]},
         )
 
+        # 检查Token是否在黑名单中
+        if _is_jti_revoked(payload["jti"], token):
+            _raise_token_revoked()
+
         # 验证Token类型
         if payload.get("type") != token_type:
             logger.warning(
@@ -290,27 +398,17 @@ def decode_and_validate_token(
                 detail="Token中缺少用户信息",
             )
 
+        entry = VerifiedToken(payload, token_type)
         # IP地址验证
         if client_ip:
-            # 检查IP白名单
-            if not check_ip_whitelist(client_ip):
-                logger.warning(f"IP {client_ip} 不在白名单中")
-                raise HTTPException(
-                    status_code=status.HTTP_403_FORBIDDEN,
-                    detail="访问被拒绝：IP地址不在允许列表中",
-                )
-
-            # 验证IP绑定
-            token_ip_hash = payload.get("ip_hash")
-            if not validate_ip_address(client_ip, token_ip_hash):
-                logger.warning(f"IP地址绑定验证失败: {client_ip}")
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="Token与当前IP地址不匹配",
-                )
+            _validate_client_ip(client_ip, payload)
+            entry.verified_ips.add(client_ip)
 
+        _remember_verified_token(digest, entry)
         logger.info(
-            f"Token验证成功，用户hash: {payload.get('sub', 'unknown')}, 类型: {token_type}"
+            "Token验证成功，用户hash: {}, 类型: {}",
+            payload.get("sub", "unknown"),
+            token_type,
         )
         return payload
 
@@ -338,6 +436,15 @@ def get_current_user_id(
     """
     logger.debug("正在从Token中提取明文学号...")
     token = credentials.credentials
+    digest = _token_digest(token)
+    cached = _verified_tokens.get(digest)
+    if cached is not None and cached.payload.get("raw_sub"):
+        # 已验证过的Token直接使用缓存的payload，撤销记录仍需每次检查
+        if _is_jti_revoked(cached.payload["jti"], token):
+            _verified_tokens.pop(digest)
+            _raise_token_revoked()
+        return cached.payload["raw_sub"]
+
     try:
         payload = jwt.decode(
             token,
@@ -358,7 +465,7 @@ def get_current_user_id(
                 detail="Token信息不完整，无法识别用户",
             )
 
-        logger.debug(f"成功从Token中提取学号: {student_id}")
+        logger.debug("成功从Token中提取学号: {}", student_id)
         return student_id
 
     except jwt.ExpiredSignatureError:
@@ -413,7 +520,7 @@ def get_current_user_with_ip(
             or request.headers.get("X-Real-IP")
             or getattr(request.client, "host", None)
         )
-        logger.debug(f"检测到客户端IP: {client_ip}")
+        logger.debug("检测到客户端IP: {}", client_ip)
 
     payload = decode_and_validate_token(token, client_ip, "access")
     return payload["sub"]  # 返回学号hash值
@@ -459,3 +566,35 @@ def logout_user(token: str) -> None:
     """
     logger.info(f"用户登出，撤销Token: {token[:20]}...")
     blacklist_token(token)
+
+
+if __name__ == "__main__":
+    # 认证依赖基准测试：python -m app.core.security [轮数]
+    import sys
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    from app.db.database import init_db
+
+    init_db()
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    access_token = create_access_token({"sub": "2020000000", "raw_sub": "2020000000"})
+    credentials = HTTPAuthorizationCredentials(
+        scheme="Bearer", credentials=access_token
+    )
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        _verified_tokens.clear()
+        get_current_user(credentials)
+    cold = (time.perf_counter() - start) / rounds * 1e6
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        get_current_user(credentials)
+    warm = (time.perf_counter() - start) / rounds * 1e6
+
+    print(f"get_current_user 完整校验: {cold:.2f}us/次")
+    print(f"get_current_user 缓存命中: {warm:.2f}us/次（{cold / warm:.1f}x）")
+    print(f"缓存统计: {_verified_tokens.stats()}")
@@ -0,0 +1,210 @@
+# app/core/token_revocation.py
+
+import hashlib
+import math
+import os
+import threading
+import time
+from loguru import logger
+
+# 各worker从共享的撤销记录表同步新记录的最短间隔（秒），即跨worker撤销的最大延迟
+TOKEN_REVOCATION_SYNC_INTERVAL = float(
+    os.getenv("TOKEN_REVOCATION_SYNC_INTERVAL", "1.0")
+)
+# 清理过期撤销记录并重建布隆过滤器的间隔（分钟）
+TOKEN_REVOCATION_COMPACT_MINUTES = int(
+    os.getenv("TOKEN_REVOCATION_COMPACT_MINUTES", "60")
+)
+# 布隆过滤器的设计容量和误判率
+TOKEN_REVOCATION_BLOOM_CAPACITY = int(
+    os.getenv("TOKEN_REVOCATION_BLOOM_CAPACITY", "100000")
+)
+TOKEN_REVOCATION_BLOOM_ERROR_RATE = 0.01
+
+
+class BloomFilter:
+    """定长位数组实现的布隆过滤器，只支持添加和查询"""
+
+    __slots__ = ("size", "hash_count", "bits", "count")
+
+    def __init__(self, capacity: int, error_rate: float):
+        """
+        Args:
+            capacity: 预计元素数量
+            error_rate: 达到容量时的误判率
+        """
+        capacity = max(1, capacity)
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str):
+        """双重hash生成 hash_count 个位下标"""
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, key: str) -> None:
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        bits = self.bits
+        return all(
+            bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(key)
+        )
+
+
+class TokenRevocationStore:
+    """
+    Token撤销记录 - 只保存 jti 和过期时间，各worker通过 sessions.db 共享
+
+    查询时先查进程内的布隆过滤器，绝大多数未撤销的Token不访问数据库；
+    命中时再按 jti 精确查询。各worker按行号增量轮询新记录加入过滤器，
+    定期清理过期记录并重建过滤器，存储规模只与有效期内被撤销的Token数量有关。
+    """
+
+    def __init__(self):
+        self._bloom = BloomFilter(
+            TOKEN_REVOCATION_BLOOM_CAPACITY, TOKEN_REVOCATION_BLOOM_ERROR_RATE
+        )
+        self._last_id = 0
+        self._last_sync = 0.0
+        # 为0表示尚未从数据库加载，首次查询时重建
+        self._last_rebuild = 0.0
+        self._lock = threading.Lock()
+        self.logger = logger
+
+    def _rebuild(self) -> None:
+        """从数据库加载全部未过期的撤销记录，重建布隆过滤器（需持有锁）"""
+        from app.db.database import get_revoked_tokens_since
+
+        now = int(time.time())
+        rows = get_revoked_tokens_since(0)
+        active = [jti for _, jti, expires_at in rows if expires_at > now]
+        bloom = BloomFilter(
+            max(TOKEN_REVOCATION_BLOOM_CAPACITY, len(active) * 2),
+            TOKEN_REVOCATION_BLOOM_ERROR_RATE,
+        )
+        for jti in active:
+            bloom.add(jti)
+        self._bloom = bloom
+        if rows:
+            self._last_id = max(self._last_id, rows[-1][0])
+        self._last_rebuild = time.monotonic()
+        self.logger.info(f"Token撤销过滤器已重建，有效撤销记录 {len(active)} 条")
+
+    def _sync(self) -> None:
+        """
+        距上次同步超过间隔时，增量读取其他worker新增的撤销记录
+
+        过滤器尚未加载时阻塞等待首次加载，加载失败时保持未加载状态，
+        由 is_revoked 直接查询数据库；只有同步成功才更新同步时间。
+        """
+        loaded = bool(self._last_rebuild)
+        if (
+            loaded
+            and time.monotonic() - self._last_sync < TOKEN_REVOCATION_SYNC_INTERVAL
+        ):
+            return
+        # 已加载时，其他线程正在同步则直接使用当前的过滤器
+        if not self._lock.acquire(blocking=not loaded):
+            return
+        try:
+            now = time.monotonic()
+            if (
+                self._last_rebuild
+                and now - self._last_sync < TOKEN_REVOCATION_SYNC_INTERVAL
+            ):
+                # 等待锁期间其他线程已完成同步
+                return
+            if (
+                not self._last_rebuild
+                or now - self._last_rebuild >= TOKEN_REVOCATION_COMPACT_MINUTES * 60
+                or self._bloom.count >= self._bloom_capacity()
+            ):
+                self._rebuild()
+            else:
+                from app.db.database import get_revoked_tokens_since
+
+                for row_id, jti, _ in get_revoked_tokens_since(self._last_id):
+                    # 本worker撤销的Token已在 revoke 中加入，不重复计数，
+                    # 否则 count 翻倍，过滤器在一半设计容量时就会重建
+                    if jti not in self._bloom:
+                        self._bloom.add(jti)
+                    self._last_id = row_id
+            self._last_sync = now
+        except Exception as e:
+            self.logger.warning(f"同步Token撤销记录失败: {e}")
+        finally:
+            self._lock.release()
+
+    def _bloom_capacity(self) -> int:
+        """当前过滤器按设计误判率可容纳的元素数量"""
+        return int(
+            self._bloom.size
+            * (math.log(2) ** 2)
+            / -math.log(TOKEN_REVOCATION_BLOOM_ERROR_RATE)
+        )
+
+    def revoke(self, jti: str, expires_at: int) -> None:
+        """
+        撤销Token
+
+        Args:
+            jti: Token的 JWT ID
+            expires_at: Token过期时间（Unix时间戳），过期后记录可被清理
+        """
+        from app.db.database import add_revoked_token
+
+        add_revoked_token(jti, expires_at)
+        with self._lock:
+            if jti not in self._bloom:
+                self._bloom.add(jti)
+
+    def is_revoked(self, jti: str) -> bool:
+        """
+        检查Token是否已被撤销（包括其他worker撤销的）
+
+        Args:
+            jti: Token的 JWT ID
+
+        Returns:
+            bool: 是否已撤销
+        """
+        self._sync()
+        # 过滤器尚未成功加载时不能据此判定未撤销，直接查询数据库
+        if self._last_rebuild and jti not in self._bloom:
+            return False
+
+        from app.db.database import is_token_revoked
+
+        try:
+            return is_token_revoked(jti, int(time.time()))
+        except Exception as e:
+            # 无法确认时按已撤销处理
+            self.logger.error(f"查询Token撤销记录失败: {e}")
+            return True
+
+    def compact(self) -> int:
+        """
+        清理已过期的撤销记录并重建布隆过滤器
+
+        Returns:
+            int: 删除的记录数
+        """
+        from app.db.database import delete_expired_revoked_tokens
+
+        deleted = delete_expired_revoked_tokens(int(time.time()))
+        with self._lock:
+            self._rebuild()
+        return deleted
+
+
+# 创建全局实例
+token_revocation_store = TokenRevocationStore()
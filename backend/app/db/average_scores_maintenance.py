@@ -0,0 +1,249 @@
+# app/db/average_scores_maintenance.py
+"""
+平均分数据库维护命令
+
+average_scores.db 为导入的静态数据集，本模块负责维护其上的辅助索引：
+- FTS5 trigram 影子索引：加速课程名称/课程代码/教师姓名的子串查询
+- 学期序号列 semester_ordinal 及 (teacher, semester_ordinal) 复合索引：
+  替代查询时逐行计算的 CAST(SUBSTR(semester, ...)) 排序表达式
+
+这两类索引只服务于 SQL 查询路径。AVERAGE_SCORES_IN_MEMORY 开启（默认）时，
+查询由内存数据集完成，SQL 只在关键词含 LIKE 通配符或内存查询出错时作为回退，
+索引和触发器带来的写入维护开销基本换不来收益，一般无需执行本模块；
+关闭内存查询（AVERAGE_SCORES_IN_MEMORY=false）时再建立索引。
+两类索引的结果一致性校验均针对 SQL 查询路径（即关闭内存查询时）。
+
+用法（在 backend 目录下执行）：
+    python -m app.db.average_scores_maintenance fts-rebuild       # 创建/重建全文索引
+    python -m app.db.average_scores_maintenance fts-check         # 校验全文索引
+    python -m app.db.average_scores_maintenance fts-drop          # 删除全文索引
+    python -m app.db.average_scores_maintenance semester-migrate  # 添加并回填学期序号列
+    python -m app.db.average_scores_maintenance all               # 执行全部维护操作
+"""
+
+import argparse
+import re
+import sys
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from loguru import logger
+
+FTS_TABLE = "average_scores_fts"
+
+# 外部内容表模式：索引只保存 trigram 倒排数据，原始内容仍在 average_scores 中
+FTS_CREATE_SQL = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+    course_name,
+    course_code,
+    teacher,
+    content='average_scores',
+    content_rowid='id',
+    tokenize='trigram'
+)
+"""
+
+# 触发器保证后续导入/修改数据时索引自动同步
+FTS_TRIGGER_SQLS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON average_scores BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, course_name, course_code, teacher)
+        VALUES (new.id, new.course_name, new.course_code, new.teacher);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON average_scores BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, course_name, course_code, teacher)
+        VALUES ('delete', old.id, old.course_name, old.course_code, old.teacher);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au
+    AFTER UPDATE OF course_name, course_code, teacher ON average_scores BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, course_name, course_code, teacher)
+        VALUES ('delete', old.id, old.course_name, old.course_code, old.teacher);
+        INSERT INTO {FTS_TABLE}(rowid, course_name, course_code, teacher)
+        VALUES (new.id, new.course_name, new.course_code, new.teacher);
+    END
+    """,
+]
+
+SEMESTER_ORDINAL_COLUMN = "semester_ordinal"
+SEMESTER_ORDINAL_INDEX = "ix_average_scores_teacher_semester_ordinal"
+
+# 学期格式：年份-年份-数字，如"2023-2024-1"
+# 序号 = 第一个年份*10^6 + 第二个年份*10^2 + 学期数字，排序结果与逐段比较一致
+SEMESTER_ORDINAL_EXPR = (
+    "CAST(SUBSTR({col}, 1, 4) AS INTEGER) * 1000000"
+    " + CAST(SUBSTR({col}, 6, 4) AS INTEGER) * 100"
+    " + CAST(SUBSTR({col}, 11) AS INTEGER)"
+)
+
+SEMESTER_TRIGGER_SQLS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS average_scores_semester_ordinal_ai
+    AFTER INSERT ON average_scores BEGIN
+        UPDATE average_scores
+        SET {SEMESTER_ORDINAL_COLUMN} = {SEMESTER_ORDINAL_EXPR.format(col="new.semester")}
+        WHERE id = new.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS average_scores_semester_ordinal_au
+    AFTER UPDATE OF semester ON average_scores BEGIN
+        UPDATE average_scores
+        SET {SEMESTER_ORDINAL_COLUMN} = {SEMESTER_ORDINAL_EXPR.format(col="new.semester")}
+        WHERE id = new.id;
+    END
+    """,
+]
+
+
+_SQLITE_INT_RE = re.compile(r"^[ \t\n\r\f\v]*([+-]?[0-9]+)")
+
+
+def _sqlite_int(value: str) -> int:
+    """模拟 SQLite 的 CAST(... AS INTEGER)：取开头的整数部分，否则为0"""
+    match = _SQLITE_INT_RE.match(value)
+    return int(match.group(1)) if match else 0
+
+
+def semester_ordinal(semester: str) -> int:
+    """在 Python 中计算学期序号，结果与 SEMESTER_ORDINAL_EXPR 一致"""
+    semester = semester or ""
+    return (
+        _sqlite_int(semester[0:4]) * 1000000
+        + _sqlite_int(semester[5:9]) * 100
+        + _sqlite_int(semester[10:])
+    )
+
+
+def has_semester_ordinal(engine: Engine) -> bool:
+    """检查学期序号列是否已创建"""
+    with engine.connect() as conn:
+        columns = conn.execute(text("PRAGMA table_info(average_scores)")).fetchall()
+    return any(column[1] == SEMESTER_ORDINAL_COLUMN for column in columns)
+
+
+def migrate_semester_ordinal(engine: Engine) -> int:
+    """
+    添加并回填学期序号列，创建同步触发器和 (teacher, semester_ordinal) 复合索引
+
+    Returns:
+        int: 回填的记录数
+    """
+    logger.info("开始迁移平均分学期序号列...")
+    exists = has_semester_ordinal(engine)
+    with engine.begin() as conn:
+        if not exists:
+            conn.execute(
+                text(
+                    f"ALTER TABLE average_scores ADD COLUMN {SEMESTER_ORDINAL_COLUMN} INTEGER"
+                )
+            )
+        result = conn.execute(
+            text(
+                f"UPDATE average_scores SET {SEMESTER_ORDINAL_COLUMN} = "
+                f"{SEMESTER_ORDINAL_EXPR.format(col='semester')}"
+            )
+        )
+        for sql in SEMESTER_TRIGGER_SQLS:
+            conn.execute(text(sql))
+        conn.execute(
+            text(
+                f"CREATE INDEX IF NOT EXISTS {SEMESTER_ORDINAL_INDEX} "
+                f"ON average_scores (teacher, {SEMESTER_ORDINAL_COLUMN} DESC)"
+            )
+        )
+        conn.execute(text("ANALYZE average_scores"))
+    logger.info(f"学期序号列迁移完成，共回填 {result.rowcount} 条记录")
+    return int(result.rowcount or 0)
+
+
+def has_fts_index(engine: Engine) -> bool:
+    """检查全文索引是否已创建"""
+    with engine.connect() as conn:
+        row = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {"name": FTS_TABLE},
+        ).first()
+    return row is not None
+
+
+def rebuild_fts_index(engine: Engine) -> int:
+    """
+    创建（如不存在）并重建全文索引及同步触发器
+
+    Returns:
+        int: 已索引的记录数
+    """
+    logger.info("开始重建平均分全文索引...")
+    with engine.begin() as conn:
+        conn.execute(text(FTS_CREATE_SQL))
+        # 重新创建触发器，确保使用最新定义
+        for suffix in ("ai", "ad", "au"):
+            conn.execute(text(f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}"))
+        for sql in FTS_TRIGGER_SQLS:
+            conn.execute(text(sql))
+        conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+        conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')"))
+        count = conn.execute(text("SELECT COUNT(*) FROM average_scores")).scalar()
+    logger.info(f"平均分全文索引重建完成，共索引 {count} 条记录")
+    return int(count or 0)
+
+
+def check_fts_index(engine: Engine) -> bool:
+    """校验全文索引与原始数据是否一致"""
+    if not has_fts_index(engine):
+        logger.warning("平均分全文索引不存在")
+        return False
+    try:
+        with engine.begin() as conn:
+            conn.execute(
+                text(
+                    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rank) VALUES ('integrity-check', 1)"
+                )
+            )
+        logger.info("平均分全文索引校验通过")
+        return True
+    except Exception as e:
+        logger.error(f"平均分全文索引校验失败，请执行 fts-rebuild: {e}")
+        return False
+
+
+def drop_fts_index(engine: Engine) -> None:
+    """删除全文索引及同步触发器"""
+    with engine.begin() as conn:
+        for suffix in ("ai", "ad", "au"):
+            conn.execute(text(f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}"))
+        conn.execute(text(f"DROP TABLE IF EXISTS {FTS_TABLE}"))
+    logger.info("平均分全文索引已删除")
+
+
+def main(argv=None) -> int:
+    from app.services.average_scores import average_scores_service
+
+    parser = argparse.ArgumentParser(description="平均分数据库维护命令")
+    parser.add_argument(
+        "command",
+        choices=["fts-rebuild", "fts-check", "fts-drop", "semester-migrate", "all"],
+        help="要执行的维护操作",
+    )
+    args = parser.parse_args(argv)
+
+    engine = average_scores_service._get_db_engine()
+    if args.command == "fts-rebuild":
+        rebuild_fts_index(engine)
+    elif args.command == "fts-check":
+        return 0 if check_fts_index(engine) else 1
+    elif args.command == "fts-drop":
+        drop_fts_index(engine)
+    elif args.command == "semester-migrate":
+        migrate_semester_ordinal(engine)
+    elif args.command == "all":
+        migrate_semester_ordinal(engine)
+        rebuild_fts_index(engine)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,10 +4,21 @@ import pickle
 import datetime
 import requests
 import os
-from typing import Optional
-from sqlalchemy import create_engine, Column, String, Integer, BLOB, TIMESTAMP, Text
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import (
+    create_engine,
+    inspect,
+    text,
+    Column,
+    String,
+    Integer,
+    BLOB,
+    TIMESTAMP,
+    Text,
+)
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import sessionmaker, declarative_base
-from app.core.hash_utils import hash_student_id
+from app.core.hash_utils import resolve_student_id_hash
 from loguru import logger
 
 # 数据库配置 - 支持Docker环境
@@ -17,6 +28,9 @@ DATABASE_URL = f"sqlite:///{DATABASE_PATH}"
 # 确保数据目录存在
 os.makedirs(os.path.dirname(DATABASE_PATH), exist_ok=True)
 
+# 培养方案缓存有效期（天）
+COURSE_PLAN_CACHE_DAYS = 30
+
 engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
@@ -36,24 +50,99 @@ class SessionStore(Base):
 class CoursePlanCache(Base):
     __tablename__ = "course_plan_cache"
     student_id_hash = Column(String, primary_key=True, index=True, nullable=False)
-    plan_content = Column(Text, nullable=False)
+    # 旧版未压缩的JSON文本，新写入的记录为空字符串
+    plan_content = Column(Text, nullable=False, default="")
+    # gzip压缩的完整缓存响应体（JSON），拆分存储后新写入的记录为空
+    plan_body = Column(BLOB, nullable=True)
+    # 培养方案数据的sha256，用作ETag
+    content_hash = Column(String, nullable=True)
+    # 共享的培养方案模板hash，见 course_plan_template 表
+    template_hash = Column(String, nullable=True, index=True)
+    # 个人部分：各模块已修学分及各课程修读状态（JSON）
+    overlay = Column(Text, nullable=True)
     updated_at = Column(TIMESTAMP, nullable=False)
 
 
+class CoursePlanTemplate(Base):
+    __tablename__ = "course_plan_template"
+    # 同专业同年级学生的培养方案模板（模块、课程、学时）相同，按内容hash只存一份
+    template_hash = Column(String, primary_key=True)
+    template_body = Column(BLOB, nullable=False)  # gzip压缩的模板JSON
+    created_at = Column(TIMESTAMP, nullable=False)
+
+
+class RevokedToken(Base):
+    __tablename__ = "revoked_tokens"
+    # AUTOINCREMENT 保证清理过期记录后行号不会被复用，各worker按行号增量同步
+    __table_args__ = {"sqlite_autoincrement": True}
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    jti = Column(String, unique=True, index=True, nullable=False)  # JWT ID
+    expires_at = Column(Integer, nullable=False)  # Token过期时间（Unix时间戳）
+
+
+class TermCalendarStore(Base):
+    __tablename__ = "term_calendar"
+    term_code = Column(String, primary_key=True)  # 学期代码，如 2025-2026-1
+    start_date = Column(String, nullable=False)  # 第1周周一 (YYYY-MM-DD)
+    updated_at = Column(TIMESTAMP, nullable=False)
+
+
+class CalendarFeedToken(Base):
+    __tablename__ = "calendar_feed_tokens"
+    # 每名学生最多一个订阅凭证，重新生成即替换（旧订阅地址失效）
+    student_id_hash = Column(String, primary_key=True)
+    token_hash = Column(String, unique=True, index=True, nullable=False)  # 凭证的sha256
+    created_at = Column(TIMESTAMP, nullable=False)
+
+
 def init_db():
     Base.metadata.create_all(bind=engine)
+    _migrate_course_plan_cache()
+
+
+def _migrate_course_plan_cache():
+    """为旧版 course_plan_cache 表补充压缩缓存所需的列"""
+    columns = {c["name"] for c in inspect(engine).get_columns("course_plan_cache")}
+    with engine.begin() as conn:
+        if "plan_body" not in columns:
+            conn.execute(
+                text("ALTER TABLE course_plan_cache ADD COLUMN plan_body BLOB")
+            )
+            logger.info("course_plan_cache 表已添加 plan_body 列")
+        if "content_hash" not in columns:
+            conn.execute(
+                text("ALTER TABLE course_plan_cache ADD COLUMN content_hash VARCHAR")
+            )
+            logger.info("course_plan_cache 表已添加 content_hash 列")
+        if "template_hash" not in columns:
+            conn.execute(
+                text("ALTER TABLE course_plan_cache ADD COLUMN template_hash VARCHAR")
+            )
+            conn.execute(
+                text(
+                    "CREATE INDEX IF NOT EXISTS ix_course_plan_cache_template_hash "
+                    "ON course_plan_cache (template_hash)"
+                )
+            )
+            logger.info("course_plan_cache 表已添加 template_hash 列")
+        if "overlay" not in columns:
+            conn.execute(text("ALTER TABLE course_plan_cache ADD COLUMN overlay TEXT"))
+            logger.info("course_plan_cache 表已添加 overlay 列")
 
 
 # --- 关键修改点在这里 ---
 
 
-def save_session(student_id: str, session_obj: requests.Session):
+def save_session(
+    student_id: str,
+    session_obj: requests.Session,
+    student_id_hash: Optional[str] = None,
+):
     """序列化并保存 session 的 cookies 到数据库（使用学号hash）"""
     db = SessionLocal()
     try:
-        # 将明文学号转换为hash值
-        student_id_hash = hash_student_id(student_id)
-        logger.debug(f"保存session - 原始学号: {student_id}, hash: {student_id_hash}")
+        # 将明文学号转换为hash值（调用方已有hash时直接使用）
+        student_id_hash = resolve_student_id_hash(student_id, student_id_hash)
 
         # 只序列化 cookiejar，更稳定、更适合持久化
         pickled_cookies = pickle.dumps(session_obj.cookies)
@@ -66,15 +155,11 @@ def save_session(student_id: str, session_obj: requests.Session):
 
         now = datetime.datetime.now()
         if db_session:
-            logger.info(
-                f"正在更新session cookies - 学号: {student_id}, hash: {student_id_hash}"
-            )
+            logger.info(f"正在更新session cookies - hash: {student_id_hash}")
             setattr(db_session, "session_data", pickled_cookies)
             setattr(db_session, "updated_at", now)
         else:
-            logger.info(
-                f"正在创建新session cookies记录 - 学号: {student_id}, hash: {student_id_hash}"
-            )
+            logger.info(f"正在创建新session cookies记录 - hash: {student_id_hash}")
             db_session = SessionStore(
                 student_id_hash=student_id_hash,
                 session_data=pickled_cookies,
@@ -84,7 +169,7 @@ def save_session(student_id: str, session_obj: requests.Session):
             db.add(db_session)
 
         db.commit()
-        logger.info(f"Session cookies保存成功 - 学号: {student_id}")
+        logger.info(f"Session cookies保存成功 - hash: {student_id_hash}")
     except Exception as e:
         logger.error(f"保存session失败: {e}")
         db.rollback()
@@ -93,13 +178,14 @@ def save_session(student_id: str, session_obj: requests.Session):
         db.close()
 
 
-def get_session(student_id: str) -> Optional[requests.Session]:
+def get_session(
+    student_id: str, student_id_hash: Optional[str] = None
+) -> Optional[requests.Session]:
     """从数据库读取 cookies 并重建一个 session 对象（使用学号hash）"""
     db = SessionLocal()
     try:
-        # 将明文学号转换为hash值进行查询
-        student_id_hash = hash_student_id(student_id)
-        logger.debug(f"查询session - 原始学号: {student_id}, hash: {student_id_hash}")
+        # 将明文学号转换为hash值进行查询（调用方已有hash时直接使用）
+        student_id_hash = resolve_student_id_hash(student_id, student_id_hash)
 
         db_session_record = (
             db.query(SessionStore)
@@ -107,9 +193,7 @@ def get_session(student_id: str) -> Optional[requests.Session]:
             .first()
         )
         if db_session_record:
-            logger.info(
-                f"成功找到session cookies - 学号: {student_id}, hash: {student_id_hash}"
-            )
+            logger.info(f"成功找到session cookies - hash: {student_id_hash}")
 
             # 创建一个新的、干净的 Session 对象
             new_session = requests.Session()
@@ -132,15 +216,15 @@ def get_session(student_id: str) -> Optional[requests.Session]:
                 loaded_cookies = pickle.loads(session_data_bytes)
                 new_session.cookies.update(loaded_cookies)
 
-                logger.info(f"Session对象重建成功 - 学号: {student_id}")
+                logger.info(f"Session对象重建成功 - hash: {student_id_hash}")
                 return new_session
             else:
-                logger.warning(f"Session数据为空（可能已被清空）- 学号: {student_id}")
+                logger.warning(
+                    f"Session数据为空（可能已被清空）- hash: {student_id_hash}"
+                )
                 return None
         else:
-            logger.info(
-                f"数据库中未找到session - 学号: {student_id}, hash: {student_id_hash}"
-            )
+            logger.info(f"数据库中未找到session - hash: {student_id_hash}")
             return None
     except Exception as e:
         logger.error(f"获取session失败: {e}")
@@ -201,15 +285,12 @@ def get_session_by_hash(student_id_hash: str) -> Optional[requests.Session]:
         db.close()
 
 
-def delete_session(student_id: str) -> bool:
+def delete_session(student_id: str, student_id_hash: Optional[str] = None) -> bool:
     """清空指定学号的session数据，保留记录行（使用学号hash）"""
     db = SessionLocal()
     try:
-        # 将明文学号转换为hash值
-        student_id_hash = hash_student_id(student_id)
-        logger.debug(
-            f"清空session数据 - 原始学号: {student_id}, hash: {student_id_hash}"
-        )
+        # 将明文学号转换为hash值（调用方已有hash时直接使用）
+        student_id_hash = resolve_student_id_hash(student_id, student_id_hash)
 
         db_session_record = (
             db.query(SessionStore)
@@ -222,14 +303,10 @@ def delete_session(student_id: str) -> bool:
             setattr(db_session_record, "session_data", None)
             setattr(db_session_record, "updated_at", datetime.datetime.now())
             db.commit()
-            logger.info(
-                f"成功清空session数据 - 学号: {student_id}, hash: {student_id_hash}"
-            )
+            logger.info(f"成功清空session数据 - hash: {student_id_hash}")
             return True
         else:
-            logger.info(
-                f"数据库中未找到要清空的session - 学号: {student_id}, hash: {student_id_hash}"
-            )
+            logger.info(f"数据库中未找到要清空的session - hash: {student_id_hash}")
             return False
 
     except Exception as e:
@@ -314,11 +391,13 @@ def delete_session_by_hash(student_id_hash: str) -> bool:
         db.close()
 
 
-def get_course_plan(student_id: str) -> Optional[dict]:
-    """获取用户的培养方案缓存"""
+def get_course_plan(
+    student_id: str, student_id_hash: Optional[str] = None
+) -> Optional[dict]:
+    """获取用户的培养方案缓存（模板hash及个人部分，旧版记录为压缩的响应体）"""
     db = SessionLocal()
     try:
-        student_id_hash = hash_student_id(student_id)
+        student_id_hash = resolve_student_id_hash(student_id, student_id_hash)
         cache_item = (
             db.query(CoursePlanCache)
             .filter(CoursePlanCache.student_id_hash == student_id_hash)
@@ -326,13 +405,21 @@ def get_course_plan(student_id: str) -> Optional[dict]:
         )
 
         if cache_item:
-            # 检查缓存是否在30天内
+            # 检查缓存是否在有效期内
             updated_at_value = cache_item.updated_at
             if isinstance(updated_at_value, datetime.datetime) and (
                 datetime.datetime.now() - updated_at_value
-            ) < datetime.timedelta(days=30):
+            ) < datetime.timedelta(days=COURSE_PLAN_CACHE_DAYS):
                 logger.info(f"找到有效的培养方案缓存 - 学号: {student_id}")
+                plan_body = cache_item.plan_body
+                if isinstance(plan_body, memoryview):
+                    plan_body = plan_body.tobytes()
                 return {
+                    "template_hash": cache_item.template_hash,
+                    "overlay": cache_item.overlay,
+                    "content_hash": cache_item.content_hash,
+                    # 旧版记录只有完整响应体或未压缩的JSON文本，由调用方转换
+                    "plan_body": plan_body,
                     "plan_content": cache_item.plan_content,
                     "updated_at": cache_item.updated_at,
                 }
@@ -345,12 +432,19 @@ def get_course_plan(student_id: str) -> Optional[dict]:
         db.close()
 
 
-def save_course_plan(student_id: str, plan_content: str):
-    """保存或更新用户的培养方案缓存"""
+def save_course_plan(
+    student_id: str,
+    template_hash: str,
+    overlay: str,
+    content_hash: str,
+    updated_at: Optional[datetime.datetime] = None,
+    student_id_hash: Optional[str] = None,
+):
+    """保存或更新用户的培养方案缓存（模板hash、个人部分及内容hash）"""
     db = SessionLocal()
     try:
-        student_id_hash = hash_student_id(student_id)
-        now = datetime.datetime.now()
+        student_id_hash = resolve_student_id_hash(student_id, student_id_hash)
+        now = updated_at or datetime.datetime.now()
 
         cache_item = (
             db.query(CoursePlanCache)
@@ -359,13 +453,25 @@ def save_course_plan(student_id: str, plan_content: str):
         )
 
         if cache_item:
-            setattr(cache_item, "plan_content", plan_content)
+            old_template_hash = cache_item.template_hash
+            setattr(cache_item, "plan_content", "")
+            setattr(cache_item, "plan_body", None)
+            setattr(cache_item, "content_hash", content_hash)
+            setattr(cache_item, "template_hash", template_hash)
+            setattr(cache_item, "overlay", overlay)
             setattr(cache_item, "updated_at", now)
+            if old_template_hash and old_template_hash != template_hash:
+                db.flush()
+                _delete_unused_template(db, old_template_hash)
             logger.info(f"更新培养方案缓存 - 学号: {student_id}")
         else:
             cache_item = CoursePlanCache(
                 student_id_hash=student_id_hash,
-                plan_content=plan_content,
+                plan_content="",
+                plan_body=None,
+                content_hash=content_hash,
+                template_hash=template_hash,
+                overlay=overlay,
                 updated_at=now,
             )
             db.add(cache_item)
@@ -380,11 +486,11 @@ def save_course_plan(student_id: str, plan_content: str):
         db.close()
 
 
-def delete_course_plan(student_id: str) -> bool:
+def delete_course_plan(student_id: str, student_id_hash: Optional[str] = None) -> bool:
     """删除用户的培养方案缓存"""
     db = SessionLocal()
     try:
-        student_id_hash = hash_student_id(student_id)
+        student_id_hash = resolve_student_id_hash(student_id, student_id_hash)
         cache_item = (
             db.query(CoursePlanCache)
             .filter(CoursePlanCache.student_id_hash == student_id_hash)
@@ -392,7 +498,11 @@ def delete_course_plan(student_id: str) -> bool:
         )
 
         if cache_item:
+            template_hash = cache_item.template_hash
             db.delete(cache_item)
+            if template_hash:
+                db.flush()
+                _delete_unused_template(db, template_hash)
             db.commit()
             logger.info(f"删除培养方案缓存 - 学号: {student_id}")
             return True
@@ -405,5 +515,260 @@ def delete_course_plan(student_id: str) -> bool:
         db.close()
 
 
+def _delete_unused_template(db, template_hash: str) -> None:
+    """删除不再被任何学生引用的培养方案模板（在调用方的事务中执行）"""
+    in_use = (
+        db.query(CoursePlanCache.student_id_hash)
+        .filter(CoursePlanCache.template_hash == template_hash)
+        .first()
+    )
+    if in_use is None:
+        db.query(CoursePlanTemplate).filter(
+            CoursePlanTemplate.template_hash == template_hash
+        ).delete()
+        logger.info(f"删除未被引用的培养方案模板: {template_hash[:12]}")
+
+
+def get_course_plan_template(template_hash: str) -> Optional[bytes]:
+    """按hash读取共享的培养方案模板（gzip压缩的JSON）"""
+    db = SessionLocal()
+    try:
+        item = (
+            db.query(CoursePlanTemplate)
+            .filter(CoursePlanTemplate.template_hash == template_hash)
+            .first()
+        )
+        if item is None:
+            return None
+        body = item.template_body
+        return body.tobytes() if isinstance(body, memoryview) else body
+    except Exception as e:
+        logger.error(f"获取培养方案模板失败: {e}")
+        return None
+    finally:
+        db.close()
+
+
+def save_course_plan_template(template_hash: str, template_body: bytes) -> bool:
+    """
+    保存共享的培养方案模板，已存在时不重复写入
+
+    Returns:
+        bool: 是否新写入了模板
+    """
+    db = SessionLocal()
+    try:
+        exists = (
+            db.query(CoursePlanTemplate.template_hash)
+            .filter(CoursePlanTemplate.template_hash == template_hash)
+            .first()
+        )
+        if exists:
+            return False
+        db.add(
+            CoursePlanTemplate(
+                template_hash=template_hash,
+                template_body=template_body,
+                created_at=datetime.datetime.now(),
+            )
+        )
+        db.commit()
+        logger.info(f"新建培养方案模板: {template_hash[:12]}")
+        return True
+    except IntegrityError:
+        # 同一模板被并发写入，已由另一个请求保存
+        db.rollback()
+        return False
+    except Exception as e:
+        logger.error(f"保存培养方案模板失败: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def add_revoked_token(jti: str, expires_at: int) -> None:
+    """记录被撤销的Token（按jti），重复撤销时忽略"""
+    db = SessionLocal()
+    try:
+        db.add(RevokedToken(jti=jti, expires_at=int(expires_at)))
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+    except Exception as e:
+        logger.error(f"保存Token撤销记录失败: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def get_revoked_tokens_since(last_id: int) -> List[Tuple[int, str, int]]:
+    """
+    按行号增量读取撤销记录
+
+    Args:
+        last_id: 上次同步到的行号
+
+    Returns:
+        List[Tuple[int, str, int]]: [(行号, jti, 过期时间戳)]，按行号升序
+    """
+    db = SessionLocal()
+    try:
+        rows = (
+            db.query(RevokedToken.id, RevokedToken.jti, RevokedToken.expires_at)
+            .filter(RevokedToken.id > last_id)
+            .order_by(RevokedToken.id)
+            .all()
+        )
+        return [(row.id, row.jti, row.expires_at) for row in rows]
+    finally:
+        db.close()
+
+
+def is_token_revoked(jti: str, now: int) -> bool:
+    """精确查询jti是否已被撤销且尚未过期"""
+    db = SessionLocal()
+    try:
+        row = (
+            db.query(RevokedToken.id)
+            .filter(RevokedToken.jti == jti, RevokedToken.expires_at > now)
+            .first()
+        )
+        return row is not None
+    finally:
+        db.close()
+
+
+def delete_expired_revoked_tokens(now: int) -> int:
+    """删除已过期的撤销记录（过期的Token本身已无法通过验证）"""
+    db = SessionLocal()
+    try:
+        deleted = (
+            db.query(RevokedToken)
+            .filter(RevokedToken.expires_at <= now)
+            .delete(synchronize_session=False)
+        )
+        db.commit()
+        return deleted
+    except Exception as e:
+        logger.error(f"清理过期Token撤销记录失败: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def get_term_calendar() -> Dict[str, str]:
+    """读取已记录的各学期开始日期 {学期代码: 第1周周一}"""
+    db = SessionLocal()
+    try:
+        return {item.term_code: item.start_date for item in db.query(TermCalendarStore)}
+    except Exception as e:
+        logger.error(f"读取学期校历失败: {e}")
+        return {}
+    finally:
+        db.close()
+
+
+def save_term_start(term_code: str, start_date: str):
+    """保存或更新学期开始日期"""
+    db = SessionLocal()
+    try:
+        now = datetime.datetime.now()
+        item = (
+            db.query(TermCalendarStore)
+            .filter(TermCalendarStore.term_code == term_code)
+            .first()
+        )
+
+        if item:
+            setattr(item, "start_date", start_date)
+            setattr(item, "updated_at", now)
+        else:
+            db.add(
+                TermCalendarStore(
+                    term_code=term_code, start_date=start_date, updated_at=now
+                )
+            )
+
+        db.commit()
+        logger.info(f"保存学期校历 - {term_code} 开始于 {start_date}")
+    except Exception as e:
+        logger.error(f"保存学期校历失败: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def save_calendar_feed_token(student_id_hash: str, token_hash: str):
+    """保存学生的课程表订阅凭证（sha256），替换已有的凭证"""
+    db = SessionLocal()
+    try:
+        now = datetime.datetime.now()
+        item = (
+            db.query(CalendarFeedToken)
+            .filter(CalendarFeedToken.student_id_hash == student_id_hash)
+            .first()
+        )
+
+        if item:
+            setattr(item, "token_hash", token_hash)
+            setattr(item, "created_at", now)
+        else:
+            db.add(
+                CalendarFeedToken(
+                    student_id_hash=student_id_hash,
+                    token_hash=token_hash,
+                    created_at=now,
+                )
+            )
+
+        db.commit()
+        logger.info(f"生成课程表订阅凭证 - 学号hash: {student_id_hash}")
+    except Exception as e:
+        logger.error(f"保存课程表订阅凭证失败: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def get_calendar_feed_owner(token_hash: str) -> Optional[str]:
+    """按订阅凭证的sha256查询所属学生的学号hash"""
+    db = SessionLocal()
+    try:
+        item = (
+            db.query(CalendarFeedToken.student_id_hash)
+            .filter(CalendarFeedToken.token_hash == token_hash)
+            .first()
+        )
+        return item.student_id_hash if item else None
+    finally:
+        db.close()
+
+
+def delete_calendar_feed_token(student_id_hash: str) -> bool:
+    """撤销学生的课程表订阅凭证"""
+    db = SessionLocal()
+    try:
+        deleted = (
+            db.query(CalendarFeedToken)
+            .filter(CalendarFeedToken.student_id_hash == student_id_hash)
+            .delete()
+        )
+        db.commit()
+        if deleted:
+            logger.info(f"撤销课程表订阅凭证 - 学号hash: {student_id_hash}")
+        return bool(deleted)
+    except Exception as e:
+        logger.error(f"撤销课程表订阅凭证失败: {e}")
+        db.rollback()
+        return False
+    finally:
+        db.close()
+
+
 if __name__ == "__main__":
     init_db()
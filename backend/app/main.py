@@ -1,7 +1,7 @@
 # app/main.py
 
 import uvicorn
-from fastapi import FastAPI, Request, Response
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 from loguru import logger
@@ -9,16 +9,30 @@ import sys
 import os
 from contextlib import asynccontextmanager
 from app.middleware.origin_validation import OriginValidationMiddleware
+from app.middleware.access_log import AccessLogMiddleware, route_stats
 
 # 日志系统完善
 from datetime import datetime
 
-LOG_LEVEL = os.getenv("LOG_LEVEL", "DEBUG")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+# 异常日志是否输出各层变量值（开销较大，排查问题时再开启）
+LOG_DIAGNOSE = os.getenv("LOG_DIAGNOSE", "false").lower() == "true"
 # 以启动时间命名日志文件
 LOG_DIR = os.getenv("LOG_DIR", "logs")
 os.makedirs(LOG_DIR, exist_ok=True)
 # 使用 Loguru 时间占位符，日志轮转命名为 YYYY-MM-DD_hh-mm-ss（Windows 不允许 :）
 LOG_PATH = os.path.join(LOG_DIR, "{time:YYYY-MM-DD_hh-mm-ss}.log")
+# 结构化访问日志（每行一条JSON），由访问日志中间件批量写入
+ACCESS_LOG_PATH = os.path.join(LOG_DIR, "access_{time:YYYY-MM-DD_hh-mm-ss}.log")
+
+
+def _is_access_log(record) -> bool:
+    return "access_log" in record["extra"]
+
+
+def _is_app_log(record) -> bool:
+    return "access_log" not in record["extra"]
+
 
 # 移除默认的logger
 logger.remove()
@@ -26,6 +40,7 @@ logger.remove()
 logger.add(
     sys.stdout,
     level=LOG_LEVEL,
+    filter=_is_app_log,
     format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>",
 )
 # 文件日志，保留7天，自动轮转
@@ -37,9 +52,20 @@ logger.add(
     encoding="utf-8",
     enqueue=True,
     backtrace=True,
-    diagnose=True,
+    diagnose=LOG_DIAGNOSE,
+    filter=_is_app_log,
     format="{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {process} | {thread} | {name}:{function}:{line} - {message}",
 )
+# 访问日志文件，后台线程已经批量写入，不再经过 enqueue 队列
+logger.add(
+    ACCESS_LOG_PATH,
+    rotation="50 MB",
+    retention="7 days",
+    level="INFO",
+    encoding="utf-8",
+    filter=_is_access_log,
+    format="{message}",
+)
 
 # 加载环境变量 - 必须在导入其他模块之前
 logger.info("正在加载环境变量...")
@@ -67,6 +93,13 @@ async def lifespan(app: FastAPI):
         scheduler.add_semester_update_job()
         logger.info("学期数据更新定时任务已添加")
 
+        from app.core.token_revocation import TOKEN_REVOCATION_COMPACT_MINUTES
+
+        scheduler.add_token_revocation_compaction_job(
+            interval_minutes=TOKEN_REVOCATION_COMPACT_MINUTES
+        )
+        logger.info("Token撤销记录清理定时任务已添加")
+
         scheduler.start()
         logger.info("定时任务启动完成")
     except Exception as e:
@@ -110,6 +143,34 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.error(f"停止定时任务失败: {e}")
 
+    try:
+        from app.services.freshman_questions_search import question_search_service
+
+        question_search_service.shutdown_pool()
+    except Exception as e:
+        logger.error(f"关闭题库搜索进程池失败: {e}")
+
+    try:
+        from app.services.semester_timetable import semester_timetable
+
+        semester_timetable.shutdown()
+    except Exception as e:
+        logger.error(f"关闭课程表预取线程池失败: {e}")
+
+    try:
+        from app.services.course_plan import CoursePlanService
+
+        CoursePlanService.shutdown()
+    except Exception as e:
+        logger.error(f"关闭培养方案刷新线程池失败: {e}")
+
+    try:
+        from app.middleware.access_log import access_log_writer
+
+        access_log_writer.stop()
+    except Exception as e:
+        logger.error(f"写出剩余访问日志失败: {e}")
+
 
 # 创建FastAPI应用实例
 logger.info("正在创建FastAPI应用实例...")
@@ -151,6 +212,10 @@ if origin_validation_enabled:
 else:
     logger.warning("已禁用来源验证中间件（ORIGIN_VALIDATION_ENABLED=false）")
 
+# 访问日志中间件（最外层，计时覆盖其余中间件）
+app.add_middleware(AccessLogMiddleware)
+logger.info("访问日志中间件添加完成")
+
 # 初始化数据库
 logger.info("正在初始化数据库...")
 try:
@@ -165,29 +230,6 @@ except Exception as e:
     raise
 
 
-# 请求日志中间件
-@app.middleware("http")
-async def log_requests(request: Request, call_next):
-    start_time = datetime.now()
-    logger.info(
-        f"收到请求: {request.method} {request.url} - 客户端IP: {request.client.host if request.client else 'unknown'}"
-    )
-
-    try:
-        response = await call_next(request)
-        process_time = (datetime.now() - start_time).total_seconds()
-        logger.info(
-            f"请求处理完成: {request.method} {request.url} - 状态码: {response.status_code} - 处理时间: {process_time:.3f}秒"
-        )
-        return response
-    except Exception as e:
-        process_time = (datetime.now() - start_time).total_seconds()
-        logger.error(
-            f"请求处理异常: {request.method} {request.url} - 错误: {e} - 处理时间: {process_time:.3f}秒"
-        )
-        raise
-
-
 @app.get("/", tags=["Root"])
 def read_root():
     logger.info("访问根路径 /")
@@ -207,6 +249,19 @@ def readyz():
     return Response(status_code=503)
 
 
+# 当前worker按路由聚合的请求耗时统计，暴露路由和流量信息，默认关闭
+metrics_endpoint_enabled = (
+    os.getenv("METRICS_ENDPOINT_ENABLED", "false").lower() == "true"
+)
+if metrics_endpoint_enabled:
+
+    @app.get("/metrics/routes", tags=["Health"])
+    def route_metrics():
+        return route_stats.snapshot()
+
+    logger.info("已启用路由耗时统计接口 /metrics/routes")
+
+
 # 全局预检请求兜底，防止被其它中间件拦截导致 CORS 失败
 @app.options("/{path:path}")
 async def preflight_handler(path: str):
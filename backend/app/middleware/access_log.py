@@ -0,0 +1,426 @@
+"""
+访问日志中间件模块
+
+按比例采样记录结构化访问日志，并按路由聚合请求耗时。
+请求处理路径上只做计时、计数和入队，JSON序列化和写日志由后台线程批量完成，
+日志开销不随请求量线性增长。
+"""
+
+import bisect
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+from loguru import logger
+
+# 访问日志采样比例（0~1），5xx和慢请求总是记录
+ACCESS_LOG_SAMPLE_RATE = float(os.getenv("ACCESS_LOG_SAMPLE_RATE", "0.1"))
+# 慢请求阈值（毫秒）
+ACCESS_LOG_SLOW_MS = float(os.getenv("ACCESS_LOG_SLOW_MS", "1000"))
+# 后台线程批量写日志的间隔（秒）
+ACCESS_LOG_FLUSH_INTERVAL = float(os.getenv("ACCESS_LOG_FLUSH_INTERVAL", "1.0"))
+# 待写日志缓冲区上限，写入跟不上时丢弃最旧的记录
+ACCESS_LOG_BUFFER_SIZE = int(os.getenv("ACCESS_LOG_BUFFER_SIZE", "10000"))
+
+# 耗时直方图的桶上界（毫秒），用于估算分位数
+LATENCY_BUCKETS_MS = (
+    1,
+    2,
+    5,
+    10,
+    20,
+    50,
+    100,
+    200,
+    500,
+    1000,
+    2000,
+    5000,
+    10000,
+    30000,
+)
+
+# 未匹配到路由的请求（404、扫描器等）统一归入该标签，避免按原始路径无限增长
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+class RouteLatency:
+    """单个路由的耗时统计"""
+
+    __slots__ = ("count", "errors", "total_ms", "max_ms", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        # 最后一个桶记录超过最大上界的请求
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def observe(self, duration_ms: float, status: int) -> None:
+        self.count += 1
+        if status >= 500:
+            self.errors += 1
+        self.total_ms += duration_ms
+        if duration_ms > self.max_ms:
+            self.max_ms = duration_ms
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS_MS, duration_ms)] += 1
+
+    def percentile(self, q: float) -> float:
+        """按直方图估算分位数，返回所在桶的上界（超过最大上界时返回最大值）"""
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.buckets):
+            seen += bucket_count
+            if seen >= rank and bucket_count:
+                if index < len(LATENCY_BUCKETS_MS):
+                    return round(float(min(LATENCY_BUCKETS_MS[index], self.max_ms)), 2)
+                break
+        return round(self.max_ms, 2)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "error_count": self.errors,
+            "avg_ms": round(self.total_ms / self.count, 2) if self.count else 0.0,
+            "max_ms": round(self.max_ms, 2),
+            "p50_ms": self.percentile(0.5),
+            "p95_ms": self.percentile(0.95),
+            "p99_ms": self.percentile(0.99),
+        }
+
+
+class AccessLogWriter:
+    """
+    访问日志后台写入器
+
+    请求线程只把记录追加到定长缓冲区；后台线程定期取出整批记录，
+    序列化为JSON行后一次写入带 access_log 标记的 loguru 日志。
+    """
+
+    def __init__(
+        self,
+        flush_interval: float = ACCESS_LOG_FLUSH_INTERVAL,
+        buffer_size: int = ACCESS_LOG_BUFFER_SIZE,
+    ):
+        self.flush_interval = flush_interval
+        self._buffer: deque = deque(maxlen=buffer_size)
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self.dropped = 0
+        self.written = 0
+        self.logger = logger.bind(access_log=True)
+
+    def submit(self, record: Dict[str, Any]) -> None:
+        """追加一条访问记录（缓冲区满时丢弃最旧的记录）"""
+        if self._thread is None:
+            self.start()
+        if len(self._buffer) == self._buffer.maxlen:
+            self.dropped += 1
+        self._buffer.append(record)
+
+    def start(self) -> None:
+        """启动后台写入线程"""
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self._stop_event.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="access-log-writer", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop_event.wait(self.flush_interval):
+            self.flush()
+        self.flush()
+
+    def flush(self) -> int:
+        """
+        将缓冲区中的记录批量写入日志
+
+        Returns:
+            int: 写入的记录数
+        """
+        batch = []
+        buffer = self._buffer
+        while buffer:
+            try:
+                batch.append(buffer.popleft())
+            except IndexError:
+                break
+        if not batch:
+            return 0
+
+        try:
+            self.logger.info(
+                "\n".join(
+                    json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+                    for record in batch
+                )
+            )
+            self.written += len(batch)
+        except Exception as e:
+            logger.error(f"写入访问日志失败: {e}")
+        return len(batch)
+
+    def stop(self) -> None:
+        """停止后台线程并写出剩余记录"""
+        with self._start_lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stop_event.set()
+            thread.join(timeout=5)
+        else:
+            self.flush()
+
+
+class AccessLogMiddleware:
+    """
+    访问日志中间件（纯ASGI实现）
+
+    每个请求用单调时钟计时并计入所在路由的耗时统计；
+    按 ACCESS_LOG_SAMPLE_RATE 采样写入结构化访问日志，5xx和慢请求总是写入。
+    统计数据按worker进程分别保存。
+    """
+
+    def __init__(
+        self,
+        app,
+        sample_rate: float = ACCESS_LOG_SAMPLE_RATE,
+        slow_ms: float = ACCESS_LOG_SLOW_MS,
+        writer: Optional[AccessLogWriter] = None,
+    ):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.writer = writer or access_log_writer
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        error = None
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception as e:
+            status_code = 500
+            error = e
+            raise
+        finally:
+            duration_ms = (time.perf_counter() - start) * 1000
+            self._record(scope, status_code, duration_ms, error)
+
+    def _record(
+        self,
+        scope,
+        status_code: int,
+        duration_ms: float,
+        error: Optional[Exception],
+    ) -> None:
+        """计入路由统计，并按采样规则提交访问日志"""
+        route = scope.get("route")
+        route_path = getattr(route, "path", None) or UNMATCHED_ROUTE
+        route_stats.observe(scope["method"], route_path, duration_ms, status_code)
+
+        if (
+            status_code < 500
+            and duration_ms < self.slow_ms
+            and random.random() >= self.sample_rate
+        ):
+            return
+
+        client = scope.get("client")
+        record = {
+            "ts": time.time(),
+            "method": scope["method"],
+            "path": scope["path"],
+            "route": route_path,
+            "status": status_code,
+            "duration_ms": round(duration_ms, 2),
+            "client": client[0] if client else None,
+        }
+        if scope.get("query_string"):
+            record["query"] = scope["query_string"].decode("latin-1")
+        if error is not None:
+            record["error"] = f"{type(error).__name__}: {error}"
+            logger.error(
+                "请求处理异常: {} {} - 错误: {} - 处理时间: {:.3f}秒",
+                scope["method"],
+                scope["path"],
+                error,
+                duration_ms / 1000,
+            )
+        self.writer.submit(record)
+
+
+class RouteStats:
+    """按 (方法, 路由模板) 聚合的请求耗时统计"""
+
+    def __init__(self):
+        self._routes: Dict[tuple, RouteLatency] = {}
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+
+    def observe(
+        self, method: str, route_path: str, duration_ms: float, status: int
+    ) -> None:
+        key = (method, route_path)
+        stats = self._routes.get(key)
+        if stats is None:
+            with self._lock:
+                stats = self._routes.setdefault(key, RouteLatency())
+        stats.observe(duration_ms, status)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        导出当前worker的耗时统计
+
+        Returns:
+            dict: 统计起始时间、采样配置和按请求数降序排列的各路由统计
+        """
+        with self._lock:
+            items = list(self._routes.items())
+        routes = [
+            {"method": method, "route": route_path, **stats.to_dict()}
+            for (method, route_path), stats in items
+        ]
+        routes.sort(key=lambda x: x["count"], reverse=True)
+        return {
+            "pid": os.getpid(),
+            "started_at": self.started_at,
+            "sample_rate": ACCESS_LOG_SAMPLE_RATE,
+            "slow_ms": ACCESS_LOG_SLOW_MS,
+            "written_records": access_log_writer.written,
+            "dropped_records": access_log_writer.dropped,
+            "routes": routes,
+        }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._routes = {}
+            self.started_at = time.time()
+
+
+# 创建全局实例
+access_log_writer = AccessLogWriter()
+route_stats = RouteStats()
+
+
+if __name__ == "__main__":
+    # 访问日志开销基准测试：python -m app.middleware.access_log [轮数]
+    import asyncio
+    import sys
+    import tempfile
+    from datetime import datetime
+
+    from fastapi import FastAPI, Request
+
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    log_path = os.path.join(tempfile.mkdtemp(), "bench.log")
+    logger.remove()
+    # 与改写前 main.py 的默认配置一致：DEBUG级别、diagnose=True、enqueue=True
+    logger.add(
+        log_path,
+        level="DEBUG",
+        enqueue=True,
+        backtrace=True,
+        diagnose=True,
+        filter=lambda r: "access_log" not in r["extra"],
+    )
+    logger.add(
+        log_path + ".access",
+        format="{message}",
+        filter=lambda r: "access_log" in r["extra"],
+    )
+
+    def build_app(mode: str) -> FastAPI:
+        app = FastAPI()
+
+        @app.get("/api/v1/items/{item_id}")
+        async def item(item_id: int):
+            return {"id": item_id}
+
+        if mode == "legacy":
+
+            @app.middleware("http")
+            async def log_requests(request: Request, call_next):
+                start_time = datetime.now()
+                logger.info(
+                    f"收到请求: {request.method} {request.url} - 客户端IP: {request.client.host if request.client else 'unknown'}"
+                )
+                response = await call_next(request)
+                process_time = (datetime.now() - start_time).total_seconds()
+                logger.info(
+                    f"请求处理完成: {request.method} {request.url} - 状态码: {response.status_code} - 处理时间: {process_time:.3f}秒"
+                )
+                return response
+
+        elif mode == "access_log":
+            app.add_middleware(AccessLogMiddleware)
+        return app
+
+    def make_scope(i: int) -> dict:
+        return {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": f"/api/v1/items/{i}",
+            "raw_path": f"/api/v1/items/{i}".encode(),
+            "root_path": "",
+            "query_string": b"q=test",
+            "server": ("127.0.0.1", 8000),
+            "client": ("10.0.0.1", 50000),
+            "headers": [(b"host", b"127.0.0.1:8000")],
+        }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    async def measure(app: FastAPI) -> float:
+        for i in range(200):
+            await app(make_scope(i), receive, send)
+        start = time.perf_counter()
+        for i in range(rounds):
+            await app(make_scope(i), receive, send)
+        elapsed = (time.perf_counter() - start) / rounds * 1e6
+        # 等待上一轮的日志写完，避免影响下一轮
+        await logger.complete()
+        return elapsed
+
+    async def main():
+        bare = await measure(build_app("none"))
+        legacy = await measure(build_app("legacy"))
+        current = await measure(build_app("access_log"))
+        access_log_writer.stop()
+        print(f"无中间件: {bare:.1f}us/请求")
+        print(f"log_requests: {legacy:.1f}us/请求（开销 {legacy - bare:.1f}us）")
+        print(
+            f"AccessLogMiddleware: {current:.1f}us/请求（开销 {current - bare:.1f}us）"
+        )
+        print(
+            f"访问日志写入 {access_log_writer.written} 条，"
+            f"路由统计: {route_stats.snapshot()['routes'][0]}"
+        )
+
+    asyncio.run(main())
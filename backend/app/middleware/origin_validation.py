@@ -8,122 +8,149 @@
 创建时间: 2024
 """
 
-from fastapi import Request, Response
+import os
+import re
+from typing import Optional, Tuple
+
 from fastapi.responses import JSONResponse
-from starlette.middleware.base import BaseHTTPMiddleware
 from loguru import logger
-import re
 
+from app.utils.lru_cache import LRUCache
+
+# 来源判定结果缓存条目数（按 Origin/Referer/Host/User-Agent 组合缓存）
+ORIGIN_DECISION_CACHE_SIZE = int(os.getenv("ORIGIN_DECISION_CACHE_SIZE", "2048"))
+
+# 允许的域名模式
+ALLOWED_ORIGIN_PATTERNS = [
+    r"^https?://localhost(:\d+)?/?.*$",
+    r"^https?://127\.0\.0\.1(:\d+)?/?.*$",
+    r"^https?://([a-zA-Z0-9-]+\.)*easy-qfnu\.top(:\d+)?/?.*$",
+    r"^https://servicewechat\.com/?.*$",  # 微信小程序
+]
+
+# 允许的主机模式
+ALLOWED_HOST_PATTERNS = [
+    r"^localhost(:\d+)?$",
+    r"^127\.0\.0\.1(:\d+)?$",
+    r"^([a-zA-Z0-9-]+\.)*easy-qfnu\.top(:\d+)?$",
+]
+
+# 移动端User-Agent关键字（这些请求通常没有完整的Origin信息）
+MOBILE_USER_AGENT_KEYWORDS = [
+    "Mobile",
+    "Android",
+    "iPhone",
+    "iPad",
+    "MicroMessenger",  # 微信
+    "QQ",
+    "Alipay",
+]
+
+# 已知的移动端应用，可进一步放宽验证（区分大小写）
+KNOWN_MOBILE_APP_KEYWORDS = ["MicroMessenger", "QQ", "Alipay"]
+
+# 特殊路径白名单（不需要验证来源的路径）
+WHITELIST_PATHS = frozenset(["/", "/docs", "/redoc", "/openapi.json", "/favicon.ico"])
 
-class OriginValidationMiddleware(BaseHTTPMiddleware):
+
+def _combine(patterns, flags: int = 0) -> "re.Pattern":
+    """将多个正则合并为一个预编译的分支表达式，一次匹配代替逐个尝试"""
+    return re.compile("|".join(f"(?:{p})" for p in patterns), flags)
+
+
+_ALLOWED_ORIGIN_RE = _combine(ALLOWED_ORIGIN_PATTERNS, re.IGNORECASE)
+_ALLOWED_HOST_RE = _combine(ALLOWED_HOST_PATTERNS, re.IGNORECASE)
+_MOBILE_USER_AGENT_RE = _combine(
+    (re.escape(k) for k in MOBILE_USER_AGENT_KEYWORDS), re.IGNORECASE
+)
+_KNOWN_MOBILE_APP_RE = _combine(re.escape(k) for k in KNOWN_MOBILE_APP_KEYWORDS)
+
+_HEADER_NAMES = (b"origin", b"referer", b"host", b"user-agent")
+
+
+class OriginValidationMiddleware:
     """
-    来源验证中间件
+    来源验证中间件（纯ASGI实现）
 
     验证HTTP请求的来源是否合法，支持多种验证策略：
     1. Origin头验证
     2. Referer头验证
     3. User-Agent检测（移动端特殊处理）
     4. Host头验证
+
+    直接处理ASGI scope，不创建Request对象，也不包装请求体和响应流；
+    判定结果只取决于四个请求头，按请求头组合缓存在LRU中。
     """
 
     def __init__(self, app):
-        super().__init__(app)
-        # 允许的域名模式
-        self.allowed_patterns = [
-            r"^https?://localhost(:\d+)?/?.*$",
-            r"^https?://127\.0\.0\.1(:\d+)?/?.*$",
-            r"^https?://([a-zA-Z0-9-]+\.)*easy-qfnu\.top(:\d+)?/?.*$",
-            r"^https://servicewechat\.com/?.*$",  # 微信小程序
-        ]
-
-        # 特殊路径白名单（不需要验证来源的路径）
-        self.whitelist_paths = [
-            "/",
-            "/docs",
-            "/redoc",
-            "/openapi.json",
-            "/favicon.ico",
-        ]
-
-        # 移动端User-Agent模式（这些请求通常没有完整的Origin信息）
-        self.mobile_user_agent_patterns = [
-            r".*Mobile.*",
-            r".*Android.*",
-            r".*iPhone.*",
-            r".*iPad.*",
-            r".*MicroMessenger.*",  # 微信
-            r".*QQ.*",
-            r".*Alipay.*",
-        ]
-
+        self.app = app
+        self._decisions = LRUCache(maxsize=ORIGIN_DECISION_CACHE_SIZE)
         logger.info("来源验证中间件初始化完成")
 
-    async def dispatch(self, request: Request, call_next):
-        """
-        处理请求的中间件逻辑
-
-        Args:
-            request (Request): FastAPI请求对象
-            call_next: 下一个中间件或路由处理器
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in WHITELIST_PATHS:
+            await self.app(scope, receive, send)
+            return
 
-        Returns:
-            Response: HTTP响应对象
-        """
         try:
-            # 获取请求信息
-            path = request.url.path
-            method = request.method
-            user_agent = request.headers.get("user-agent", "")
-            origin = request.headers.get("origin")
-            referer = request.headers.get("referer")
-            host = request.headers.get("host")
-
-            logger.debug(
-                f"请求详情 - Method: {method}, Path: {path}, "
-                f"Origin: {origin}, Referer: {referer}, Host: {host}, "
-                f"User-Agent: {user_agent[:100]}..."  # 截取前100字符避免日志过长
-            )
-
-            # 检查是否在白名单路径中
-            if path in self.whitelist_paths:
-                logger.debug(f"路径 {path} 在白名单中，跳过来源验证")
-                return await call_next(request)
-
-            # 检查是否为移动端请求
-            is_mobile = self._is_mobile_request(user_agent)
-            if is_mobile:
-                logger.debug(f"检测到移动端请求，User-Agent: {user_agent[:50]}...")
-
-            # 验证来源
-            validation_result = self._validate_request_origin(
-                origin, referer, host, user_agent, is_mobile
-            )
-
-            if validation_result["allowed"]:
-                logger.debug(f"来源验证通过 - 原因: {validation_result['reason']}")
-                return await call_next(request)
-            else:
-                # 来源验证失败，记录详细信息
-                logger.warning(
-                    f"来源验证失败 - Path: {path}, Method: {method}, "
-                    f"Origin: {origin}, Referer: {referer}, Host: {host}, "
-                    f"User-Agent: {user_agent[:100]}..., "
-                    f"原因: {validation_result['reason']}"
-                )
-
-                return JSONResponse(
-                    status_code=403,
-                    content={
-                        "detail": "访问被拒绝：无效的请求来源",
-                        "error_code": "INVALID_ORIGIN",
-                        "reason": validation_result["reason"],
-                    },
-                )
-
+            headers = self._read_headers(scope)
+            allowed, reason = self._decisions.get(headers) or self._decide(headers)
         except Exception as e:
             logger.error(f"来源验证中间件处理异常: {e}")
             # 发生异常时允许请求通过，避免影响正常功能
-            return await call_next(request)
+            await self.app(scope, receive, send)
+            return
+
+        if allowed:
+            await self.app(scope, receive, send)
+            return
+
+        origin, referer, host, user_agent = headers
+        logger.warning(
+            "来源验证失败 - Path: {}, Method: {}, Origin: {}, Referer: {}, "
+            "Host: {}, User-Agent: {}..., 原因: {}",
+            scope["path"],
+            scope["method"],
+            origin,
+            referer,
+            host,
+            (user_agent or "")[:100],
+            reason,
+        )
+        response = JSONResponse(
+            status_code=403,
+            content={
+                "detail": "访问被拒绝：无效的请求来源",
+                "error_code": "INVALID_ORIGIN",
+                "reason": reason,
+            },
+        )
+        await response(scope, receive, send)
+
+    @staticmethod
+    def _read_headers(scope) -> Tuple[Optional[str], ...]:
+        """
+        从ASGI scope中取出 Origin、Referer、Host、User-Agent（同名头取第一个）
+
+        Returns:
+            tuple: (origin, referer, host, user_agent)，缺失的头为None
+        """
+        values = {}
+        for name, value in scope["headers"]:
+            if name in _HEADER_NAMES and name not in values:
+                values[name] = value.decode("latin-1")
+        return tuple(values.get(name) for name in _HEADER_NAMES)
+
+    def _decide(self, headers: Tuple[Optional[str], ...]) -> Tuple[bool, str]:
+        """计算并缓存一组请求头的判定结果"""
+        origin, referer, host, user_agent = headers
+        user_agent = user_agent or ""
+        result = self._validate_request_origin(
+            origin, referer, host, user_agent, self._is_mobile_request(user_agent)
+        )
+        decision = (result["allowed"], result["reason"])
+        self._decisions.set(headers, decision)
+        return decision
 
     def _validate_request_origin(
         self, origin: str, referer: str, host: str, user_agent: str, is_mobile: bool
@@ -156,16 +183,12 @@ class OriginValidationMiddleware(BaseHTTPMiddleware):
         # 对于移动端请求，采用更宽松的策略
         if is_mobile:
             # 移动端请求通常没有完整的Origin信息，特别是微信小程序、APP内嵌浏览器等
-            logger.debug("移动端请求采用宽松验证策略")
-
             # 检查Host头是否为允许的域名
             if host and self._is_allowed_host(host):
                 return {"allowed": True, "reason": f"移动端Host头验证通过: {host}"}
 
             # 如果是微信或其他已知的移动端应用，可以进一步放宽
-            if any(
-                pattern in user_agent for pattern in ["MicroMessenger", "QQ", "Alipay"]
-            ):
+            if _KNOWN_MOBILE_APP_RE.search(user_agent):
                 return {
                     "allowed": True,
                     "reason": f"已知移动端应用: {user_agent[:30]}...",
@@ -174,7 +197,6 @@ class OriginValidationMiddleware(BaseHTTPMiddleware):
         # 对于没有Origin和Referer的请求（可能是直接API调用）
         if not origin and not referer:
             # 在生产环境中，可以根据实际需求决定是否允许
-            logger.debug("无Origin和Referer信息的请求，可能是直接API调用")
             return {"allowed": True, "reason": "直接API调用（无来源信息）"}
 
         # 所有验证都失败
@@ -193,13 +215,7 @@ class OriginValidationMiddleware(BaseHTTPMiddleware):
         Returns:
             bool: 是否为移动端请求
         """
-        if not user_agent:
-            return False
-
-        for pattern in self.mobile_user_agent_patterns:
-            if re.search(pattern, user_agent, re.IGNORECASE):
-                return True
-        return False
+        return bool(user_agent) and _MOBILE_USER_AGENT_RE.search(user_agent) is not None
 
     def _is_allowed_origin(self, origin: str) -> bool:
         """
@@ -215,16 +231,7 @@ class OriginValidationMiddleware(BaseHTTPMiddleware):
             return False
 
         # 规范化URL（移除尾部斜杠）
-        origin = origin.rstrip("/")
-
-        # 检查是否匹配允许的模式
-        for pattern in self.allowed_patterns:
-            if re.match(pattern, origin, re.IGNORECASE):
-                logger.debug(f"来源 {origin} 匹配模式 {pattern}")
-                return True
-
-        logger.debug(f"来源 {origin} 不匹配任何允许的模式")
-        return False
+        return _ALLOWED_ORIGIN_RE.match(origin.rstrip("/")) is not None
 
     def _is_allowed_host(self, host: str) -> bool:
         """
@@ -239,17 +246,114 @@ class OriginValidationMiddleware(BaseHTTPMiddleware):
         if not host:
             return False
 
-        # 允许的主机模式
-        allowed_hosts = [
-            r"^localhost(:\d+)?$",
-            r"^127\.0\.0\.1(:\d+)?$",
-            r"^([a-zA-Z0-9-]+\.)*easy-qfnu\.top(:\d+)?$",
-        ]
+        return _ALLOWED_HOST_RE.match(host) is not None
+
+
+if __name__ == "__main__":
+    # 中间件开销基准测试：python -m app.middleware.origin_validation [轮数]
+    import asyncio
+    import sys
+    import time
 
-        for pattern in allowed_hosts:
-            if re.match(pattern, host, re.IGNORECASE):
-                logger.debug(f"Host {host} 匹配模式 {pattern}")
-                return True
+    from starlette.middleware.base import BaseHTTPMiddleware
+
+    logger.remove()
+    logger.add(sys.stderr, level="DEBUG", filter=lambda r: False)
+
+    class LegacyOriginValidationMiddleware(BaseHTTPMiddleware):
+        """改写前的实现：BaseHTTPMiddleware + 逐个匹配未编译的正则 + 每请求调试日志"""
+
+        def __init__(self, app):
+            super().__init__(app)
+            self.checker = OriginValidationMiddleware(None)
+            self.mobile_patterns = [f".*{k}.*" for k in MOBILE_USER_AGENT_KEYWORDS]
+
+        async def dispatch(self, request, call_next):
+            path = request.url.path
+            user_agent = request.headers.get("user-agent", "")
+            origin = request.headers.get("origin")
+            referer = request.headers.get("referer")
+            host = request.headers.get("host")
+            logger.debug(
+                f"请求详情 - Method: {request.method}, Path: {path}, "
+                f"Origin: {origin}, Referer: {referer}, Host: {host}, "
+                f"User-Agent: {user_agent[:100]}..."
+            )
+            if path in WHITELIST_PATHS:
+                return await call_next(request)
+            is_mobile = any(
+                re.search(p, user_agent, re.IGNORECASE) for p in self.mobile_patterns
+            )
+            allowed = (host and ("localhost" in host or "127.0.0.1" in host)) or any(
+                re.match(p, (origin or "").rstrip("/"), re.IGNORECASE)
+                for p in ALLOWED_ORIGIN_PATTERNS
+            )
+            if not allowed:
+                allowed = self.checker._validate_request_origin(
+                    origin, referer, host, user_agent, is_mobile
+                )["allowed"]
+            logger.debug(f"来源验证通过: {allowed}")
+            return await call_next(request)
 
-        logger.debug(f"Host {host} 不匹配任何允许的模式")
-        return False
+    async def endpoint(scope, receive, send):
+        await receive()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [(b"content-type", b"application/json")],
+            }
+        )
+        await send({"type": "http.response.body", "body": b'{"status":"ok"}'})
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "https",
+        "path": "/api/v1/grades",
+        "raw_path": b"/api/v1/grades",
+        "root_path": "",
+        "query_string": b"",
+        "server": ("api.easy-qfnu.top", 443),
+        "client": ("10.0.0.1", 50000),
+        "headers": [
+            (b"host", b"api.easy-qfnu.top"),
+            (b"origin", b"https://easy-qfnu.top"),
+            (b"referer", b"https://easy-qfnu.top/dashboard"),
+            (
+                b"user-agent",
+                b"Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) "
+                b"MicroMessenger/8.0.40",
+            ),
+            (b"accept", b"application/json"),
+            (b"authorization", b"Bearer x"),
+        ],
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    async def measure(app, rounds: int) -> float:
+        for _ in range(200):
+            await app(dict(scope), receive, send)
+        start = time.perf_counter()
+        for _ in range(rounds):
+            await app(dict(scope), receive, send)
+        return (time.perf_counter() - start) / rounds * 1e6
+
+    async def main(rounds: int):
+        bare = await measure(endpoint, rounds)
+        legacy = await measure(LegacyOriginValidationMiddleware(endpoint), rounds)
+        current = await measure(OriginValidationMiddleware(endpoint), rounds)
+        print(f"无中间件: {bare:.2f}us/请求")
+        print(
+            f"BaseHTTPMiddleware 实现: {legacy:.2f}us/请求（开销 {legacy - bare:.2f}us）"
+        )
+        print(f"纯ASGI实现: {current:.2f}us/请求（开销 {current - bare:.2f}us）")
+
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000))
@@ -2,6 +2,7 @@
 from typing import Tuple
 from app.services.scraper import login_to_university
 from app.db.database import save_session
+from app.core.hash_utils import hash_student_id
 from app.core.security import (
     create_access_token,
     create_refresh_token,
@@ -45,11 +46,17 @@ class AuthService:
             session = login_to_university(student_id=student_id, password=password)
 
             logger.info(f"教务系统登录成功，学号: {student_id}")
+            # 只计算一次学号hash，供保存会话和签发Token共用
+            student_id_hash = hash_student_id(student_id)
 
             try:
                 # 登录成功后，将 session 的 cookies 保存到数据库
                 logger.debug("保存登录会话到数据库...")
-                save_session(student_id=student_id, session_obj=session)
+                save_session(
+                    student_id=student_id,
+                    session_obj=session,
+                    student_id_hash=student_id_hash,
+                )
                 logger.debug("会话保存成功")
             except Exception as e:
                 logger.error(f"保存会话到数据库失败: {e}")
@@ -65,7 +72,7 @@ class AuthService:
             # 创建Token对
             logger.debug("开始创建JWT Token...")
             # 同时在payload中存储明文学号和学号hash
-            user_data = {"sub": student_id, "raw_sub": student_id}
+            user_data = {"sub": student_id_hash, "raw_sub": student_id}
             access_token = create_access_token(user_data, client_ip=client_ip)
             refresh_token = create_refresh_token(user_data, client_ip=client_ip)
             logger.info(f"JWT Token创建成功，学号: {student_id}")
@@ -1,5 +1,10 @@
 # app/services/average_scores_service.py
-from typing import Optional, Dict, Any
+import os
+import sys
+import threading
+import time
+from array import array
+from typing import Optional, Dict, Any, List, Tuple
 from pathlib import Path
 from sqlalchemy import create_engine, Column, Integer, String, Float, text
 from sqlalchemy.ext.declarative import declarative_base
@@ -25,21 +30,136 @@ class AverageScore(Base):
     update_time = Column(String)
 
 
+# 是否将平均分数据集常驻内存查询（数据库为静态数据集）
+# 开启时（默认）SQL查询只作为回退路径：关键词含 % 或 _、或内存查询出错时才会使用，
+# 此时 average_scores_maintenance 建立的全文索引和学期序号列基本不参与查询
+AVERAGE_SCORES_IN_MEMORY = (
+    os.getenv("AVERAGE_SCORES_IN_MEMORY", "true").lower() == "true"
+)
+
+# SQLite 的 LIKE 只对 ASCII 字母大小写不敏感
+_ASCII_LOWER = str.maketrans("ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz")
+
+
+class AverageScoreDataset:
+    """
+    只读的内存平均分数据集
+
+    各字段按列存储，数值列使用 array 紧凑保存，重复字符串统一驻留；
+    同时预先建立课程名称/课程代码/教师到行号的映射以及全局排序位次。
+    """
+
+    __slots__ = (
+        "version",
+        "semester",
+        "course_code",
+        "course_name",
+        "teacher_id",
+        "average_score",
+        "student_count",
+        "update_time",
+        "sort_rank",
+        "teachers",
+        "teachers_lower",
+        "name_rows",
+        "code_rows",
+    )
+
+    def __init__(self, rows: List[tuple], version: Tuple[int, int]):
+        from app.db.average_scores_maintenance import semester_ordinal
+
+        self.version = version
+        self.semester: List[str] = []
+        self.course_code: List[str] = []
+        self.course_name: List[str] = []
+        self.teacher_id = array("l")
+        self.average_score = array("d")
+        self.student_count = array("q")
+        self.update_time: List[Optional[str]] = []
+        self.teachers: List[str] = []
+        teacher_ids: Dict[str, int] = {}
+        # 小写后的课程名称/课程代码 -> 行号列表
+        self.name_rows: Dict[str, List[int]] = {}
+        self.code_rows: Dict[str, List[int]] = {}
+        ordinals: List[int] = []
+        ids: List[int] = []
+
+        for row_id, semester, code, name, teacher, score, count, update in rows:
+            index = len(self.semester)
+            semester = sys.intern(semester)
+            self.semester.append(semester)
+            self.course_code.append(sys.intern(code))
+            self.course_name.append(sys.intern(name))
+            if teacher not in teacher_ids:
+                teacher_ids[teacher] = len(self.teachers)
+                self.teachers.append(teacher)
+            self.teacher_id.append(teacher_ids[teacher])
+            self.average_score.append(score)
+            self.student_count.append(count)
+            self.update_time.append(sys.intern(update) if update else update)
+            self.name_rows.setdefault(name.translate(_ASCII_LOWER), []).append(index)
+            self.code_rows.setdefault(code.translate(_ASCII_LOWER), []).append(index)
+            ordinals.append(semester_ordinal(semester))
+            ids.append(row_id)
+
+        self.teachers_lower = [t.translate(_ASCII_LOWER) for t in self.teachers]
+
+        # 全局排序：教师升序、学期降序（同学期按id），查询结果只需按位次排序
+        order = sorted(
+            range(len(ids)),
+            key=lambda i: (self.teachers[self.teacher_id[i]], -ordinals[i], ids[i]),
+        )
+        self.sort_rank = array("l", [0]) * len(order)
+        for rank, index in enumerate(order):
+            self.sort_rank[index] = rank
+
+    def __len__(self) -> int:
+        return len(self.semester)
+
+    def query(self, course_keyword: str, teacher_keyword: str) -> List[int]:
+        """按课程名称/代码和教师子串筛选，返回排好序的行号"""
+        course_keyword = course_keyword.translate(_ASCII_LOWER)
+        matched = set()
+        for mapping in (self.name_rows, self.code_rows):
+            for key, indexes in mapping.items():
+                if course_keyword in key:
+                    matched.update(indexes)
+
+        if teacher_keyword:
+            teacher_keyword = teacher_keyword.translate(_ASCII_LOWER)
+            teacher_ids = {
+                i for i, t in enumerate(self.teachers_lower) if teacher_keyword in t
+            }
+            teacher_id = self.teacher_id
+            matched = {i for i in matched if teacher_id[i] in teacher_ids}
+
+        return sorted(matched, key=self.sort_rank.__getitem__)
+
+
 class AverageScoresService:
     """平均分查询服务类"""
 
     def __init__(self):
         self.engine = None
         self.SessionLocal = None
+        # (数据库文件mtime_ns, 是否存在全文索引, 是否存在学期序号列)
+        self._schema_state: Optional[Tuple[int, bool, bool]] = None
+        self._dataset: Optional[AverageScoreDataset] = None
+        self._dataset_lock = threading.Lock()
+
+    @staticmethod
+    def _get_db_path() -> Path:
+        """获取平均分数据库路径"""
+        # 使用 Path 对象进行路径操作，确保跨平台兼容性
+        current_dir = Path(__file__).resolve().parent.parent.parent
+        return current_dir / "data" / "average_scores.db"
 
     def _get_db_engine(self):
         """获取数据库引擎"""
         if self.engine is None:
             logger.debug("开始获取数据库引擎...")
 
-            # 使用 Path 对象进行路径操作，确保跨平台兼容性
-            current_dir = Path(__file__).resolve().parent.parent.parent
-            db_path = current_dir / "data" / "average_scores.db"
+            db_path = self._get_db_path()
 
             logger.debug(f"数据库路径: {db_path}")
 
@@ -66,6 +186,134 @@ class AverageScoresService:
             logger.error(f"创建数据库会话失败: {e}")
             raise
 
+    def _get_schema_state(self) -> Tuple[int, bool, bool]:
+        """检查维护命令建立的辅助索引，结果按数据库文件mtime缓存"""
+        try:
+            mtime = self._get_db_path().stat().st_mtime_ns
+        except OSError:
+            return (0, False, False)
+        if self._schema_state is None or self._schema_state[0] != mtime:
+            from app.db.average_scores_maintenance import (
+                has_fts_index,
+                has_semester_ordinal,
+            )
+
+            try:
+                engine = self._get_db_engine()
+                has_fts = has_fts_index(engine)
+                has_ordinal = has_semester_ordinal(engine)
+            except Exception as e:
+                logger.warning(f"检查平均分辅助索引失败，使用原始查询: {e}")
+                has_fts, has_ordinal = False, False
+            self._schema_state = (mtime, has_fts, has_ordinal)
+            logger.info(
+                f"平均分全文索引{'已启用' if has_fts else '未建立，使用LIKE查询'}，"
+                f"学期序号列{'已启用' if has_ordinal else '未建立，使用表达式排序'}"
+            )
+        return self._schema_state
+
+    def _has_fts_index(self) -> bool:
+        """是否已建立全文索引"""
+        return self._get_schema_state()[1]
+
+    def _has_semester_ordinal(self) -> bool:
+        """是否已建立学期序号列"""
+        return self._get_schema_state()[2]
+
+    @staticmethod
+    def _can_use_fts(keyword: str) -> bool:
+        """trigram 索引只能匹配至少3个字符的子串，且不支持LIKE通配符语义"""
+        return len(keyword) >= 3 and "%" not in keyword and "_" not in keyword
+
+    @staticmethod
+    def _fts_phrase(columns: str, keyword: str) -> str:
+        """构造带列过滤的 FTS5 短语查询"""
+        escaped = keyword.replace('"', '""')
+        return f'{{{columns}}} : "{escaped}"'
+
+    def _load_dataset(self, version: Tuple[int, int]) -> AverageScoreDataset:
+        """从数据库一次性读取全部记录构建内存数据集"""
+        # 数据库文件被替换后旧连接仍指向旧文件，先释放连接池
+        if self.engine is not None:
+            self.engine.dispose()
+
+        start = time.perf_counter()
+        with self._get_db_engine().connect() as conn:
+            rows = conn.execute(
+                text(
+                    "SELECT id, semester, course_code, course_name, teacher, "
+                    "average_score, student_count, update_time "
+                    "FROM average_scores ORDER BY id"
+                )
+            ).fetchall()
+        dataset = AverageScoreDataset(rows, version)
+        logger.info(
+            f"平均分数据集加载完成，共 {len(dataset)} 条记录，"
+            f"耗时 {(time.perf_counter() - start) * 1000:.1f}ms"
+        )
+        return dataset
+
+    def get_db_version(self) -> Tuple[int, int]:
+        """获取平均分数据库文件版本 (mtime_ns, size)"""
+        db_path = self._get_db_path()
+        try:
+            stat = db_path.stat()
+        except FileNotFoundError:
+            logger.error(f"数据库文件不存在: {db_path}")
+            raise FileNotFoundError(f"数据库文件不存在: {db_path}")
+        return stat.st_mtime_ns, stat.st_size
+
+    def get_dataset(self) -> AverageScoreDataset:
+        """获取内存数据集，数据库文件变化时自动重新加载"""
+        version = self.get_db_version()
+
+        dataset = self._dataset
+        if dataset is not None and dataset.version == version:
+            return dataset
+
+        with self._dataset_lock:
+            dataset = self._dataset
+            if dataset is None or dataset.version != version:
+                if dataset is not None:
+                    logger.info("检测到平均分数据库文件变化，重新加载数据集")
+                dataset = self._load_dataset(version)
+                self._dataset = dataset
+        return dataset
+
+    @staticmethod
+    def _not_found_message(course_identifier: str, teacher_keyword: str) -> str:
+        """构造未找到数据时的错误信息"""
+        if teacher_keyword:
+            return f"未找到课程名称或代码包含'{course_identifier}'且教师姓名包含'{teacher_keyword}'的数据"
+        return f"未找到课程名称或代码包含'{course_identifier}'的数据"
+
+    def _query_from_memory(
+        self, course_identifier: str, teacher_keyword: str
+    ) -> Dict[str, Any]:
+        """在内存数据集中查询，不经过 SQLite 和 ORM"""
+        dataset = self.get_dataset()
+        indexes = dataset.query(course_identifier, teacher_keyword)
+        logger.info(f"内存查询完成，返回 {len(indexes)} 条记录")
+
+        if not indexes:
+            error_msg = self._not_found_message(course_identifier, teacher_keyword)
+            logger.warning(error_msg)
+            raise ValueError(error_msg)
+
+        # 构建层级结构：课程->老师->学期->基准人数和平均分
+        structured_data: Dict[str, Any] = {}
+        for i in indexes:
+            teachers = structured_data.setdefault(dataset.course_name[i], {})
+            semesters = teachers.setdefault(dataset.teachers[dataset.teacher_id[i]], {})
+            semesters[dataset.semester[i]] = {
+                "average_score": dataset.average_score[i],
+                "student_count": dataset.student_count[i],
+                "update_time": dataset.update_time[i],
+            }
+
+        logger.info(f"数据结构构建完成，包含 {len(structured_data)} 个课程")
+        return structured_data
+
     def query_average_scores(
         self, course_identifier: str, teacher: Optional[str] = None
     ) -> Dict[str, Any]:
@@ -86,6 +334,20 @@ class AverageScoresService:
             f"开始查询平均分数据，课程标识: {course_identifier}, 教师: {teacher or '全部'}"
         )
 
+        teacher_keyword = teacher.strip() if teacher else ""
+        # 含LIKE通配符的关键词保持原有SQL语义
+        if AVERAGE_SCORES_IN_MEMORY and not any(
+            ch in keyword
+            for keyword in (course_identifier, teacher_keyword)
+            for ch in "%_"
+        ):
+            try:
+                return self._query_from_memory(course_identifier, teacher_keyword)
+            except ValueError:
+                raise
+            except Exception as e:
+                logger.error(f"内存数据集查询失败，回退到数据库查询: {e}")
+
         session = None
         try:
             session = self._get_db_session()
@@ -94,30 +356,59 @@ class AverageScoresService:
             # 构建基础查询
             query = session.query(AverageScore)
 
-            # 构建课程查询条件（课程名称或课程代码）
-            course_conditions = AverageScore.course_name.like(
-                f"%{course_identifier}%"
-            ) | AverageScore.course_code.like(f"%{course_identifier}%")
-
-            # 应用课程查询条件
-            query = query.filter(course_conditions)
+            use_fts = self._has_fts_index()
+
+            # 能走全文索引的条件合并为一个 MATCH 表达式，避免前置通配符导致全表扫描
+            match_terms = []
+            if use_fts and self._can_use_fts(course_identifier):
+                match_terms.append(
+                    self._fts_phrase("course_name course_code", course_identifier)
+                )
+            else:
+                # 构建课程查询条件（课程名称或课程代码）
+                course_conditions = AverageScore.course_name.like(
+                    f"%{course_identifier}%"
+                ) | AverageScore.course_code.like(f"%{course_identifier}%")
+                query = query.filter(course_conditions)
             logger.debug(f"应用课程查询条件: {course_identifier}")
 
             # 如果指定了教师，添加教师查询条件
-            if teacher and teacher.strip():
-                teacher_condition = AverageScore.teacher.like(f"%{teacher.strip()}%")
-                query = query.filter(teacher_condition)
-                logger.debug(f"应用教师查询条件: {teacher.strip()}")
-
-            # 使用text()函数进行智能排序，让最新的学期越靠前
+            if teacher_keyword:
+                if use_fts and self._can_use_fts(teacher_keyword):
+                    match_terms.append(self._fts_phrase("teacher", teacher_keyword))
+                else:
+                    teacher_condition = AverageScore.teacher.like(
+                        f"%{teacher_keyword}%"
+                    )
+                    query = query.filter(teacher_condition)
+                logger.debug(f"应用教师查询条件: {teacher_keyword}")
+
+            if match_terms:
+                query = query.filter(
+                    text(
+                        "average_scores.id IN (SELECT rowid FROM average_scores_fts "
+                        "WHERE average_scores_fts MATCH :fts_query)"
+                    ).bindparams(fts_query=" AND ".join(match_terms))
+                )
+                logger.debug("使用全文索引进行子串匹配")
+
+            # 智能排序，让最新的学期越靠前
             # 学期格式：年份-年份-数字，如"2023-2024-1"
             logger.debug("应用智能排序规则...")
-            query = query.order_by(
-                AverageScore.teacher,
-                text("CAST(SUBSTR(semester, 1, 4) AS INTEGER) DESC"),  # 第一个年份降序
-                text("CAST(SUBSTR(semester, 6, 4) AS INTEGER) DESC"),  # 第二个年份降序
-                text("CAST(SUBSTR(semester, 11) AS INTEGER) DESC"),  # 学期数字降序
-            )
+            if self._has_semester_ordinal():
+                # 迁移后直接使用预计算的学期序号，可利用 (teacher, semester_ordinal) 索引
+                query = query.order_by(
+                    AverageScore.teacher,
+                    text("average_scores.semester_ordinal DESC"),
+                )
+            else:
+                # 依次按第一个年份、第二个年份、学期数字降序
+                query = query.order_by(
+                    AverageScore.teacher,
+                    text("CAST(SUBSTR(semester, 1, 4) AS INTEGER) DESC"),
+                    text("CAST(SUBSTR(semester, 6, 4) AS INTEGER) DESC"),
+                    text("CAST(SUBSTR(semester, 11) AS INTEGER) DESC"),
+                )
 
             logger.debug("执行数据库查询...")
             results = query.all()
@@ -125,10 +416,7 @@ class AverageScoresService:
 
             if not results:
                 # 提供更详细的错误信息
-                if teacher and teacher.strip():
-                    error_msg = f"未找到课程名称或代码包含'{course_identifier}'且教师姓名包含'{teacher.strip()}'的数据"
-                else:
-                    error_msg = f"未找到课程名称或代码包含'{course_identifier}'的数据"
+                error_msg = self._not_found_message(course_identifier, teacher_keyword)
                 logger.warning(error_msg)
                 raise ValueError(error_msg)
 
@@ -1,11 +1,14 @@
 # app/services/classtable.py
+import os
 import requests
-from bs4 import BeautifulSoup
 import re
+import threading
+from concurrent.futures import Future
 from datetime import datetime, timedelta
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 from fastapi import HTTPException
 from loguru import logger
+from lxml import html as lxml_html
 
 from app.schemas.classtable import (
     CourseInfo,
@@ -15,92 +18,168 @@ from app.schemas.classtable import (
     WeekClassTableResponse,
 )
 from app.services.base import BaseEducationService
+from app.utils.lru_cache import LRUCache
+from app.utils.term_calendar import term_calendar
+
+# 同一学生同一周课程表的短期复用时间（秒），合并"今日"和"本周"等紧接着的重复请求
+CLASSTABLE_MEMO_TTL = int(os.getenv("CLASSTABLE_MEMO_TTL", "60"))
+
+# 课程title格式：课程学分：3<br/>课程属性：任选<br/>课程名称：网络管理<br/>上课时间：第1周 星期一 [02-03-04]节<br/>上课地点：嵌入式实验室204<br/>课堂名称：23网安班,22网安班
+# 一次扫描提取全部字段，同名字段只取第一次出现的值
+# 使用零宽前瞻逐位置匹配，不消耗字符：字段值中包含其他字段名、或缺少<br/>分隔时，
+# 结果仍与逐字段 re.search 一致
+COURSE_TITLE_RE = re.compile(
+    r"(?=(课程学分|课程属性|课程名称|上课时间|上课地点|课堂名称)：([^<]+))"
+)
+# 上课时间中的星期和节次（同样使用前瞻，节次方括号内的"星期X"也能被找到）
+COURSE_TIME_RE = re.compile(r"(?=星期([一二三四五六日]))|(?=\[([^\]]+)\]节)")
+WEEK_NUMBER_RE = re.compile(r"第(\d+)周")
+
+# 课程字段元组：(课程名称, 学分, 属性, 上课时间, 地点, 课堂名称, 星期, 节次)
+CourseFields = Tuple[str, str, str, str, str, str, int, str]
+
+WEEKDAY_MAP = {"一": 1, "二": 2, "三": 3, "四": 4, "五": 5, "六": 6, "日": 7}
+
+# 课程表结构的XPath，与原先 BeautifulSoup 的递归查找保持一致
+KB_TABLE_XPATH = (
+    "//table[contains(concat(' ', normalize-space(@class), ' '), ' kb_table ')]"
+)
+WEEK_SPAN_XPATH = "//span[@class='main_text main_color']"
+
+
+def _element_text(element) -> str:
+    """拼接元素内所有文本节点（去除首尾空白），等价于 get_text(strip=True)"""
+    return "".join(text.strip() for text in element.itertext())
 
 
 class ClassTableService(BaseEducationService):
     """课程表服务类"""
 
+    # (学生hash, 周一日期) -> (周数, 课程表)，短期复用同一周的抓取结果
+    _week_memo = LRUCache(maxsize=1024, ttl=CLASSTABLE_MEMO_TTL)
+    # (学生hash, 周一日期) -> 正在进行的抓取，并发请求共享同一次抓取和解析
+    _inflight: Dict[Tuple[str, str], Future] = {}
+    _inflight_lock = threading.Lock()
+
+    @staticmethod
+    def week_monday(query_date: str) -> str:
+        """计算指定日期所在周的周一日期"""
+        date_obj = datetime.strptime(query_date, "%Y-%m-%d")
+        return (date_obj - timedelta(days=date_obj.weekday())).strftime("%Y-%m-%d")
+
+    @staticmethod
+    def _parse_course_fields(course_element) -> Optional[CourseFields]:
+        """
+        解析课程元素为字段元组
+
+        元组顺序与 CourseInfo 字段一致，可直接作为课程的去重键。
+
+        Args:
+            course_element: lxml解析的课程元素（单元格中的<p>）
+
+        Returns:
+            CourseFields: (课程名称, 学分, 属性, 上课时间, 地点, 课堂名称, 星期, 节次)，
+                缺少title或课程名时返回None
+        """
+        # 获取title属性中的详细信息
+        title = course_element.get("title", "")
+        course_name = _element_text(course_element)
+
+        if not title or not course_name:
+            return None
+
+        fields = {}
+        for match in COURSE_TITLE_RE.finditer(title):
+            fields.setdefault(match.group(1), match.group(2))
+
+        # 从上课时间中提取星期几和节次
+        day_of_week = 0
+        period = ""
+        time_info = fields.get("上课时间", "")
+        if time_info:
+            weekday = None
+            for match in COURSE_TIME_RE.finditer(time_info):
+                if match.group(1) is not None:
+                    if weekday is None:
+                        weekday = match.group(1)
+                elif not period:
+                    period = match.group(2)
+                if weekday is not None and period:
+                    break
+            if weekday is not None:
+                day_of_week = WEEKDAY_MAP.get(weekday, 0)
+
+        return (
+            fields.get("课程名称", course_name),
+            fields.get("课程学分", ""),
+            fields.get("课程属性", ""),
+            time_info,
+            fields.get("上课地点", ""),
+            fields.get("课堂名称", ""),
+            day_of_week,
+            period,
+        )
+
+    @staticmethod
+    def _build_course_info(fields: CourseFields) -> CourseInfo:
+        """由字段元组构造 CourseInfo"""
+        return CourseInfo(
+            course_name=fields[0],
+            course_credits=fields[1],
+            course_property=fields[2],
+            class_time=fields[3],
+            classroom=fields[4],
+            class_name=fields[5],
+            day_of_week=fields[6],
+            period=fields[7],
+        )
+
     @staticmethod
     def parse_course_info(course_element) -> Optional[CourseInfo]:
         """
         解析课程信息元素
 
         Args:
-            course_element: BeautifulSoup解析的课程元素
+            course_element: lxml解析的课程元素（单元格中的<p>）
 
         Returns:
             CourseInfo: 课程信息对象，如果解析失败返回None
         """
         try:
-            # 获取title属性中的详细信息
-            title = course_element.get("title", "")
-            course_name = course_element.get_text(strip=True)
-
-            if not title or not course_name:
+            fields = ClassTableService._parse_course_fields(course_element)
+            if fields is None:
                 return None
-
-            # 解析title中的信息
-            # 格式：课程学分：3<br/>课程属性：任选<br/>课程名称：网络管理<br/>上课时间：第1周 星期一 [02-03-04]节<br/>上课地点：嵌入式实验室204<br/>课堂名称：23网安班,22网安班
-
-            # 使用正则表达式提取各个字段
-            credits_match = re.search(r"课程学分：([^<]+)", title)
-            property_match = re.search(r"课程属性：([^<]+)", title)
-            name_match = re.search(r"课程名称：([^<]+)", title)
-            time_match = re.search(r"上课时间：([^<]+)", title)
-            location_match = re.search(r"上课地点：([^<]+)", title)
-            class_match = re.search(r"课堂名称：([^<]+)", title)
-
-            # 从上课时间中提取星期几
-            day_of_week = 0
-            period = ""
-            if time_match:
-                time_info = time_match.group(1)
-                # 提取星期信息
-                weekday_match = re.search(r"星期([一二三四五六日])", time_info)
-                if weekday_match:
-                    weekday_map = {
-                        "一": 1,
-                        "二": 2,
-                        "三": 3,
-                        "四": 4,
-                        "五": 5,
-                        "六": 6,
-                        "日": 7,
-                    }
-                    day_of_week = weekday_map.get(weekday_match.group(1), 0)
-
-                # 提取节次信息
-                period_match = re.search(r"\[([^\]]+)\]节", time_info)
-                if period_match:
-                    period = period_match.group(1)
-
-            return CourseInfo(
-                course_name=name_match.group(1) if name_match else course_name,
-                course_credits=credits_match.group(1) if credits_match else "",
-                course_property=property_match.group(1) if property_match else "",
-                class_time=time_match.group(1) if time_match else "",
-                classroom=location_match.group(1) if location_match else "",
-                class_name=class_match.group(1) if class_match else "",
-                day_of_week=day_of_week,
-                period=period,
-            )
+            return ClassTableService._build_course_info(fields)
 
         except Exception as e:
             logger.error(f"解析课程信息失败: {e}")
             return None
 
+    @staticmethod
+    def _parse_html_tree(html_content: str):
+        """将教务系统返回的HTML解析为lxml树，空内容返回None"""
+        if not html_content or not html_content.strip():
+            return None
+        return lxml_html.fromstring(html_content)
+
+    @staticmethod
+    def _find_week_number(tree) -> Optional[int]:
+        """从已解析的HTML树中读取当前周数，页面上没有周数（如假期）时返回None"""
+        if tree is None:
+            return None
+        for week_element in tree.xpath(WEEK_SPAN_XPATH):
+            week_match = WEEK_NUMBER_RE.search("".join(week_element.itertext()))
+            if week_match:
+                return int(week_match.group(1))
+            break
+        return None
+
     @staticmethod
     def parse_week_number(html_content: str) -> int:
         """从HTML中解析当前周数"""
         try:
-            soup = BeautifulSoup(html_content, "html.parser")
-            week_element = soup.find("span", class_="main_text main_color")
-            if week_element:
-                week_text = week_element.get_text()
-                week_match = re.search(r"第(\d+)周", week_text)
-                if week_match:
-                    return int(week_match.group(1))
-            return 1
+            tree = ClassTableService._parse_html_tree(html_content)
+            return ClassTableService._find_week_number(tree) or 1
         except Exception as e:
             logger.error(f"解析周数失败: {e}")
             return 1
@@ -146,15 +225,32 @@ class ClassTableService(BaseEducationService):
         Returns:
             Dict[str, DayCourses]: 以日期为key的课程数据字典
         """
+        return ClassTableService.parse_html_to_week(html_content, query_date)[1]
+
+    @staticmethod
+    def parse_html_to_week(
+        html_content: str, query_date: str
+    ) -> Tuple[Optional[int], Dict[str, DayCourses]]:
+        """
+        解析HTML内容为课程表数据，同时返回页面上的教学周数
+
+        Args:
+            html_content: 教务系统返回的HTML内容
+            query_date: 查询日期
+
+        Returns:
+            Tuple[Optional[int], Dict[str, DayCourses]]: (周数, 以日期为key的课程数据字典)，
+                页面上没有周数时周数为None
+        """
         try:
-            soup = BeautifulSoup(html_content, "html.parser")
+            tree = ClassTableService._parse_html_tree(html_content)
 
-            # 解析周数
-            week_number = ClassTableService.parse_week_number(html_content)
+            # 解析周数（复用同一棵树，不再重复解析HTML）
+            week_number = ClassTableService._find_week_number(tree)
 
             # 计算周的开始和结束日期
             start_date, end_date = ClassTableService.calculate_week_dates(
-                query_date, week_number
+                query_date, week_number or 1
             )
 
             # 初始化一周的课程数据字典
@@ -162,88 +258,67 @@ class ClassTableService(BaseEducationService):
 
             # 计算本周每一天的日期
             start_date_obj = datetime.strptime(start_date, "%Y-%m-%d")
+            day_dates = []
             for i in range(7):
                 day_date = start_date_obj + timedelta(days=i)
                 date_str = day_date.strftime("%Y-%m-%d")
                 day_courses = DayCourses(date=date_str, day_of_week=i + 1, courses=[])
                 week_courses_dict[date_str] = day_courses
+                day_dates.append(date_str)
 
             # 查找课程表
-            table = soup.find("table", class_="kb_table")
-            if not table:
+            tables = tree.xpath(KB_TABLE_XPATH) if tree is not None else []
+            if not tables:
                 logger.warning("未找到课程表")
-                return week_courses_dict
+                return week_number, week_courses_dict
 
             # 解析每一行
-            tbody = table.find("tbody")  # type: ignore
-            if not tbody:
+            tbodies = tables[0].xpath(".//tbody")
+            if not tbodies:
                 logger.warning("未找到课程表tbody")
-                return week_courses_dict
-            rows = tbody.find_all("tr")  # type: ignore
+                return week_number, week_courses_dict
+            rows = tbodies[0].xpath(".//tr")
+
+            # 每天已出现课程的字段元组，用于O(1)去重
+            seen_per_day = [set() for _ in range(7)]
 
-            for row_idx, row in enumerate(rows):
-                cells = row.find_all("td")  # type: ignore
+            for row in rows:
+                cells = row.xpath(".//td")
                 if len(cells) < 8:  # 至少应该有8列（节次+7天）
                     continue
 
                 # 跳过第一列（节次列），处理7天的课程
                 for day_idx in range(7):
-                    if day_idx + 1 >= len(cells):
-                        continue
-
                     cell = cells[day_idx + 1]
-                    course_elements = cell.find_all("p")  # type: ignore
-
-                    for course_element in course_elements:
-                        course_info = ClassTableService.parse_course_info(
-                            course_element
+                    seen = seen_per_day[day_idx]
+
+                    for course_element in cell.xpath(".//p"):
+                        try:
+                            fields = ClassTableService._parse_course_fields(
+                                course_element
+                            )
+                        except Exception as e:
+                            logger.error(f"解析课程信息失败: {e}")
+                            continue
+                        if fields is None:
+                            continue
+
+                        # 如果课程信息中没有指定星期几，使用当前列的索引
+                        if fields[6] == 0:
+                            fields = fields[:6] + (day_idx + 1,) + fields[7:]
+
+                        # 只有不重复的课程才添加
+                        if fields in seen:
+                            continue
+                        seen.add(fields)
+                        week_courses_dict[day_dates[day_idx]].courses.append(
+                            ClassTableService._build_course_info(fields)
                         )
-                        if course_info:
-                            # 如果课程信息中没有指定星期几，使用当前列的索引
-                            if course_info.day_of_week == 0:
-                                course_info.day_of_week = day_idx + 1
-
-                            # 计算对应的日期
-                            day_date = start_date_obj + timedelta(days=day_idx)
-                            date_str = day_date.strftime("%Y-%m-%d")
-
-                            # 添加到对应天的课程列表前先检查是否重复
-                            if date_str in week_courses_dict:
-                                existing_courses = week_courses_dict[date_str].courses
-
-                                # 检查是否存在完全相同的课程
-                                is_duplicate = False
-                                for existing_course in existing_courses:
-                                    if (
-                                        existing_course.course_name
-                                        == course_info.course_name
-                                        and existing_course.course_credits
-                                        == course_info.course_credits
-                                        and existing_course.course_property
-                                        == course_info.course_property
-                                        and existing_course.class_time
-                                        == course_info.class_time
-                                        and existing_course.classroom
-                                        == course_info.classroom
-                                        and existing_course.class_name
-                                        == course_info.class_name
-                                        and existing_course.day_of_week
-                                        == course_info.day_of_week
-                                        and existing_course.period == course_info.period
-                                    ):
-                                        is_duplicate = True
-                                        break
-
-                                # 只有不重复的课程才添加
-                                if not is_duplicate:
-                                    week_courses_dict[date_str].courses.append(
-                                        course_info
-                                    )
 
             logger.info(
                 f"成功解析课程表，周数: {week_number}, 日期范围: {start_date} - {end_date}"
             )
-            return week_courses_dict
+            return week_number, week_courses_dict
 
         except Exception as e:
             logger.error(f"解析HTML课程表失败: {e}")
@@ -251,7 +326,9 @@ class ClassTableService(BaseEducationService):
 
     @staticmethod
     def get_classtable(
-        session: requests.Session, query_date: str
+        session: requests.Session,
+        query_date: str,
+        student_id_hash: Optional[str] = None,
     ) -> Dict[str, DayCourses]:
         """
         获取指定日期所在周的课程表信息
@@ -259,10 +336,79 @@ class ClassTableService(BaseEducationService):
         Args:
             session: 已登录的教务系统session
             query_date: 查询日期 (YYYY-MM-DD)
+            student_id_hash: 学生ID的hash值，提供时合并同一周的并发及短时间内的重复请求
 
         Returns:
             Dict[str, DayCourses]: 以日期为key的课程表数据
         """
+        return ClassTableService.fetch_week(session, query_date, student_id_hash)[1]
+
+    @staticmethod
+    def fetch_week(
+        session: requests.Session,
+        query_date: str,
+        student_id_hash: Optional[str] = None,
+    ) -> Tuple[Optional[int], Dict[str, DayCourses]]:
+        """
+        获取指定日期所在周的课程表，并返回页面上的教学周数
+
+        提供 student_id_hash 时按 (学生, 周) 合并请求：同一周正在抓取时直接等待其结果，
+        抓取完成后的 CLASSTABLE_MEMO_TTL 秒内复用该结果。
+
+        Args:
+            session: 已登录的教务系统session
+            query_date: 查询日期 (YYYY-MM-DD)
+            student_id_hash: 学生ID的hash值
+
+        Returns:
+            Tuple[Optional[int], Dict[str, DayCourses]]: (周数, 以日期为key的课程表数据)
+        """
+        if not student_id_hash:
+            return ClassTableService._request_week(session, query_date)
+
+        key = (student_id_hash, ClassTableService.week_monday(query_date))
+        cached = ClassTableService._week_memo.get(key)
+        if cached is not None:
+            logger.debug(f"复用 {key[1]} 所在周的课程表抓取结果")
+            return cached
+
+        with ClassTableService._inflight_lock:
+            future = ClassTableService._inflight.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = Future()
+                ClassTableService._inflight[key] = future
+
+        if not is_leader:
+            logger.debug(f"{key[1]} 所在周的课程表正在抓取，等待其结果")
+            return future.result()
+
+        try:
+            result = ClassTableService._request_week(session, query_date)
+            ClassTableService._week_memo.set(key, result)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with ClassTableService._inflight_lock:
+                ClassTableService._inflight.pop(key, None)
+
+    @staticmethod
+    def _request_week(
+        session: requests.Session, query_date: str
+    ) -> Tuple[Optional[int], Dict[str, DayCourses]]:
+        """
+        请求教务系统获取指定日期所在周的课程表，并返回页面上的教学周数
+
+        Args:
+            session: 已登录的教务系统session
+            query_date: 查询日期 (YYYY-MM-DD)
+
+        Returns:
+            Tuple[Optional[int], Dict[str, DayCourses]]: (周数, 以日期为key的课程表数据)
+        """
         try:
             logger.info(f"开始获取课程表，查询日期: {query_date}")
 
@@ -295,13 +441,17 @@ class ClassTableService(BaseEducationService):
             logger.debug("课程表请求成功，开始解析HTML")
 
             # 解析HTML内容
-            week_courses_dict = ClassTableService.parse_html_to_courses(
+            week_number, week_courses_dict = ClassTableService.parse_html_to_week(
                 response.text, query_date
             )
 
+            # 用页面上的真实周数校准学期校历
+            if week_number is not None:
+                term_calendar.learn(query_date, week_number)
+
             total_courses = sum(len(day.courses) for day in week_courses_dict.values())
             logger.info(f"课程表获取成功，共解析到 {total_courses} 门课程")
-            return week_courses_dict
+            return week_number, week_courses_dict
 
         except requests.exceptions.RequestException as e:
             logger.error(f"课程表请求失败: {e}")
@@ -311,20 +461,40 @@ class ClassTableService(BaseEducationService):
             raise HTTPException(status_code=500, detail=f"获取课程表失败: {str(e)}")
 
     @staticmethod
-    def get_day_courses(session: requests.Session, query_date: str) -> DayCourses:
+    def _load_week(
+        session: requests.Session, query_date: str, student_id_hash: Optional[str]
+    ) -> Dict[str, DayCourses]:
+        """获取整周课程表，已知学生身份时优先读取学期课程表缓存"""
+        if not student_id_hash:
+            return ClassTableService.get_classtable(session, query_date)
+
+        # 学期课程表引擎依赖本模块，延迟导入避免循环引用
+        from app.services.semester_timetable import semester_timetable
+
+        return semester_timetable.get_week(student_id_hash, session, query_date)
+
+    @staticmethod
+    def get_day_courses(
+        session: requests.Session,
+        query_date: str,
+        student_id_hash: Optional[str] = None,
+    ) -> DayCourses:
         """
         获取指定日期当天的课程表信息
 
         Args:
             session: 已登录的教务系统session
             query_date: 查询日期 (YYYY-MM-DD)
+            student_id_hash: 学生ID的hash值，提供时使用学期课程表缓存
 
         Returns:
             DayCourses: 当天课程数据
         """
         try:
             # 获取整周课程表
-            week_courses_dict = ClassTableService.get_classtable(session, query_date)
+            week_courses_dict = ClassTableService._load_week(
+                session, query_date, student_id_hash
+            )
 
             # 查找指定日期的课程
             if query_date in week_courses_dict:
@@ -346,24 +516,30 @@ class ClassTableService(BaseEducationService):
             raise e
 
     @staticmethod
-    def get_week_courses(session: requests.Session, query_date: str) -> WeekCourses:
+    def get_week_courses(
+        session: requests.Session,
+        query_date: str,
+        student_id_hash: Optional[str] = None,
+    ) -> WeekCourses:
         """
         获取指定日期所在周的完整课程表信息
 
         Args:
             session: 已登录的教务系统session
             query_date: 查询日期 (YYYY-MM-DD)
+            student_id_hash: 学生ID的hash值，提供时使用学期课程表缓存
 
         Returns:
             WeekCourses: 整周课程数据
         """
         try:
             # 获取整周课程表字典
-            week_courses_dict = ClassTableService.get_classtable(session, query_date)
+            week_courses_dict = ClassTableService._load_week(
+                session, query_date, student_id_hash
+            )
 
-            # 解析周数
-            # 这里我们需要重新获取HTML来解析周数，但为了效率可以从现有数据推算
-            week_number = ClassTableService._calculate_week_number(query_date)
+            # 周数直接查学期校历，无需重新请求页面
+            week_number = ClassTableService.get_week_number(query_date)
 
             # 计算周的开始和结束日期
             start_date, end_date = ClassTableService.calculate_week_dates(
@@ -406,6 +582,24 @@ class ClassTableService(BaseEducationService):
             logger.error(f"获取周课程表失败: {e}")
             raise e
 
+    @staticmethod
+    def get_week_number(query_date: str) -> int:
+        """
+        获取日期所在的教学周
+
+        优先使用从教务系统学到的学期校历，日期不在已知学期内时按日期粗略推算。
+
+        Args:
+            query_date: 查询日期 (YYYY-MM-DD)
+
+        Returns:
+            int: 周数
+        """
+        term_week = term_calendar.lookup(query_date)
+        if term_week is not None:
+            return term_week[1]
+        return ClassTableService._calculate_week_number(query_date)
+
     @staticmethod
     def _calculate_week_number(query_date: str) -> int:
         """
@@ -436,3 +630,32 @@ class ClassTableService(BaseEducationService):
         except Exception as e:
             logger.warning(f"计算周数失败: {e}, 返回默认值1")
             return 1
+
+
+if __name__ == "__main__":
+    # 基准测试：python -m app.services.classtable <main_index_loadkb.jsp 保存的HTML>...
+    import sys
+    import time
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    if len(sys.argv) < 2:
+        print("用法: python -m app.services.classtable <课程表HTML文件>...")
+        sys.exit(1)
+
+    rounds = 200
+    for fixture in sys.argv[1:]:
+        with open(fixture, encoding="utf-8") as f:
+            content = f.read()
+
+        start = time.perf_counter()
+        for _ in range(rounds):
+            result = ClassTableService.parse_html_to_courses(content, "2025-09-08")
+        elapsed = (time.perf_counter() - start) / rounds * 1000
+
+        total_courses = sum(len(day.courses) for day in result.values())
+        print(
+            f"{fixture}: {len(content)} 字节，{total_courses} 门课程，"
+            f"每周解析耗时 {elapsed:.3f}ms"
+        )
@@ -0,0 +1,220 @@
+# app/services/classtable_ics.py
+import hashlib
+import re
+import secrets
+from datetime import datetime, timedelta
+from typing import Iterator, Optional, Tuple
+
+from app.db.database import (
+    delete_calendar_feed_token,
+    get_calendar_feed_owner,
+    save_calendar_feed_token,
+)
+from app.schemas.classtable import CourseInfo
+from app.services.semester_timetable import (
+    CLASSTABLE_SEMESTER_FETCH_TIMEOUT,
+    SemesterSnapshot,
+)
+
+# 曲阜师范大学作息时间（北京时间），节次 -> (开始时间, 结束时间)
+CLASS_PERIOD_TIMES = {
+    1: ("08:00", "08:45"),
+    2: ("08:55", "09:40"),
+    3: ("10:00", "10:45"),
+    4: ("10:55", "11:40"),
+    5: ("14:00", "14:45"),
+    6: ("14:55", "15:40"),
+    7: ("16:00", "16:45"),
+    8: ("16:55", "17:40"),
+    9: ("19:00", "19:45"),
+    10: ("19:55", "20:40"),
+    11: ("20:50", "21:35"),
+    12: ("21:45", "22:30"),
+}
+
+# 北京时间固定为UTC+8（无夏令时），事件时间统一输出为UTC
+BEIJING_UTC_OFFSET = timedelta(hours=8)
+
+_PERIOD_NUMBER_RE = re.compile(r"\d+")
+_ICS_ESCAPE_RE = re.compile(r"([\\;,])")
+
+
+class ClassTableCalendarService:
+    """将学期课程表快照导出为 iCalendar (RFC 5545) 文本"""
+
+    @staticmethod
+    def _hash_feed_token(feed_token: str) -> str:
+        return hashlib.sha256(feed_token.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def issue_feed_token(student_id_hash: str) -> str:
+        """
+        生成课程表订阅凭证，替换该学生已有的凭证
+
+        日历应用订阅时无法携带 Authorization 头，凭证放在订阅地址的查询参数中；
+        数据库只保存凭证的sha256，重新生成或撤销后旧地址立即失效。
+
+        Args:
+            student_id_hash: 学生ID的hash值
+
+        Returns:
+            str: 订阅凭证明文（只在生成时返回一次）
+        """
+        feed_token = secrets.token_urlsafe(32)
+        save_calendar_feed_token(
+            student_id_hash, ClassTableCalendarService._hash_feed_token(feed_token)
+        )
+        return feed_token
+
+    @staticmethod
+    def resolve_feed_token(feed_token: str) -> Optional[str]:
+        """按订阅凭证查询所属学生的学号hash，凭证无效或已撤销时返回None"""
+        return get_calendar_feed_owner(
+            ClassTableCalendarService._hash_feed_token(feed_token)
+        )
+
+    @staticmethod
+    def revoke_feed_token(student_id_hash: str) -> bool:
+        """撤销学生的课程表订阅凭证"""
+        return delete_calendar_feed_token(student_id_hash)
+
+    @staticmethod
+    def parse_period_range(period: str) -> Optional[Tuple[int, int]]:
+        """
+        解析节次字符串
+
+        Args:
+            period: 节次信息，如 "02-03-04"
+
+        Returns:
+            Tuple[int, int]: (起始节次, 结束节次)，无法识别时返回None
+        """
+        numbers = [int(n) for n in _PERIOD_NUMBER_RE.findall(period or "")]
+        numbers = [n for n in numbers if n in CLASS_PERIOD_TIMES]
+        if not numbers:
+            return None
+        return min(numbers), max(numbers)
+
+    @staticmethod
+    def escape_text(value: str) -> str:
+        """转义 TEXT 类型属性值中的特殊字符"""
+        value = _ICS_ESCAPE_RE.sub(r"\\\1", value or "")
+        return value.replace("\r\n", "\\n").replace("\n", "\\n")
+
+    @staticmethod
+    def fold_line(line: str) -> str:
+        """按75字节折行（不截断UTF-8多字节字符），并追加CRLF"""
+        encoded = line.encode("utf-8")
+        if len(encoded) <= 75:
+            return line + "\r\n"
+
+        parts = []
+        current = ""
+        current_size = 0
+        limit = 75
+        for char in line:
+            size = len(char.encode("utf-8"))
+            if current_size + size > limit:
+                parts.append(current)
+                current = char
+                current_size = size
+                # 续行以一个空格开头，占用1字节
+                limit = 74
+            else:
+                current += char
+                current_size += size
+        parts.append(current)
+        return "\r\n ".join(parts) + "\r\n"
+
+    @staticmethod
+    def _format_utc(day: str, clock: str) -> str:
+        """将北京时间的日期和时刻转换为UTC时间戳字符串"""
+        local = datetime.strptime(f"{day} {clock}", "%Y-%m-%d %H:%M")
+        return (local - BEIJING_UTC_OFFSET).strftime("%Y%m%dT%H%M%SZ")
+
+    @staticmethod
+    def build_event(day: str, course: CourseInfo, dtstamp: str) -> Optional[str]:
+        """
+        生成单门课程的 VEVENT
+
+        Args:
+            day: 上课日期 (YYYY-MM-DD)
+            course: 课程信息
+            dtstamp: DTSTAMP 属性值
+
+        Returns:
+            str: VEVENT文本，节次无法识别时返回None
+        """
+        period_range = ClassTableCalendarService.parse_period_range(course.period)
+        if period_range is None:
+            return None
+        first, last = period_range
+        start = ClassTableCalendarService._format_utc(day, CLASS_PERIOD_TIMES[first][0])
+        end = ClassTableCalendarService._format_utc(day, CLASS_PERIOD_TIMES[last][1])
+
+        uid_source = f"{day}|{course.period}|{course.course_name}|{course.classroom}"
+        uid = hashlib.sha1(uid_source.encode("utf-8")).hexdigest()
+
+        description = (
+            f"学分：{course.course_credits}\n"
+            f"课程属性：{course.course_property}\n"
+            f"课堂名称：{course.class_name}\n"
+            f"上课时间：{course.class_time}"
+        )
+        escape = ClassTableCalendarService.escape_text
+        fold = ClassTableCalendarService.fold_line
+        return "".join(
+            (
+                fold("BEGIN:VEVENT"),
+                fold(f"UID:{uid}@easy-qfnu"),
+                fold(f"DTSTAMP:{dtstamp}"),
+                fold(f"DTSTART:{start}"),
+                fold(f"DTEND:{end}"),
+                fold(f"SUMMARY:{escape(course.course_name)}"),
+                fold(f"LOCATION:{escape(course.classroom)}"),
+                fold(f"DESCRIPTION:{escape(description)}"),
+                fold("END:VEVENT"),
+            )
+        )
+
+    @staticmethod
+    def iter_calendar(snapshot: SemesterSnapshot) -> Iterator[bytes]:
+        """
+        逐周生成学期课程表的 iCalendar 内容
+
+        先输出已缓存的周，快照中仍在获取的周在获取完成后依次输出。
+        快照完整（无 pending）时输出只取决于快照内容（DTSTAMP 取学期开始日期），
+        同一快照的ETag对应完全相同的字节流。
+
+        Args:
+            snapshot: 学期课程表快照
+
+        Yields:
+            bytes: UTF-8编码的日历片段
+        """
+        fold = ClassTableCalendarService.fold_line
+        dtstamp = (snapshot.term_start - BEIJING_UTC_OFFSET).strftime("%Y%m%dT%H%M%SZ")
+
+        yield "".join(
+            (
+                fold("BEGIN:VCALENDAR"),
+                fold("VERSION:2.0"),
+                fold("PRODID:-//Easy-QFNU//ClassTable//CN"),
+                fold("CALSCALE:GREGORIAN"),
+                fold("METHOD:PUBLISH"),
+                fold("X-WR-CALNAME:课程表"),
+                fold("X-WR-TIMEZONE:Asia/Shanghai"),
+            )
+        ).encode("utf-8")
+
+        for _, week in snapshot.iter_weeks(CLASSTABLE_SEMESTER_FETCH_TIMEOUT):
+            events = []
+            for day, day_courses in week.items():
+                for course in day_courses.courses:
+                    event = ClassTableCalendarService.build_event(day, course, dtstamp)
+                    if event is not None:
+                        events.append(event)
+            if events:
+                yield "".join(events).encode("utf-8")
+
+        yield fold("END:VCALENDAR").encode("utf-8")
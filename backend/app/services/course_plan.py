@@ -1,19 +1,509 @@
 # app/services/course_plan_service.py
+import datetime
+import gzip
+import hashlib
+import os
 import requests
-from bs4 import BeautifulSoup
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import re
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
 from loguru import logger
+from lxml import html as lxml_html
 import json
 from app.db import database as db
+from app.utils.lru_cache import LRUCache
+
+COURSE_PLAN_CACHE_MESSAGE = "从缓存加载培养方案成功"
+# 进程内一级缓存（SQLite为二级缓存）的容量和最长驻留时间（秒）
+COURSE_PLAN_L1_SIZE = int(os.getenv("COURSE_PLAN_L1_SIZE", "512"))
+COURSE_PLAN_L1_TTL = int(os.getenv("COURSE_PLAN_L1_TTL", "600"))
+# 进程内缓存的培养方案模板数量（同专业同年级学生共享一个模板）
+COURSE_PLAN_TEMPLATE_CACHE_SIZE = int(
+    os.getenv("COURSE_PLAN_TEMPLATE_CACHE_SIZE", "64")
+)
+# 后台刷新培养方案的最大并发数（所有学生共享）
+COURSE_PLAN_REFRESH_WORKERS = int(os.getenv("COURSE_PLAN_REFRESH_WORKERS", "2"))
+# 后台刷新结果的保留时间（秒），供客户端查询刷新状态
+COURSE_PLAN_REFRESH_STATUS_TTL = 3600
+
+# 响应中的 status 字段：current 为最新版本，stale 为后台刷新完成前的旧版本
+PLAN_STATUS_CURRENT = "current"
+PLAN_STATUS_STALE = "stale"
+
+# 后台刷新任务状态
+REFRESH_RUNNING = "refreshing"
+REFRESH_SUCCEEDED = "succeeded"
+REFRESH_FAILED = "failed"
+
+# 模块标题单元格，如 "通识教育必修课 (应修 30 / 已修 20.5)"
+MODULE_HEADER_RE = re.compile(
+    r"(.+?)\s*\(应修\s*(\d+\.?\d*)\s*/\s*已修\s*(\d+\.?\d*)\)"
+)
+COURSE_CODE_RE = re.compile(r"^[A-Za-z0-9]")
+_CLEAN_TEXT_RE = re.compile(r"&nbsp;|\s+")
+
+# 学时列顺序，与表格列一致
+HOUR_KEYS = (
+    "lecture",
+    "practice",
+    "seminar",
+    "experiment",
+    "design",
+    "computer",
+    "discussion",
+    "extracurricular",
+    "online",
+    "total",
+)
+
+
+def _clean_text(text: str) -> str:
+    """合并空白并去除 &nbsp;"""
+    return _CLEAN_TEXT_RE.sub(" ", text).strip()
+
+
+def _cell_text(texts: List[str], index: int, default: str) -> str:
+    """按列号取单元格文本，列不存在时返回默认值"""
+    return texts[index] if len(texts) > index else default
+
+
+class CachedCoursePlan:
+    """培养方案缓存条目：gzip压缩的完整响应体及内容hash"""
+
+    __slots__ = ("body", "content_hash", "updated_at")
+
+    def __init__(self, body: bytes, content_hash: str, updated_at: datetime.datetime):
+        self.body = body
+        self.content_hash = content_hash
+        self.updated_at = updated_at
+
+    @property
+    def etag(self) -> str:
+        # 弱ETag：同一版本的gzip与未压缩表示共用一个校验值
+        return f'W/"{self.content_hash}"'
+
+
+class CoursePlanRefresh:
+    """一次后台刷新任务的状态"""
+
+    __slots__ = ("status", "started_at", "finished_at", "error")
+
+    def __init__(self):
+        self.status = REFRESH_RUNNING
+        self.started_at = datetime.datetime.now()
+        self.finished_at: Optional[datetime.datetime] = None
+        self.error: Optional[str] = None
+
+    def finish(self, error: Optional[str] = None) -> None:
+        self.status = REFRESH_FAILED if error else REFRESH_SUCCEEDED
+        self.error = error
+        self.finished_at = datetime.datetime.now()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "status": self.status,
+            "started_at": self.started_at.isoformat(),
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "error": self.error,
+        }
 
 
 class CoursePlanService:
     """培养方案服务类"""
 
+    # 学号 -> CachedCoursePlan，命中时既不查询数据库也不需要教务系统session
+    _l1_cache = LRUCache(maxsize=COURSE_PLAN_L1_SIZE, ttl=COURSE_PLAN_L1_TTL)
+
+    @staticmethod
+    def _remember(student_id: str, cached: CachedCoursePlan) -> None:
+        """写入一级缓存，驻留时间不超过该条目在数据库中的剩余有效期"""
+        expires_at = cached.updated_at + datetime.timedelta(
+            days=db.COURSE_PLAN_CACHE_DAYS
+        )
+        remaining = (expires_at - datetime.datetime.now()).total_seconds()
+        if remaining > 0:
+            CoursePlanService._l1_cache.set(
+                student_id, cached, ttl=min(COURSE_PLAN_L1_TTL, remaining)
+            )
+
+    @staticmethod
+    def invalidate(student_id: str, student_id_hash: Optional[str] = None) -> bool:
+        """
+        删除培养方案缓存（一级缓存和数据库）
+
+        Args:
+            student_id: 学号
+            student_id_hash: 学号hash，调用方已计算时传入以免重复计算
+
+        Returns:
+            bool: 数据库中是否存在并删除了缓存
+        """
+        CoursePlanService._l1_cache.pop(student_id)
+        return db.delete_course_plan(student_id, student_id_hash=student_id_hash)
+
+    # 学号 -> 最近一次后台刷新任务
+    _refresh_jobs = LRUCache(
+        maxsize=COURSE_PLAN_L1_SIZE, ttl=COURSE_PLAN_REFRESH_STATUS_TTL
+    )
+    _refresh_lock = threading.Lock()
+    _refresh_executor: Optional[ThreadPoolExecutor] = None
+
+    @staticmethod
+    def _get_refresh_executor() -> ThreadPoolExecutor:
+        """获取（懒加载）后台刷新线程池"""
+        with CoursePlanService._refresh_lock:
+            if CoursePlanService._refresh_executor is None:
+                CoursePlanService._refresh_executor = ThreadPoolExecutor(
+                    max_workers=max(1, COURSE_PLAN_REFRESH_WORKERS),
+                    thread_name_prefix="course-plan-refresh",
+                )
+            return CoursePlanService._refresh_executor
+
+    @staticmethod
+    def get_refresh_job(student_id: str) -> Optional[CoursePlanRefresh]:
+        """获取学生最近一次后台刷新任务，不存在或已过期时返回None"""
+        return CoursePlanService._refresh_jobs.get(student_id)
+
+    @staticmethod
+    def schedule_refresh(student_id: str, student_id_hash: str) -> CoursePlanRefresh:
+        """
+        在后台线程中从教务系统重新获取培养方案，完成前缓存中的旧版本继续提供服务
+
+        同一学生已有进行中的刷新任务时不会重复提交。
+
+        Args:
+            student_id: 学号
+            student_id_hash: 学号hash，后台任务据此加载已保存的教务系统session
+
+        Returns:
+            CoursePlanRefresh: 进行中的刷新任务
+        """
+        with CoursePlanService._refresh_lock:
+            job = CoursePlanService._refresh_jobs.get(student_id)
+            if job is not None and job.status == REFRESH_RUNNING:
+                logger.info(f"学号 {student_id} 的培养方案已在后台刷新中")
+                return job
+            job = CoursePlanRefresh()
+            CoursePlanService._refresh_jobs.set(student_id, job)
+
+        try:
+            CoursePlanService._get_refresh_executor().submit(
+                CoursePlanService._refresh_job, student_id, student_id_hash, job
+            )
+        except RuntimeError as e:
+            # 应用关闭后线程池不再接受任务
+            job.finish(str(e))
+            raise
+        logger.info(f"已提交学号 {student_id} 的培养方案后台刷新任务")
+        return job
+
+    @staticmethod
+    def _refresh_job(
+        student_id: str, student_id_hash: str, job: CoursePlanRefresh
+    ) -> None:
+        """后台任务：获取最新培养方案并替换缓存"""
+        session = None
+        try:
+            # 后台线程不能复用请求中的session，按hash重新加载
+            session = db.get_session_by_hash(student_id_hash)
+            if session is None:
+                raise Exception("Session不存在，请重新登录")
+            CoursePlanService.fetch_course_plan(session, student_id, student_id_hash)
+            job.finish()
+            logger.info(
+                f"学号 {student_id} 的培养方案后台刷新完成，"
+                f"耗时 {(job.finished_at - job.started_at).total_seconds():.2f}s"
+            )
+        except Exception as e:
+            job.finish(str(e))
+            logger.warning(f"学号 {student_id} 的培养方案后台刷新失败: {e}")
+        finally:
+            if session is not None:
+                session.close()
+
+    @staticmethod
+    def shutdown() -> None:
+        """关闭后台刷新线程池，丢弃尚未开始的任务"""
+        with CoursePlanService._refresh_lock:
+            executor = CoursePlanService._refresh_executor
+            CoursePlanService._refresh_executor = None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def _encode_cache_body(
+        data_dict: Dict[str, Any], updated_at: datetime.datetime
+    ) -> Tuple[bytes, str, int]:
+        """
+        将培养方案数据预先序列化为缓存命中时的完整响应体并压缩
+
+        Args:
+            data_dict: 解析后的培养方案数据
+            updated_at: 缓存时间
+
+        Returns:
+            Tuple[bytes, str, int]: (gzip压缩的响应体, 数据sha256, 未压缩字节数)
+        """
+        data_json = json.dumps(data_dict, ensure_ascii=False)
+        content_hash = hashlib.sha256(data_json.encode("utf-8")).hexdigest()
+        raw_body = (
+            '{"success": true, "message": '
+            + json.dumps(COURSE_PLAN_CACHE_MESSAGE, ensure_ascii=False)
+            + ', "data": '
+            + data_json
+            + ', "updated_at": '
+            + json.dumps(updated_at.isoformat())
+            + ', "source": "cache", "status": '
+            + json.dumps(PLAN_STATUS_CURRENT)
+            + "}"
+        ).encode("utf-8")
+        # mtime=0 使相同内容压缩结果一致
+        body = gzip.compress(raw_body, compresslevel=6, mtime=0)
+        return body, content_hash, len(raw_body)
+
+    # 模板hash -> 模板数据，各学生的缓存按个人部分与模板合并得到
+    _template_cache = LRUCache(maxsize=COURSE_PLAN_TEMPLATE_CACHE_SIZE)
+
+    @staticmethod
+    def _split_plan(
+        data_dict: Dict[str, Any],
+    ) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """
+        将培养方案拆分为共享模板和个人部分
+
+        模板包含模块、课程和学时等同专业同年级学生相同的内容；
+        个人部分只有各模块的已修学分和各课程的修读状态，按模板中的顺序排列。
+
+        Args:
+            data_dict: 解析后的培养方案数据
+
+        Returns:
+            Tuple[dict, dict]: (模板, 个人部分)
+        """
+        modules = []
+        completed_credits = []
+        completion_status = []
+        for module in data_dict.get("modules", []):
+            courses = []
+            statuses = []
+            for course in module.get("courses", []):
+                statuses.append(course.get("completion_status", "未修"))
+                courses.append(
+                    {k: v for k, v in course.items() if k != "completion_status"}
+                )
+            template_module = {
+                k: v for k, v in module.items() if k != "completed_credits"
+            }
+            template_module["courses"] = courses
+            modules.append(template_module)
+            completed_credits.append(module.get("completed_credits", 0.0))
+            completion_status.append(statuses)
+
+        overlay = {
+            "completed_credits": completed_credits,
+            "completion_status": completion_status,
+        }
+        return {"modules": modules}, overlay
+
+    @staticmethod
+    def _merge_plan(
+        template: Dict[str, Any], overlay: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """
+        将共享模板与个人部分合并为完整的培养方案数据（字段顺序与解析结果一致）
+
+        Raises:
+            ValueError: 个人部分与模板的模块或课程数量不一致
+        """
+        completed_credits = overlay["completed_credits"]
+        completion_status = overlay["completion_status"]
+        template_modules = template["modules"]
+        if len(completed_credits) != len(template_modules) or len(
+            completion_status
+        ) != len(template_modules):
+            raise ValueError("培养方案个人部分与模板的模块数量不一致")
+
+        modules = []
+        for template_module, credits, statuses in zip(
+            template_modules, completed_credits, completion_status
+        ):
+            template_courses = template_module["courses"]
+            if len(statuses) != len(template_courses):
+                raise ValueError("培养方案个人部分与模板的课程数量不一致")
+
+            courses = []
+            for template_course, status in zip(template_courses, statuses):
+                course = {
+                    "course_code": template_course["course_code"],
+                    "course_name": template_course["course_name"],
+                    "completion_status": status,
+                }
+                course.update(template_course)
+                courses.append(course)
+
+            module = {
+                "module_name": template_module["module_name"],
+                "required_credits": template_module["required_credits"],
+                "completed_credits": credits,
+            }
+            module.update(template_module)
+            module["courses"] = courses
+            modules.append(module)
+
+        return CoursePlanService._build_plan_result(modules)
+
+    @staticmethod
+    def _intern_template(template: Dict[str, Any]) -> Tuple[str, bool]:
+        """
+        按内容hash保存培养方案模板，相同模板在进程内和数据库中只保留一份
+
+        进程内缓存命中时仍要确认数据库中的模板行存在：模板不再被引用时会被
+        _delete_unused_template 删除（可能由其他进程执行），跳过写入会让新的
+        培养方案记录指向已删除的模板。
+
+        Args:
+            template: 培养方案模板
+
+        Returns:
+            Tuple[str, bool]: (模板hash, 是否复用了已有模板)
+        """
+        template_json = json.dumps(template, ensure_ascii=False, separators=(",", ":"))
+        template_hash = hashlib.sha256(template_json.encode("utf-8")).hexdigest()
+        created = db.save_course_plan_template(
+            template_hash,
+            gzip.compress(template_json.encode("utf-8"), compresslevel=6, mtime=0),
+        )
+        CoursePlanService._template_cache.set(template_hash, template)
+        return template_hash, not created
+
+    @staticmethod
+    def _load_template(template_hash: str) -> Optional[Dict[str, Any]]:
+        """按hash读取培养方案模板，优先使用进程内缓存"""
+        template = CoursePlanService._template_cache.get(template_hash)
+        if template is not None:
+            return template
+
+        body = db.get_course_plan_template(template_hash)
+        if body is None:
+            return None
+        try:
+            template = json.loads(gzip.decompress(body))
+        except (OSError, ValueError) as e:
+            logger.warning(f"培养方案模板 {template_hash[:12]} 无法解析: {e}")
+            return None
+        CoursePlanService._template_cache.set(template_hash, template)
+        return template
+
+    @staticmethod
+    def _save_plan(
+        student_id: str,
+        data_dict: Dict[str, Any],
+        content_hash: str,
+        updated_at: datetime.datetime,
+        student_id_hash: Optional[str] = None,
+    ) -> None:
+        """拆分培养方案，共享模板按hash去重保存，学生记录只保存模板hash和个人部分"""
+        template, overlay = CoursePlanService._split_plan(data_dict)
+        template_hash, reused = CoursePlanService._intern_template(template)
+        overlay_json = json.dumps(overlay, ensure_ascii=False, separators=(",", ":"))
+        db.save_course_plan(
+            student_id,
+            template_hash,
+            overlay_json,
+            content_hash,
+            updated_at,
+            student_id_hash=student_id_hash,
+        )
+        logger.info(
+            f"已将学号 {student_id} 的培养方案存入缓存，"
+            f"模板 {template_hash[:12]}（{'复用' if reused else '新建'}），"
+            f"个人部分 {len(overlay_json.encode('utf-8'))} 字节"
+        )
+
+    @staticmethod
+    def get_cached_plan(
+        student_id: str, student_id_hash: Optional[str] = None
+    ) -> Optional[CachedCoursePlan]:
+        """
+        读取培养方案缓存
+
+        一级缓存命中时直接返回压缩好的响应体；数据库命中时将共享模板与个人部分合并，
+        压缩后放入一级缓存。
+
+        Args:
+            student_id: 学号
+            student_id_hash: 学号hash，调用方已计算时传入以免重复计算
+
+        Returns:
+            CachedCoursePlan: 缓存条目，未命中时返回None
+        """
+        start = time.perf_counter()
+        cached = CoursePlanService._l1_cache.get(student_id)
+        if cached is not None:
+            logger.debug(
+                f"培养方案一级缓存命中 - 学号: {student_id}，"
+                f"耗时 {(time.perf_counter() - start) * 1000:.3f}ms"
+            )
+            return cached
+
+        cached_plan = db.get_course_plan(student_id, student_id_hash=student_id_hash)
+        if not cached_plan:
+            return None
+
+        updated_at = cached_plan["updated_at"]
+        legacy = not cached_plan["template_hash"] or cached_plan["overlay"] is None
+        try:
+            if not legacy:
+                template = CoursePlanService._load_template(
+                    cached_plan["template_hash"]
+                )
+                if template is None:
+                    logger.warning(
+                        f"培养方案模板 {cached_plan['template_hash'][:12]} 不存在，忽略缓存"
+                    )
+                    return None
+                data_dict = CoursePlanService._merge_plan(
+                    template, json.loads(cached_plan["overlay"])
+                )
+            elif cached_plan["plan_body"] is not None:
+                # 旧版按学生保存的完整响应体
+                data_dict = json.loads(gzip.decompress(cached_plan["plan_body"]))[
+                    "data"
+                ]
+            else:
+                # 旧版未压缩的JSON文本
+                data_dict = json.loads(cached_plan["plan_content"])
+        except (KeyError, TypeError, ValueError, OSError) as e:
+            logger.warning(f"培养方案缓存无法解析，忽略: {e}")
+            return None
+
+        body, content_hash, _ = CoursePlanService._encode_cache_body(
+            data_dict, updated_at
+        )
+        if legacy:
+            # 旧版缓存记录，拆分为模板和个人部分后写回
+            try:
+                CoursePlanService._save_plan(
+                    student_id, data_dict, content_hash, updated_at, student_id_hash
+                )
+            except Exception as e:
+                logger.error(f"转换旧版培养方案缓存失败: {e}")
+
+        cached = CachedCoursePlan(body, content_hash, updated_at)
+        CoursePlanService._remember(student_id, cached)
+        logger.info(
+            f"成功从缓存中获取到学号 {student_id} 的培养方案，"
+            f"耗时 {(time.perf_counter() - start) * 1000:.2f}ms，压缩体 {len(body)} 字节"
+        )
+        return cached
+
     @staticmethod
     def get_course_plan_data(
-        session: requests.Session, student_id: str
+        session: requests.Session,
+        student_id: str,
+        student_id_hash: Optional[str] = None,
     ) -> Dict[str, Any]:
         """
         获取培养方案数据，优先从缓存读取
@@ -21,6 +511,7 @@ class CoursePlanService:
         Args:
             session: 已登录的教务系统session
             student_id: 学号
+            student_id_hash: 学号hash，调用方已计算时传入以免重复计算
 
         Returns:
             dict: 包含培养方案数据的字典
@@ -31,19 +522,36 @@ class CoursePlanService:
         logger.info(f"开始获取学号 {student_id} 的培养方案...")
 
         # 1. 尝试从缓存获取
-        cached_plan = db.get_course_plan(student_id)
+        cached_plan = CoursePlanService.get_cached_plan(student_id, student_id_hash)
         if cached_plan:
-            logger.info(f"成功从缓存中获取到学号 {student_id} 的培养方案。")
-            return {
-                "success": True,
-                "message": "从缓存加载培养方案成功",
-                "data": json.loads(cached_plan["plan_content"]),
-                "updated_at": cached_plan["updated_at"].isoformat(),
-                "source": "cache",
-            }
+            return json.loads(gzip.decompress(cached_plan.body))
 
-        logger.info(f"缓存未命中，从教务系统实时获取学号 {student_id} 的培养方案。")
         # 2. 缓存未命中，从网络获取
+        return CoursePlanService.fetch_course_plan(
+            session, student_id, student_id_hash
+        )[0]
+
+    @staticmethod
+    def fetch_course_plan(
+        session: requests.Session,
+        student_id: str,
+        student_id_hash: Optional[str] = None,
+    ) -> Tuple[Dict[str, Any], str]:
+        """
+        从教务系统实时获取培养方案并写入缓存
+
+        Args:
+            session: 已登录的教务系统session
+            student_id: 学号
+            student_id_hash: 学号hash，调用方已计算时传入以免重复计算
+
+        Returns:
+            Tuple[dict, str]: (培养方案响应数据, 数据sha256)
+
+        Raises:
+            Exception: 当获取或解析失败时抛出异常
+        """
+        logger.info(f"缓存未命中，从教务系统实时获取学号 {student_id} 的培养方案。")
         try:
             url = "http://zhjw.qfnu.edu.cn/jsxsd/pyfa/topyfamx"
             headers = {
@@ -67,10 +575,17 @@ class CoursePlanService:
                 raise Exception(data_dict["error"])
 
             # 3. 保存到缓存
+            updated_at = datetime.datetime.now()
+            body, content_hash, _ = CoursePlanService._encode_cache_body(
+                data_dict, updated_at
+            )
             try:
-                plan_content_json = json.dumps(data_dict, ensure_ascii=False)
-                db.save_course_plan(student_id, plan_content_json)
-                logger.info(f"已将学号 {student_id} 的新培养方案存入缓存。")
+                CoursePlanService._save_plan(
+                    student_id, data_dict, content_hash, updated_at, student_id_hash
+                )
+                CoursePlanService._remember(
+                    student_id, CachedCoursePlan(body, content_hash, updated_at)
+                )
             except Exception as e:
                 logger.error(f"培养方案存入缓存失败: {e}")
                 # 缓存失败不应影响主流程，仅记录日志
@@ -83,12 +598,14 @@ class CoursePlanService:
                 f"培养方案解析完成: 模块数={total_modules}, 课程数={total_courses}"
             )
 
-            return {
+            result = {
                 "success": True,
                 "message": f"成功解析{total_modules}个模块，共{total_courses}门课程",
                 "data": data_dict,
                 "source": "live",
+                "status": PLAN_STATUS_CURRENT,
             }
+            return result, content_hash
 
         except requests.exceptions.RequestException as e:
             logger.error(f"网络请求错误: {e}")
@@ -102,6 +619,8 @@ class CoursePlanService:
         """
         从培养方案HTML内容中提取课程设置总表并转换为结构化字典
 
+        使用lxml单次遍历表格，每个单元格的文本只提取一次。
+
         Args:
             html_content: HTML内容字符串
 
@@ -115,207 +634,106 @@ class CoursePlanService:
         """
         logger.debug("开始解析培养方案HTML内容...")
 
-        soup = BeautifulSoup(html_content, "html.parser")
-
-        table = soup.find("table", {"id": "dataList"})
-        if not table:
+        tables = (
+            lxml_html.fromstring(html_content).xpath("//table[@id='dataList']")
+            if html_content and html_content.strip()
+            else []
+        )
+        if not tables:
             return {"error": "未找到课程表格，可能是教务session过期，请重新登录"}
 
         modules = []
         current_module = None
 
-        rows = table.find_all("tr")  # type: ignore
-        for row in rows:
-            cells = row.find_all(["td", "th"])  # type: ignore
-
-            if len(cells) > 0:
-                first_cell = cells[0]
-                first_cell_text = first_cell.get_text().strip()
-
-                if (
-                    first_cell.get("rowspan")  # type: ignore
-                    and "(" in first_cell_text
-                    and ("应修" in first_cell_text or "已修" in first_cell_text)
-                ):
-                    module_match = re.match(
-                        r"(.+?)\s*\(应修\s*(\d+\.?\d*)\s*/\s*已修\s*(\d+\.?\d*)\)",
-                        first_cell_text,
-                    )
-
-                    if module_match:
-                        module_name = module_match.group(1)
-                        required_credits = float(module_match.group(2))
-                        completed_credits = float(module_match.group(3))
-
-                        current_module = {
-                            "module_name": module_name,
-                            "required_credits": required_credits,
-                            "completed_credits": completed_credits,
-                            "courses": [],
-                            "subtotal": None,
-                        }
-                        modules.append(current_module)
-
-            if len(cells) >= 12 and current_module is not None:
-                if cells[0].get_text().strip() == "小计":
-
-                    def clean_text(text: str) -> str:
-                        return re.sub(r"&nbsp;|\s+", " ", text).strip()
-
-                    subtotal_info = {
-                        "total_credits": clean_text(cells[1].get_text()),
-                        "hours": {
-                            "lecture": clean_text(cells[2].get_text()),
-                            "practice": clean_text(cells[3].get_text()),
-                            "seminar": clean_text(cells[4].get_text()),
-                            "experiment": clean_text(cells[5].get_text()),
-                            "design": clean_text(cells[6].get_text()),
-                            "computer": clean_text(cells[7].get_text()),
-                            "discussion": clean_text(cells[8].get_text()),
-                            "extracurricular": clean_text(cells[9].get_text()),
-                            "online": clean_text(cells[10].get_text()),
-                            "total": clean_text(cells[11].get_text()),
-                        },
+        for row in tables[0].iter("tr"):
+            cells = list(row.iter("td", "th"))
+            if not cells:
+                continue
+
+            texts = ["".join(cell.itertext()).strip() for cell in cells]
+            cell_count = len(texts)
+            first_text = texts[0]
+            first_rowspan = cells[0].get("rowspan")
+            is_module_text = "应修" in first_text or "已修" in first_text
+
+            if first_rowspan and "(" in first_text and is_module_text:
+                module_match = MODULE_HEADER_RE.match(first_text)
+                if module_match:
+                    current_module = {
+                        "module_name": module_match.group(1),
+                        "required_credits": float(module_match.group(2)),
+                        "completed_credits": float(module_match.group(3)),
+                        "courses": [],
+                        "subtotal": None,
                     }
+                    modules.append(current_module)
+
+            if cell_count < 12 or current_module is None:
+                continue
+
+            if first_text == "小计":
+                current_module["subtotal"] = {
+                    "total_credits": _clean_text(texts[1]),
+                    "hours": {
+                        key: _clean_text(texts[index])
+                        for index, key in enumerate(HOUR_KEYS, start=2)
+                    },
+                }
+                continue
+
+            base_index = 2 if first_rowspan is not None and is_module_text else 1
+
+            course_code = (
+                texts[base_index].replace("&nbsp;", "")
+                if cell_count > base_index
+                else ""
+            )
+            course_name = (
+                texts[base_index + 1].replace("&nbsp;", "")
+                if cell_count > base_index + 1
+                else ""
+            )
 
-                    current_module["subtotal"] = subtotal_info
-                    continue
-
-            if len(cells) >= 12 and current_module is not None:
-                first_text = cells[0].get_text().strip() if len(cells) > 0 else ""
-                has_module_cell = cells[0].get("rowspan") is not None and (  # type: ignore
-                    "应修" in first_text or "已修" in first_text
-                )
-
-                base_index = 2 if has_module_cell else 1
-
-                course_code = (
-                    re.sub(r"&nbsp;", "", cells[base_index].get_text().strip())
-                    if len(cells) > base_index
-                    else ""
-                )
-                course_name = (
-                    re.sub(r"&nbsp;", "", cells[base_index + 1].get_text().strip())
-                    if len(cells) > base_index + 1
-                    else ""
-                )
-
-                if (
-                    course_code
-                    and course_name
-                    and course_name != "小计"
-                    and cells[0].get_text().strip() != "小计"
-                    and len(course_code) >= 3
-                    and re.match(r"^[A-Za-z0-9]", course_code)
-                ):
-                    completion_status = (
-                        cells[base_index + 2].get_text().strip()
-                        if len(cells) > base_index + 2
-                        else ""
-                    )
-                    course_nature = (
-                        cells[base_index + 3].get_text().strip()
-                        if len(cells) > base_index + 3
-                        else ""
-                    )
-                    course_attribute = (
-                        cells[base_index + 4].get_text().strip()
-                        if len(cells) > base_index + 4
-                        else ""
-                    )
-                    credits = (
-                        cells[base_index + 5].get_text().strip()
-                        if len(cells) > base_index + 5
-                        else ""
-                    )
-
-                    lecture_hours = (
-                        cells[base_index + 6].get_text().strip()
-                        if len(cells) > base_index + 6
-                        else "0"
-                    )
-                    practice_hours = (
-                        cells[base_index + 7].get_text().strip()
-                        if len(cells) > base_index + 7
-                        else "0"
-                    )
-                    seminar_hours = (
-                        cells[base_index + 8].get_text().strip()
-                        if len(cells) > base_index + 8
-                        else "0"
-                    )
-                    experiment_hours = (
-                        cells[base_index + 9].get_text().strip()
-                        if len(cells) > base_index + 9
-                        else "0"
-                    )
-                    design_hours = (
-                        cells[base_index + 10].get_text().strip()
-                        if len(cells) > base_index + 10
-                        else "0"
-                    )
-                    computer_hours = (
-                        cells[base_index + 11].get_text().strip()
-                        if len(cells) > base_index + 11
-                        else "0"
-                    )
-                    discussion_hours = (
-                        cells[base_index + 12].get_text().strip()
-                        if len(cells) > base_index + 12
-                        else "0"
-                    )
-                    extracurricular_hours = (
-                        cells[base_index + 13].get_text().strip()
-                        if len(cells) > base_index + 13
-                        else "0"
-                    )
-                    online_hours = (
-                        cells[base_index + 14].get_text().strip()
-                        if len(cells) > base_index + 14
-                        else "0"
-                    )
-                    total_hours = (
-                        cells[base_index + 15].get_text().strip()
-                        if len(cells) > base_index + 15
-                        else "0"
-                    )
-                    semester = (
-                        cells[base_index + 16].get_text().strip()
-                        if len(cells) > base_index + 16
-                        else ""
-                    )
-
-                    def clean_text(text: str) -> str:
-                        return re.sub(r"&nbsp;|\s+", " ", text).strip()
+            if (
+                course_code
+                and course_name
+                and course_name != "小计"
+                and len(course_code) >= 3
+                and COURSE_CODE_RE.match(course_code)
+            ):
 
-                    course = {
-                        "course_code": clean_text(course_code),
-                        "course_name": clean_text(course_name),
+                completion_status = _cell_text(texts, base_index + 2, "")
+                current_module["courses"].append(
+                    {
+                        "course_code": _clean_text(course_code),
+                        "course_name": _clean_text(course_name),
                         "completion_status": (
-                            clean_text(completion_status)
+                            _clean_text(completion_status)
                             if completion_status
                             else "未修"
                         ),
-                        "course_nature": clean_text(course_nature),
-                        "course_attribute": clean_text(course_attribute),
-                        "credits": clean_text(credits),
+                        "course_nature": _clean_text(
+                            _cell_text(texts, base_index + 3, "")
+                        ),
+                        "course_attribute": _clean_text(
+                            _cell_text(texts, base_index + 4, "")
+                        ),
+                        "credits": _clean_text(_cell_text(texts, base_index + 5, "")),
                         "hours": {
-                            "lecture": clean_text(lecture_hours),
-                            "practice": clean_text(practice_hours),
-                            "seminar": clean_text(seminar_hours),
-                            "experiment": clean_text(experiment_hours),
-                            "design": clean_text(design_hours),
-                            "computer": clean_text(computer_hours),
-                            "discussion": clean_text(discussion_hours),
-                            "extracurricular": clean_text(extracurricular_hours),
-                            "online": clean_text(online_hours),
-                            "total": clean_text(total_hours),
+                            key: _clean_text(
+                                _cell_text(texts, base_index + offset, "0")
+                            )
+                            for offset, key in enumerate(HOUR_KEYS, start=6)
                         },
-                        "semester": clean_text(semester),
+                        "semester": _clean_text(_cell_text(texts, base_index + 16, "")),
                     }
+                )
 
-                    current_module["courses"].append(course)
+        return CoursePlanService._build_plan_result(modules)
 
+    @staticmethod
+    def _build_plan_result(modules: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """根据模块列表计算未完成模块和模块课程数量，组装解析结果"""
         # 计算未完成模块
         incomplete_modules = []
         for module in modules:
@@ -1,15 +1,38 @@
+import heapq
+import multiprocessing
+import os
 import re
+import threading
+import time
 import unicodedata
+from concurrent.futures import ProcessPoolExecutor
 from difflib import SequenceMatcher
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
 from pathlib import Path
 from sqlalchemy import create_engine, Column, Integer, String, Text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
 from loguru import logger
+from app.utils.lru_cache import LRUCache
 
 Base = declarative_base()
 
+# 预编译标准化所用的正则
+_WHITESPACE_RE = re.compile(r"\s+")
+_NON_WORD_RE = re.compile(r"[^0-9a-zA-Z\u4e00-\u9fff\s]")
+
+OPTION_KEYS = ("optionA", "optionB", "optionC", "optionD")
+
+# 批量搜索进程池配置
+BATCH_SEARCH_WORKERS = int(
+    os.getenv("QUESTION_SEARCH_WORKERS", str(min(os.cpu_count() or 1, 4)))
+)
+# 查询数量不超过该值时直接在当前进程计算，避免进程间通信开销
+BATCH_INLINE_MAX_QUERIES = int(os.getenv("QUESTION_SEARCH_INLINE_MAX", "2"))
+
+# 搜索结果缓存容量（按 标准化查询+topk+threshold 缓存）
+RESULT_CACHE_SIZE = int(os.getenv("QUESTION_SEARCH_CACHE_SIZE", "2048"))
+
 
 class Question(Base):
     """题库数据模型"""
@@ -26,21 +49,71 @@ class Question(Base):
     optionAnswer = Column(String, nullable=True)
 
 
+class QuestionRecord:
+    """内存中的题目记录，保存原始字段以及预先标准化的题干和字符集合"""
+
+    __slots__ = (
+        "type",
+        "question",
+        "optionA",
+        "optionB",
+        "optionC",
+        "optionD",
+        "optionAnswer",
+        "norm",
+        "chars",
+    )
+
+    def __init__(self, question: Question):
+        self.type = question.type
+        self.question = question.question
+        self.optionA = question.optionA
+        self.optionB = question.optionB
+        self.optionC = question.optionC
+        self.optionD = question.optionD
+        self.optionAnswer = question.optionAnswer
+        self.norm = QuestionSearchService.normalize_text(
+            (question.question or "").strip()
+        )
+        self.chars: FrozenSet[str] = frozenset(
+            QuestionSearchService.char_set(self.norm)
+        )
+
+
+class QuestionCorpus:
+    """只读题库语料，version 为数据库文件的 (mtime_ns, size)"""
+
+    __slots__ = ("records", "version")
+
+    def __init__(self, records: List[QuestionRecord], version: Tuple[int, int]):
+        self.records = records
+        self.version = version
+
+
 class QuestionSearchService:
     """题库搜索服务类"""
 
     def __init__(self):
         self.engine = None
         self.SessionLocal = None
+        self._corpus: Optional[QuestionCorpus] = None
+        self._corpus_lock = threading.Lock()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+        self._result_cache = LRUCache(maxsize=RESULT_CACHE_SIZE)
+
+    @staticmethod
+    def _get_db_path() -> Path:
+        """获取题库数据库路径：API文件的上上上层的data目录"""
+        current_dir = Path(__file__).resolve().parent.parent.parent
+        return current_dir / "data" / "freshman_questions.db"
 
     def _get_db_engine(self):
         """获取数据库引擎"""
         if self.engine is None:
             logger.debug("开始获取题库数据库引擎...")
 
-            # 获取数据库路径：API文件的上上上层的data目录
-            current_dir = Path(__file__).resolve().parent.parent.parent
-            db_path = current_dir / "data" / "freshman_questions.db"
+            db_path = self._get_db_path()
 
             logger.debug(f"题库数据库路径: {db_path}")
 
@@ -66,14 +139,61 @@ class QuestionSearchService:
             logger.error(f"创建题库数据库会话失败: {e}")
             raise
 
+    def get_db_version(self) -> Tuple[int, int]:
+        """获取题库数据库文件版本 (mtime_ns, size)"""
+        db_path = self._get_db_path()
+        try:
+            stat = db_path.stat()
+        except FileNotFoundError:
+            logger.error(f"题库数据库文件不存在: {db_path}")
+            raise FileNotFoundError(f"题库数据库文件不存在: {db_path}")
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load_corpus(self, version: Tuple[int, int]) -> QuestionCorpus:
+        """从数据库加载全部题目并预处理为内存语料"""
+        # 数据库文件被替换后旧连接仍指向旧文件，先释放连接池
+        if self.engine is not None:
+            self.engine.dispose()
+
+        session = None
+        try:
+            session = self._get_db_session()
+            start = time.perf_counter()
+            records = [QuestionRecord(q) for q in session.query(Question).all()]
+            logger.info(
+                f"题库语料加载完成，共 {len(records)} 道题目，"
+                f"耗时 {(time.perf_counter() - start) * 1000:.1f}ms"
+            )
+            return QuestionCorpus(records, version)
+        finally:
+            if session:
+                session.close()
+
+    def get_corpus(self) -> QuestionCorpus:
+        """获取题库语料，数据库文件变化时自动重新加载"""
+        version = self.get_db_version()
+        corpus = self._corpus
+        if corpus is not None and corpus.version == version:
+            return corpus
+
+        with self._corpus_lock:
+            corpus = self._corpus
+            if corpus is None or corpus.version != version:
+                if corpus is not None:
+                    logger.info("检测到题库数据库文件变化，重新加载题库语料")
+                corpus = self._load_corpus(version)
+                self._corpus = corpus
+                self._result_cache.clear()
+        return corpus
+
     @staticmethod
     def normalize_text(text: str) -> str:
         """文本标准化处理"""
         if text is None:
             return ""
         text = unicodedata.normalize("NFKC", str(text)).strip().lower()
-        text = re.sub(r"\s+", " ", text)
-        text = re.sub(r"[^0-9a-zA-Z\u4e00-\u9fff\s]", "", text)
+        text = _WHITESPACE_RE.sub(" ", text)
+        text = _NON_WORD_RE.sub("", text)
         return text
 
     @staticmethod
@@ -82,20 +202,17 @@ class QuestionSearchService:
         return set(ch for ch in text if ch.strip())
 
     @staticmethod
-    def similarity(a: str, b: str) -> float:
-        """计算两个文本的相似度"""
-        if not a or not b:
-            return 0.0
-        a_norm = QuestionSearchService.normalize_text(a)
-        b_norm = QuestionSearchService.normalize_text(b)
+    def _score(
+        a_norm: str, set_a: FrozenSet[str], b_norm: str, set_b: FrozenSet[str]
+    ) -> float:
+        """基于已标准化的文本和字符集合计算相似度"""
         if not a_norm or not b_norm:
             return 0.0
 
         ratio = SequenceMatcher(None, a_norm, b_norm).ratio()
-        set_a, set_b = QuestionSearchService.char_set(
-            a_norm
-        ), QuestionSearchService.char_set(b_norm)
-        jacc = (len(set_a & set_b) / len(set_a | set_b)) if (set_a | set_b) else 0.0
+        inter = len(set_a & set_b)
+        union = len(set_a) + len(set_b) - inter
+        jacc = (inter / union) if union else 0.0
 
         contain_bonus = 0.0
         if a_norm in b_norm or b_norm in a_norm:
@@ -104,6 +221,20 @@ class QuestionSearchService:
         score = 0.7 * ratio + 0.3 * jacc + contain_bonus
         return min(score, 1.0)
 
+    @staticmethod
+    def similarity(a: str, b: str) -> float:
+        """计算两个文本的相似度"""
+        if not a or not b:
+            return 0.0
+        a_norm = QuestionSearchService.normalize_text(a)
+        b_norm = QuestionSearchService.normalize_text(b)
+        return QuestionSearchService._score(
+            a_norm,
+            frozenset(QuestionSearchService.char_set(a_norm)),
+            b_norm,
+            frozenset(QuestionSearchService.char_set(b_norm)),
+        )
+
     @staticmethod
     def extract_answer_struct(question_data: Dict[str, Any]) -> Dict[str, Any]:
         """提取答案结构"""
@@ -111,6 +242,102 @@ class QuestionSearchService:
         text = question_data.get(f"option{letter}") if letter else None
         return {"letter": letter or None, "text": text}
 
+    @staticmethod
+    def _format_result(score: float, record: QuestionRecord) -> Dict[str, Any]:
+        """构建单条搜索结果"""
+        question_data = {
+            "type": record.type,
+            "question": record.question,
+            "optionA": record.optionA,
+            "optionB": record.optionB,
+            "optionC": record.optionC,
+            "optionD": record.optionD,
+            "optionAnswer": record.optionAnswer,
+        }
+        return {
+            "score": round(float(score), 6),
+            "type": record.type,
+            "question": record.question,
+            "options": {
+                k[-1]: question_data.get(k) for k in OPTION_KEYS if question_data.get(k)
+            },
+            "answer": QuestionSearchService.extract_answer_struct(question_data),
+        }
+
+    @staticmethod
+    def _rank(
+        corpus: QuestionCorpus,
+        query_norm: str,
+        query_chars: FrozenSet[str],
+        topk: int,
+        threshold: float,
+    ) -> List[Tuple[float, QuestionRecord]]:
+        """
+        在语料中选出相似度最高的topk条记录
+
+        使用容量为topk的小顶堆保存当前结果，并用分数上界跳过不可能进入结果的题目：
+        SequenceMatcher.ratio() 不超过 2*min(len)/(len_a+len_b)，
+        Jaccard 系数不超过 min(|A|,|B|)/max(|A|,|B|)。
+        只有上界能超过阈值和当前第k名时才计算 SequenceMatcher。
+        排序结果与全量排序后截取前topk个完全一致（同分按题库顺序）。
+        """
+        if topk <= 0:
+            return []
+
+        # 堆元素为 (score, -index, record)，堆顶是当前最差的结果
+        heap: List[Tuple[float, int, QuestionRecord]] = []
+        query_len = len(query_norm)
+        query_set_len = len(query_chars)
+        pruned = 0
+
+        for index, record in enumerate(corpus.records):
+            floor = heap[0][0] if len(heap) >= topk else None
+
+            if not query_norm or not record.norm:
+                score = 0.0
+            else:
+                b_len = len(record.norm)
+                ratio_bound = 2.0 * min(query_len, b_len) / (query_len + b_len)
+
+                # 第一层：仅依赖长度的 O(1) 上界
+                b_set_len = len(record.chars)
+                max_set_len = max(query_set_len, b_set_len)
+                jacc_bound = (
+                    min(query_set_len, b_set_len) / max_set_len if max_set_len else 0.0
+                )
+                bound = 0.7 * ratio_bound + 0.3 * jacc_bound + 0.15
+                if bound < threshold or (floor is not None and bound <= floor):
+                    pruned += 1
+                    continue
+
+                # 第二层：精确的 Jaccard 系数和包含加分
+                inter = len(query_chars & record.chars)
+                union = query_set_len + b_set_len - inter
+                jacc = (inter / union) if union else 0.0
+                contain_bonus = 0.0
+                if query_norm in record.norm or record.norm in query_norm:
+                    contain_bonus = 0.15
+                bound = 0.7 * ratio_bound + 0.3 * jacc + contain_bonus
+                if bound < threshold or (floor is not None and bound <= floor):
+                    pruned += 1
+                    continue
+
+                ratio = SequenceMatcher(None, query_norm, record.norm).ratio()
+                score = min(0.7 * ratio + 0.3 * jacc + contain_bonus, 1.0)
+
+            if score < threshold:
+                continue
+            if floor is None:
+                heapq.heappush(heap, (score, -index, record))
+            elif score > floor:
+                heapq.heapreplace(heap, (score, -index, record))
+
+        logger.debug(
+            f"相似度计算完成，共 {len(corpus.records)} 道题目，上界剪枝 {pruned} 道"
+        )
+        heap.sort(key=lambda item: (-item[0], -item[1]))
+        return [(score, record) for score, _, record in heap]
+
     def search_questions(
         self, query: str, topk: int = 3, threshold: float = 0.55
     ) -> List[Dict[str, Any]]:
@@ -129,63 +356,213 @@ class QuestionSearchService:
             f"开始搜索题目，关键词: {query}, topk: {topk}, threshold: {threshold}"
         )
 
-        session = None
         try:
-            session = self._get_db_session()
+            corpus = self.get_corpus()
 
-            # 查询所有题目
-            questions = session.query(Question).all()
-            logger.debug(f"从数据库加载了 {len(questions)} 道题目")
+            # 查询文本只标准化一次，结果只取决于标准化后的查询
+            query_norm = self.normalize_text(query) if query else ""
+            cache_key = (query_norm, topk, threshold, corpus.version)
+            cached = self._result_cache.get(cache_key)
+            if cached is not None:
+                logger.info(f"命中搜索结果缓存，返回 {len(cached)} 个结果")
+                return list(cached)
 
-            # 计算相似度并筛选
-            results: List[Tuple[float, Question]] = []
-            for question in questions:
-                question_text = (question.question or "").strip()
-                score = self.similarity(query, question_text)
-                if score >= threshold:
-                    results.append((score, question))
-
-            # 按相似度排序并取前topk个
-            results.sort(key=lambda x: x[0], reverse=True)
-            results = results[:topk]
-
-            # 构建返回结果
-            formatted_results = []
-            for score, question in results:
-                question_data = {
-                    "type": question.type,
-                    "question": question.question,
-                    "optionA": question.optionA,
-                    "optionB": question.optionB,
-                    "optionC": question.optionC,
-                    "optionD": question.optionD,
-                    "optionAnswer": question.optionAnswer,
-                }
-
-                result_item = {
-                    "score": round(float(score), 6),
-                    "type": question.type,
-                    "question": question.question,
-                    "options": {
-                        k[-1]: question_data.get(k)
-                        for k in ["optionA", "optionB", "optionC", "optionD"]
-                        if question_data.get(k)
-                    },
-                    "answer": self.extract_answer_struct(question_data),
-                }
-                formatted_results.append(result_item)
+            query_chars = frozenset(self.char_set(query_norm))
+            results = self._rank(corpus, query_norm, query_chars, topk, threshold)
+
+            formatted_results = [
+                self._format_result(score, record) for score, record in results
+            ]
+            self._result_cache.set(cache_key, formatted_results)
 
             logger.info(f"搜索完成，返回 {len(formatted_results)} 个结果")
-            return formatted_results
+            return list(formatted_results)
 
         except Exception as e:
             logger.error(f"搜索题目时发生错误: {e}")
             raise
-        finally:
-            if session:
-                session.close()
-                logger.debug("题库数据库会话已关闭")
+
+    def _get_process_pool(self) -> ProcessPoolExecutor:
+        """
+        获取批量搜索进程池
+
+        子进程以 forkserver（不支持时为 spawn）方式启动，不继承服务进程中
+        其他线程持有的锁和已打开的数据库连接；每个子进程启动时各自加载一次语料。
+        子进程同样按数据库文件版本检查语料，文件变化后会自行重新加载。
+        """
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    start_method = (
+                        "forkserver"
+                        if "forkserver" in multiprocessing.get_all_start_methods()
+                        else "spawn"
+                    )
+                    self._pool = ProcessPoolExecutor(
+                        max_workers=BATCH_SEARCH_WORKERS,
+                        mp_context=multiprocessing.get_context(start_method),
+                        initializer=_init_search_worker,
+                    )
+                    logger.info(
+                        f"题库批量搜索进程池已创建，进程数: {BATCH_SEARCH_WORKERS}, "
+                        f"启动方式: {start_method}"
+                    )
+        return self._pool
+
+    def shutdown_pool(self) -> None:
+        """关闭批量搜索进程池"""
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+                logger.info("题库批量搜索进程池已关闭")
+
+    def search_questions_batch(
+        self, queries: List[str], topk: int = 3, threshold: float = 0.55
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        批量搜索相似题目，多条查询分片后交给进程池并行计算
+
+        Args:
+            queries: 搜索关键词列表
+            topk: 每条查询返回前k个结果
+            threshold: 相似度阈值
+
+        Returns:
+            List[List[Dict]]: 与 queries 顺序一致的搜索结果列表
+        """
+        logger.info(
+            f"开始批量搜索题目，查询数: {len(queries)}, topk: {topk}, threshold: {threshold}"
+        )
+
+        if len(queries) <= BATCH_INLINE_MAX_QUERIES or BATCH_SEARCH_WORKERS <= 1:
+            return [self.search_questions(q, topk, threshold) for q in queries]
+
+        # 已缓存的查询直接返回，只把未命中的查询交给进程池
+        corpus = self.get_corpus()
+        results: List[Optional[List[Dict[str, Any]]]] = []
+        pending: List[int] = []
+        cache_keys = [
+            (self.normalize_text(q) if q else "", topk, threshold, corpus.version)
+            for q in queries
+        ]
+        for i, cache_key in enumerate(cache_keys):
+            cached = self._result_cache.get(cache_key)
+            results.append(list(cached) if cached is not None else None)
+            if cached is None:
+                pending.append(i)
+
+        if pending:
+            pending_queries = [queries[i] for i in pending]
+            pool = self._get_process_pool()
+            chunk_count = min(BATCH_SEARCH_WORKERS, len(pending_queries))
+            chunk_size = -(-len(pending_queries) // chunk_count)
+            chunks = [
+                (pending_queries[i : i + chunk_size], topk, threshold)
+                for i in range(0, len(pending_queries), chunk_size)
+            ]
+
+            try:
+                computed: List[List[Dict[str, Any]]] = []
+                for chunk_results in pool.map(_search_chunk, chunks):
+                    computed.extend(chunk_results)
+            except Exception as e:
+                logger.error(f"批量搜索题目时发生错误: {e}")
+                raise
+
+            for i, result in zip(pending, computed):
+                self._result_cache.set(cache_keys[i], result)
+                results[i] = list(result)
+
+        logger.info(
+            f"批量搜索完成，共 {len(results)} 条查询，其中 {len(queries) - len(pending)} 条命中缓存"
+        )
+        return results  # type: ignore[return-value]
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """获取搜索结果缓存的命中统计"""
+        stats = self._result_cache.stats()
+        corpus = self._corpus
+        stats["corpus_size"] = len(corpus.records) if corpus else 0
+        return stats
+
+
+def _init_search_worker() -> None:
+    """进程池初始化：子进程启动时加载题库语料"""
+    question_search_service.get_corpus()
+
+
+def _search_chunk(
+    args: Tuple[List[str], int, float],
+) -> List[List[Dict[str, Any]]]:
+    """
+    进程池任务：在子进程中依次搜索一组查询
+
+    直接使用 _rank/_format_result 计算，不经过带结果缓存的 search_questions，
+    结果由父进程写入缓存。
+    """
+    queries, topk, threshold = args
+    service = question_search_service
+    corpus = service.get_corpus()
+    results = []
+    for query in queries:
+        query_norm = service.normalize_text(query) if query else ""
+        query_chars = frozenset(service.char_set(query_norm))
+        results.append(
+            [
+                service._format_result(score, record)
+                for score, record in service._rank(
+                    corpus, query_norm, query_chars, topk, threshold
+                )
+            ]
+        )
+    return results
 
 
 # 创建全局服务实例
 question_search_service = QuestionSearchService()
+
+
+if __name__ == "__main__":
+    # 基准测试：对比逐条 similarity() 与预处理语料两种实现（需要真实题库数据库）
+    import random
+    import sys
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    service = QuestionSearchService()
+    corpus = service.get_corpus()
+    samples = random.Random(0).sample(corpus.records, min(20, len(corpus.records)))
+    queries = [
+        record.question[: max(4, len(record.question) // 2)] for record in samples
+    ]
+
+    def legacy_search(query: str, topk: int = 3, threshold: float = 0.55):
+        session = service._get_db_session()
+        try:
+            scored = []
+            for question in session.query(Question).all():
+                score = service.similarity(query, (question.question or "").strip())
+                if score >= threshold:
+                    scored.append((score, question))
+            scored.sort(key=lambda x: x[0], reverse=True)
+            return [round(float(s), 6) for s, _ in scored[:topk]]
+        finally:
+            session.close()
+
+    for name, func in (
+        ("旧实现(逐条标准化)", legacy_search),
+        (
+            "新实现(预处理语料)",
+            lambda q: [r["score"] for r in service.search_questions(q)],
+        ),
+    ):
+        start = time.perf_counter()
+        outputs = [func(q) for q in queries]
+        elapsed = (time.perf_counter() - start) / len(queries) * 1000
+        print(f"{name}: {len(corpus.records)} 道题目，平均每次查询 {elapsed:.2f}ms")
+        if name.startswith("旧"):
+            expected = outputs
+        elif outputs != expected:
+            print("警告：新旧实现结果不一致")
@@ -0,0 +1,207 @@
+# app/services/graduation_progress.py
+from typing import Any, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+# 非百分制成绩中视为通过的等级
+PASSING_GRADE_LABELS = frozenset(
+    ("优秀", "良好", "中等", "及格", "合格", "通过", "优", "良", "中")
+)
+PASSING_SCORE = 60.0
+
+
+def _to_float(value: Any, default: float = 0.0) -> float:
+    """将教务系统中的数字字符串转换为浮点数，无法识别时返回默认值"""
+    try:
+        return float(str(value).strip() or default)
+    except (TypeError, ValueError):
+        return default
+
+
+def _normalize_code(course_code: Any) -> str:
+    """统一课程代码的大小写和空白，培养方案与成绩单中的写法不完全一致"""
+    return str(course_code or "").strip().upper()
+
+
+class GraduationProgressService:
+    """毕业进度计算：按课程代码关联培养方案与成绩单"""
+
+    @staticmethod
+    def is_passed(record: Dict[str, Any]) -> bool:
+        """判断一条成绩记录是否已通过（绩点大于0、百分制60分以上或合格等级）"""
+        if _to_float(record.get("gpa")) > 0:
+            return True
+        score = str(record.get("score", "")).strip()
+        if score in PASSING_GRADE_LABELS:
+            return True
+        return _to_float(score, -1.0) >= PASSING_SCORE
+
+    @staticmethod
+    def build_grade_index(
+        grades_data: List[Dict[str, Any]],
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        建立 课程代码 -> 最佳成绩记录 的hash索引，仅用于关联培养方案中的课程
+
+        培养方案只有课程代码，因此按规范化后的课程代码分组，同一课程的多条记录
+        优先保留已通过的，其次保留绩点最高的。绩点计算不使用该索引，见 _weighted_gpa。
+
+        Args:
+            grades_data: get_grades 返回的原始成绩列表
+
+        Returns:
+            dict: 课程代码到成绩记录的映射
+        """
+        index: Dict[str, Dict[str, Any]] = {}
+        for record in grades_data:
+            code = _normalize_code(record.get("courseCode"))
+            if not code:
+                continue
+            best = index.get(code)
+            if best is None or GraduationProgressService._rank(
+                record
+            ) > GraduationProgressService._rank(best):
+                index[code] = record
+        return index
+
+    @staticmethod
+    def _rank(record: Dict[str, Any]) -> Tuple[bool, float]:
+        """同一课程多条记录的优先级：已通过优先，其次绩点高"""
+        return GraduationProgressService.is_passed(record), _to_float(record.get("gpa"))
+
+    @staticmethod
+    def _weighted_gpa(grades_data: List[Dict[str, Any]]) -> Tuple[float, float]:
+        """
+        按 /grades 中 effective_gpa 的规则计算 (学分加权绩点总和, 总学分)
+
+        直接复用成绩接口的 _process_retakes 和 _calculate_total_gpa：
+        重修/补考按 (课程代码, 课程名称) 去重取最高绩点，绩点为空的记录按0计入，
+        保证 current_gpa 与 effective_gpa 一致。
+        """
+        from app.services.scraper import _calculate_total_gpa, _process_retakes
+
+        effective = _calculate_total_gpa(_process_retakes(grades_data))
+        total_credits = effective["total_credit"]
+        return effective["weighted_gpa"] * total_credits, total_credits
+
+    @staticmethod
+    def compute(
+        plan_data: Dict[str, Any],
+        grades_data: List[Dict[str, Any]],
+        assumed_grade_point: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """
+        计算毕业进度
+
+        成绩先建立hash索引，再对培养方案的模块和课程做一次遍历，
+        得到每个模块的学分缺口、未通过的课程以及预计毕业绩点。
+
+        Args:
+            plan_data: 培养方案数据（含 modules）
+            grades_data: 原始成绩列表
+            assumed_grade_point: 剩余学分的预计绩点，为None时按当前有效绩点估算
+
+        Returns:
+            dict: 精简的毕业进度结果
+        """
+        grade_index = GraduationProgressService.build_grade_index(grades_data)
+        matched_codes = set()
+
+        modules = []
+        total_required = 0.0
+        total_completed = 0.0
+        total_shortfall = 0.0
+        for module in plan_data.get("modules", []):
+            required = _to_float(module.get("required_credits"))
+            completed = _to_float(module.get("completed_credits"))
+            shortfall = round(max(required - completed, 0.0), 2)
+
+            earned = 0.0
+            passed_count = 0
+            remaining = []
+            for course in module.get("courses", []):
+                code = _normalize_code(course.get("course_code"))
+                record = grade_index.get(code)
+                if record is not None:
+                    matched_codes.add(code)
+                    if GraduationProgressService.is_passed(record):
+                        passed_count += 1
+                        earned += _to_float(
+                            record.get("credit"), _to_float(course.get("credits"))
+                        )
+                        continue
+                remaining.append(
+                    {
+                        "course_code": course.get("course_code", ""),
+                        "course_name": course.get("course_name", ""),
+                        "credits": _to_float(course.get("credits")),
+                        "semester": course.get("semester", ""),
+                        "failed": record is not None,
+                    }
+                )
+
+            modules.append(
+                {
+                    "module_name": module.get("module_name", ""),
+                    "required_credits": required,
+                    "completed_credits": completed,
+                    "earned_credits": round(earned, 2),
+                    "shortfall_credits": shortfall,
+                    "course_count": len(module.get("courses", [])),
+                    "passed_count": passed_count,
+                    # 学分已修满的模块（如选修模块）不再列出未修课程
+                    "remaining_courses": remaining if shortfall > 0 else [],
+                }
+            )
+            total_required += required
+            total_completed += completed
+            total_shortfall += shortfall
+
+        total_points, total_credits = GraduationProgressService._weighted_gpa(
+            grades_data
+        )
+        current_gpa = total_points / total_credits if total_credits > 0 else 0.0
+        if assumed_grade_point is None:
+            assumed_grade_point = current_gpa
+        projected_credits = total_credits + total_shortfall
+        projected_gpa = (
+            (total_points + total_shortfall * assumed_grade_point) / projected_credits
+            if projected_credits > 0
+            else 0.0
+        )
+
+        # 不属于培养方案任何模块的成绩（如跨专业选课）
+        unmatched = [
+            record for code, record in grade_index.items() if code not in matched_codes
+        ]
+
+        logger.debug(
+            f"毕业进度计算完成: 模块数={len(modules)}, 成绩数={len(grade_index)}, "
+            f"未匹配成绩数={len(unmatched)}"
+        )
+        return {
+            "modules": modules,
+            "summary": {
+                "required_credits": round(total_required, 2),
+                "completed_credits": round(total_completed, 2),
+                "shortfall_credits": round(total_shortfall, 2),
+                "incomplete_module_count": sum(
+                    1 for m in modules if m["shortfall_credits"] > 0
+                ),
+                "unmatched_grade_count": len(unmatched),
+                "unmatched_grade_credits": round(
+                    sum(
+                        _to_float(r.get("credit"))
+                        for r in unmatched
+                        if GraduationProgressService.is_passed(r)
+                    ),
+                    2,
+                ),
+            },
+            "gpa": {
+                "current_gpa": round(current_gpa, 3),
+                "graded_credits": round(total_credits, 1),
+                "assumed_grade_point": round(assumed_grade_point, 3),
+                "projected_gpa": round(projected_gpa, 3),
+            },
+        }
@@ -125,6 +125,35 @@ class SchedulerService:
         )
         return job
 
+    def add_token_revocation_compaction_job(self, interval_minutes: int = 60):
+        """
+        添加Token撤销记录清理定时任务
+
+        Args:
+            interval_minutes: 每多少分钟清理一次过期的撤销记录
+        """
+        from app.core.token_revocation import token_revocation_store
+
+        def compaction_job():
+            """清理过期的撤销记录并重建布隆过滤器"""
+            try:
+                deleted_count = token_revocation_store.compact()
+                logger.info(f"Token撤销记录清理完成，删除了 {deleted_count} 条过期记录")
+            except Exception as e:
+                logger.error(f"Token撤销记录清理任务执行失败: {e}")
+
+        job = self.add_job(
+            compaction_job,
+            trigger_type="interval",
+            minutes=interval_minutes,
+            id="token_revocation_compaction_job",
+        )
+
+        logger.info(
+            f"Token撤销记录清理定时任务已添加，每{interval_minutes}分钟执行一次"
+        )
+        return job
+
     def add_semester_update_job(self):
         """
         添加学期数据更新定时任务
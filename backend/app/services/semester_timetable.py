@@ -0,0 +1,456 @@
+# app/services/semester_timetable.py
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed, wait
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import requests
+from loguru import logger
+
+from app.db.database import get_session_by_hash
+from app.schemas.classtable import DayCourses
+from app.services.classtable import ClassTableService
+from app.utils.lru_cache import LRUCache
+from app.utils.term_calendar import TERM_WEEKS, term_calendar
+
+# 是否在登录/首次访问后后台预取整个学期的课程表
+CLASSTABLE_PREFETCH_ENABLED = (
+    os.getenv("CLASSTABLE_PREFETCH_ENABLED", "true").lower() == "true"
+)
+# 一个学期的教学周数
+CLASSTABLE_SEMESTER_WEEKS = TERM_WEEKS
+# 后台预取的最大并发请求数（所有学生共享）
+CLASSTABLE_PREFETCH_CONCURRENCY = int(os.getenv("CLASSTABLE_PREFETCH_CONCURRENCY", "3"))
+# 周课程表的新鲜期（秒），过期后先返回旧数据再在后台刷新
+CLASSTABLE_CACHE_TTL = int(os.getenv("CLASSTABLE_CACHE_TTL", "21600"))
+# 最多缓存多少名学生的学期课程表
+CLASSTABLE_CACHE_STUDENTS = int(os.getenv("CLASSTABLE_CACHE_STUDENTS", "1000"))
+# 学期课程表接口等待补齐缺失周的最长时间（秒），超时后返回已缓存的周
+CLASSTABLE_SEMESTER_FETCH_TIMEOUT = float(
+    os.getenv("CLASSTABLE_SEMESTER_FETCH_TIMEOUT", "20")
+)
+
+
+class WeekSnapshot:
+    """一周课程表的缓存快照"""
+
+    __slots__ = ("courses", "fetched_at", "digest")
+
+    def __init__(self, courses: Dict[str, DayCourses]):
+        self.courses = courses
+        self.fetched_at = time.monotonic()
+        # 课程内容摘要，内容不变的刷新不会改变学期快照的ETag
+        hasher = hashlib.sha1()
+        for day in courses.values():
+            hasher.update(day.model_dump_json().encode("utf-8"))
+        self.digest = hasher.hexdigest()
+
+    def is_stale(self) -> bool:
+        return time.monotonic() - self.fetched_at > CLASSTABLE_CACHE_TTL
+
+
+class StudentTimetable:
+    """单个学生的学期课程表缓存，周一日期 -> 周快照"""
+
+    __slots__ = ("term_start", "weeks", "inflight", "prefetched_term")
+
+    def __init__(self):
+        # 第1周周一，由教务系统页面上的周数推算
+        self.term_start: Optional[datetime] = None
+        self.weeks: Dict[str, WeekSnapshot] = {}
+        # 正在后台获取的周 -> 对应的后台任务
+        self.inflight: Dict[str, Future] = {}
+        # 已经安排过预取的学期（以第1周周一标识）
+        self.prefetched_term: Optional[datetime] = None
+
+
+class SemesterSnapshot:
+    """整个学期课程表的只读快照"""
+
+    __slots__ = ("term_start", "weeks", "digest", "pending", "_timetable")
+
+    def __init__(
+        self,
+        term_start: datetime,
+        weeks: List[Tuple[str, Dict[str, DayCourses]]],
+        digest: str,
+        pending: Optional[List[Tuple[str, Future]]] = None,
+        timetable: Optional[StudentTimetable] = None,
+    ):
+        self.term_start = term_start
+        # [(周一日期, 课程表)]，按周排序
+        self.weeks = weeks
+        # 由学期开始日期和各周内容摘要计算，用作ETag（仅在 pending 为空时完整）
+        self.digest = digest
+        # [(周一日期, 后台任务)]，创建快照时尚未获取到的周
+        self.pending = pending or []
+        self._timetable = timetable
+
+    def iter_weeks(self, timeout: float) -> Iterator[Tuple[str, Dict[str, DayCourses]]]:
+        """
+        先按周返回已缓存的课程表，再按完成顺序返回仍在获取的周
+
+        Args:
+            timeout: 等待仍在获取的周的最长总时间（秒），超时或获取失败的周被跳过
+
+        Yields:
+            Tuple[str, Dict[str, DayCourses]]: (周一日期, 课程表)
+        """
+        yield from self.weeks
+        if not self.pending:
+            return
+        futures = {future: monday for monday, future in self.pending}
+        try:
+            for future in as_completed(futures, timeout=timeout):
+                snapshot = self._timetable.weeks.get(futures[future])
+                if snapshot is not None:
+                    yield futures[future], snapshot.courses
+        except TimeoutError:
+            logger.warning(
+                f"等待学期课程表超时，{sum(not f.done() for f in futures)} 周被跳过"
+            )
+
+
+class SemesterTimetableEngine:
+    """
+    学期课程表引擎
+
+    首次访问（或登录）后在后台以有限并发拉取整个学期每一周的课程表并按学生缓存，
+    之后的按天/按周查询直接由缓存响应；过期的周在被访问时先返回旧数据，再在后台刷新。
+    """
+
+    def __init__(self):
+        self._cache = LRUCache(maxsize=CLASSTABLE_CACHE_STUDENTS)
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """获取（懒加载）后台预取线程池"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=max(1, CLASSTABLE_PREFETCH_CONCURRENCY),
+                    thread_name_prefix="classtable-prefetch",
+                )
+            return self._executor
+
+    def _get_timetable(self, student_id_hash: str) -> StudentTimetable:
+        """获取学生的学期课程表缓存，不存在时创建"""
+        with self._lock:
+            timetable = self._cache.get(student_id_hash)
+            if timetable is None:
+                timetable = StudentTimetable()
+                self._cache.set(student_id_hash, timetable)
+            return timetable
+
+    def _store_week(
+        self,
+        timetable: StudentTimetable,
+        monday: str,
+        week_number: Optional[int],
+        courses: Dict[str, DayCourses],
+        update_term: bool = True,
+    ) -> None:
+        """保存一周的课程表，并根据页面周数（或学期校历）更新学期开始日期"""
+        term_start = None
+        if update_term:
+            if week_number is not None:
+                monday_obj = datetime.strptime(monday, "%Y-%m-%d")
+                term_start = monday_obj - timedelta(weeks=week_number - 1)
+            else:
+                term_start = self._term_start_from_calendar(monday)
+
+        with self._lock:
+            timetable.weeks[monday] = WeekSnapshot(courses)
+            if term_start is not None:
+                timetable.term_start = term_start
+
+    @staticmethod
+    def _term_start_from_calendar(query_date: str) -> Optional[datetime]:
+        """从学期校历查询日期所在学期的第1周周一"""
+        term_week = term_calendar.lookup(query_date)
+        if term_week is None:
+            return None
+        start = term_calendar.get_term_start(term_week[0])
+        return datetime(start.year, start.month, start.day)
+
+    def get_week(
+        self, student_id_hash: str, session: requests.Session, query_date: str
+    ) -> Dict[str, DayCourses]:
+        """
+        获取指定日期所在周的课程表，优先使用缓存
+
+        Args:
+            student_id_hash: 学生ID的hash值
+            session: 已登录的教务系统session（缓存未命中时使用）
+            query_date: 查询日期 (YYYY-MM-DD)
+
+        Returns:
+            Dict[str, DayCourses]: 以日期为key的课程表数据
+        """
+        monday = ClassTableService.week_monday(query_date)
+        timetable = self._get_timetable(student_id_hash)
+
+        snapshot = timetable.weeks.get(monday)
+        if snapshot is not None:
+            if snapshot.is_stale():
+                logger.debug(
+                    f"用户 {student_id_hash} {monday} 所在周课程表已过期，后台刷新"
+                )
+                self._schedule_weeks(student_id_hash, [monday])
+            else:
+                logger.debug(f"用户 {student_id_hash} {monday} 所在周课程表命中缓存")
+            return snapshot.courses
+
+        week_number, courses = ClassTableService.fetch_week(
+            session, query_date, student_id_hash
+        )
+        self._store_week(timetable, monday, week_number, courses)
+        self._schedule_semester(student_id_hash, timetable)
+        return courses
+
+    def get_semester(
+        self,
+        student_id_hash: str,
+        session: requests.Session,
+        anchor_date: Optional[str] = None,
+        wait_missing: bool = True,
+    ) -> SemesterSnapshot:
+        """
+        获取 anchor_date 所在学期全部周的课程表快照
+
+        缓存中缺少的周由后台线程池（有限并发）补齐。wait_missing 为True时最多等待
+        CLASSTABLE_SEMESTER_FETCH_TIMEOUT 秒，获取失败或超时的周会被跳过；
+        为False时不等待，快照只包含已缓存的周，其余周的后台任务放在 pending 中，
+        可通过 iter_weeks 边获取边消费。
+
+        Args:
+            student_id_hash: 学生ID的hash值
+            session: 已登录的教务系统session（只用于当前线程获取锚点周）
+            anchor_date: 用于确定学期的日期，默认今天
+            wait_missing: 是否等待缺少的周获取完成
+
+        Returns:
+            SemesterSnapshot: 学期课程表快照
+        """
+        anchor_date = anchor_date or datetime.now().strftime("%Y-%m-%d")
+        self.get_week(student_id_hash, session, anchor_date)
+        timetable = self._get_timetable(student_id_hash)
+        term_start, mondays = self._term_mondays(timetable, anchor_date)
+
+        missing = [m for m in mondays if m not in timetable.weeks]
+        pending: List[Tuple[str, Future]] = []
+        if missing:
+            logger.info(
+                f"补齐用户 {student_id_hash} 的学期课程表，缺少 {len(missing)} 周"
+            )
+            # 与后台预取共用任务：各任务按hash加载自己的session，已在获取的周直接等待
+            futures = self._schedule_weeks(student_id_hash, missing)
+            if wait_missing:
+                _, not_done = wait(futures, timeout=CLASSTABLE_SEMESTER_FETCH_TIMEOUT)
+                if not_done:
+                    logger.warning(
+                        f"补齐用户 {student_id_hash} 的学期课程表超时，"
+                        f"{len(not_done)} 周将在后台继续获取"
+                    )
+            else:
+                pending = list(zip(missing, futures))
+
+        return self._build_snapshot(timetable, term_start, mondays, pending)
+
+    def peek_semester(
+        self, student_id_hash: str, anchor_date: Optional[str] = None
+    ) -> Optional[SemesterSnapshot]:
+        """
+        只从缓存获取学期课程表快照，不访问教务系统
+
+        锚点周已缓存且未过期、学期内每一周都已缓存时返回完整快照（与 get_semester
+        此时的结果相同），否则返回None，由调用方加载session后调用 get_semester。
+
+        Args:
+            student_id_hash: 学生ID的hash值
+            anchor_date: 用于确定学期的日期，默认今天
+
+        Returns:
+            Optional[SemesterSnapshot]: 完整的学期课程表快照
+        """
+        anchor_date = anchor_date or datetime.now().strftime("%Y-%m-%d")
+        with self._lock:
+            timetable = self._cache.get(student_id_hash)
+        if timetable is None:
+            return None
+        anchor = timetable.weeks.get(ClassTableService.week_monday(anchor_date))
+        if anchor is None or anchor.is_stale():
+            return None
+        term_start, mondays = self._term_mondays(timetable, anchor_date)
+        if any(monday not in timetable.weeks for monday in mondays):
+            return None
+        return self._build_snapshot(timetable, term_start, mondays, [])
+
+    def _term_mondays(
+        self, timetable: StudentTimetable, anchor_date: str
+    ) -> Tuple[datetime, List[str]]:
+        """确定 anchor_date 所在学期的第1周周一及各周周一日期"""
+        with self._lock:
+            term_start = timetable.term_start
+        if term_start is None:
+            term_start = self._term_start_from_calendar(anchor_date)
+        if term_start is None:
+            term_start = datetime.strptime(
+                ClassTableService.week_monday(anchor_date), "%Y-%m-%d"
+            )
+        mondays = [
+            (term_start + timedelta(weeks=i)).strftime("%Y-%m-%d")
+            for i in range(CLASSTABLE_SEMESTER_WEEKS)
+        ]
+        return term_start, mondays
+
+    @staticmethod
+    def _build_snapshot(
+        timetable: StudentTimetable,
+        term_start: datetime,
+        mondays: List[str],
+        pending: List[Tuple[str, Future]],
+    ) -> SemesterSnapshot:
+        """由已缓存的周生成学期快照，pending 中的周不计入快照和摘要"""
+        pending_mondays = {monday for monday, _ in pending}
+        weeks = []
+        hasher = hashlib.sha1(term_start.strftime("%Y-%m-%d").encode("utf-8"))
+        for monday in mondays:
+            snapshot = timetable.weeks.get(monday)
+            if snapshot is None or monday in pending_mondays:
+                continue
+            weeks.append((monday, snapshot.courses))
+            hasher.update(f"{monday}:{snapshot.digest}".encode("utf-8"))
+        return SemesterSnapshot(
+            term_start, weeks, hasher.hexdigest(), pending, timetable
+        )
+
+    def schedule_prefetch(
+        self, student_id_hash: str, anchor_date: Optional[str] = None
+    ) -> None:
+        """
+        安排后台预取学生整个学期的课程表（用于登录成功后）
+
+        先获取 anchor_date 所在周以确定学期开始日期，再预取其余各周。
+
+        Args:
+            student_id_hash: 学生ID的hash值
+            anchor_date: 用于推算学期的日期，默认今天
+        """
+        if not CLASSTABLE_PREFETCH_ENABLED:
+            return
+        anchor_date = anchor_date or datetime.now().strftime("%Y-%m-%d")
+        monday = ClassTableService.week_monday(anchor_date)
+        timetable = self._get_timetable(student_id_hash)
+        if monday in timetable.weeks:
+            self._schedule_semester(student_id_hash, timetable)
+        else:
+            self._schedule_weeks(student_id_hash, [monday], then_prefetch=True)
+
+    def _schedule_semester(
+        self, student_id_hash: str, timetable: StudentTimetable
+    ) -> None:
+        """学期开始日期已知时，安排预取学期内尚未缓存的各周"""
+        if not CLASSTABLE_PREFETCH_ENABLED:
+            return
+        with self._lock:
+            term_start = timetable.term_start
+            if term_start is None or timetable.prefetched_term == term_start:
+                return
+            timetable.prefetched_term = term_start
+            mondays = [
+                (term_start + timedelta(weeks=i)).strftime("%Y-%m-%d")
+                for i in range(CLASSTABLE_SEMESTER_WEEKS)
+            ]
+            missing = [m for m in mondays if m not in timetable.weeks]
+
+        if missing:
+            logger.info(
+                f"开始后台预取用户 {student_id_hash} 的学期课程表，共 {len(missing)} 周"
+            )
+            self._schedule_weeks(student_id_hash, missing)
+
+    def _schedule_weeks(
+        self, student_id_hash: str, mondays: List[str], then_prefetch: bool = False
+    ) -> List[Future]:
+        """
+        将需要获取的周提交到后台线程池，同一周不会重复排队
+
+        Returns:
+            List[Future]: 这些周对应的后台任务（包括此前已在进行的）
+        """
+        timetable = self._get_timetable(student_id_hash)
+        executor = self._get_executor()
+        futures = []
+        for monday in mondays:
+            with self._lock:
+                future = timetable.inflight.get(monday)
+                if future is None:
+                    try:
+                        future = executor.submit(
+                            self._fetch_week_job, student_id_hash, monday, then_prefetch
+                        )
+                    except RuntimeError as e:
+                        # 线程池已关闭（应用正在退出）
+                        logger.warning(f"提交课程表预取任务失败: {e}")
+                        break
+                    # 任务结束时需要获取同一把锁才能移除自己，因此不会早于这里登记
+                    timetable.inflight[monday] = future
+            futures.append(future)
+        return futures
+
+    def _fetch_week_job(
+        self, student_id_hash: str, monday: str, then_prefetch: bool
+    ) -> None:
+        """后台任务：获取一周课程表并写入缓存"""
+        timetable = self._get_timetable(student_id_hash)
+        try:
+            # 后台线程不能复用请求中的session，按hash重新加载
+            session = get_session_by_hash(student_id_hash)
+            if session is None:
+                logger.warning(
+                    f"用户 {student_id_hash} 的session不存在，跳过课程表预取"
+                )
+                return
+            try:
+                week_number, courses = ClassTableService.fetch_week(
+                    session, monday, student_id_hash
+                )
+            finally:
+                session.close()
+            # 假期等页面缺少周数时会回退为第1周，只有锚点周用于推算学期，避免连锁预取
+            self._store_week(
+                timetable, monday, week_number, courses, update_term=then_prefetch
+            )
+            if then_prefetch:
+                self._schedule_semester(student_id_hash, timetable)
+        except Exception as e:
+            logger.warning(
+                f"后台获取用户 {student_id_hash} {monday} 所在周课程表失败: {e}"
+            )
+        finally:
+            with self._lock:
+                timetable.inflight.pop(monday, None)
+
+    def invalidate(self, student_id_hash: str) -> None:
+        """清除学生的学期课程表缓存（登出时调用）"""
+        self._cache.pop(student_id_hash)
+
+    def get_stats(self) -> dict:
+        """获取缓存统计"""
+        return self._cache.stats()
+
+    def shutdown(self) -> None:
+        """关闭后台预取线程池，丢弃尚未开始的任务"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+# 全局学期课程表引擎实例
+semester_timetable = SemesterTimetableEngine()
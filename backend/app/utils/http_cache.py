@@ -0,0 +1,96 @@
+# app/utils/http_cache.py
+
+import hashlib
+import os
+from typing import Any, Callable, Optional, Tuple
+from fastapi import Request, Response
+from loguru import logger
+from app.utils.lru_cache import LRUCache
+
+# 静态数据集接口的默认缓存时间（秒）
+HTTP_CACHE_MAX_AGE = int(os.getenv("HTTP_CACHE_MAX_AGE", "3600"))
+# 进程内响应缓存容量
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1024"))
+
+
+def make_etag(*parts: Any) -> str:
+    """根据数据集版本和查询参数计算强ETag"""
+    digest = hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()
+    return f'"{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """判断 If-None-Match 请求头是否命中当前ETag（弱比较）"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    if etag.startswith("W/"):
+        etag = etag[2:]
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+class CachedJSONResponder:
+    """
+    纯函数型JSON接口的HTTP缓存层
+
+    响应完全由数据集版本和查询参数决定，因此ETag可以在不调用服务的情况下算出：
+    If-None-Match 命中时直接返回304，否则优先使用进程内缓存的序列化结果。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        cache_control: str,
+        maxsize: int = RESPONSE_CACHE_SIZE,
+    ):
+        self.name = name
+        self.cache_control = cache_control
+        self.cache = LRUCache(maxsize=maxsize)
+
+    def respond(
+        self,
+        request: Request,
+        version: Any,
+        key: Tuple[Any, ...],
+        build: Callable[[], Tuple[bytes, bool]],
+    ) -> Response:
+        """
+        Args:
+            request: 当前请求（GET/HEAD 才处理条件请求）
+            version: 数据集版本
+            key: 查询参数
+            build: 生成响应体的函数，返回 (JSON字节串, 是否可缓存)
+
+        Returns:
+            Response: 200 或 304 响应
+        """
+        etag = make_etag(self.name, version, key)
+        headers = {"ETag": etag, "Cache-Control": self.cache_control}
+
+        if request.method in ("GET", "HEAD") and etag_matches(
+            request.headers.get("if-none-match"), etag
+        ):
+            logger.debug(f"{self.name} 条件请求命中，返回304")
+            return Response(status_code=304, headers=headers)
+
+        body = self.cache.get(etag)
+        if body is None:
+            body, cacheable = build()
+            if not cacheable:
+                return Response(content=body, media_type="application/json")
+            self.cache.set(etag, body)
+        else:
+            logger.debug(f"{self.name} 命中响应缓存")
+
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    def stats(self) -> dict:
+        """获取响应缓存统计"""
+        return self.cache.stats()
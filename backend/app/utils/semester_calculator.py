@@ -1,8 +1,9 @@
 # app/utils/semester_calculator.py
 
 import datetime
-from typing import Dict, Tuple
+from typing import Dict, Optional, Tuple
 from loguru import logger
+from app.utils.term_calendar import term_calendar
 
 
 class SemesterCalculator:
@@ -13,6 +14,7 @@ class SemesterCalculator:
         self.last_update_time: datetime.datetime = None
         self.current_year: int = None
         self.current_month: int = None
+        self.current_term: Optional[str] = None
         self.logger = logger
 
     def get_current_semester_info(self) -> Tuple[int, int]:
@@ -72,6 +74,31 @@ class SemesterCalculator:
 
         return total_semester
 
+    def get_current_term(self) -> Optional[str]:
+        """
+        从学期校历获取今天所在的学期代码
+
+        Returns:
+            str: 学期代码（如 2025-2026-1），今天不在已知学期内时返回None
+        """
+        term_week = term_calendar.lookup(datetime.date.today())
+        return term_week[0] if term_week else None
+
+    def calculate_semester_from_term(self, grade_year: int, term_code: str) -> int:
+        """
+        根据学期代码计算指定年级的学期数
+
+        Args:
+            grade_year: 年级年份 (如2022表示2022级)
+            term_code: 学期代码，如 2025-2026-1
+
+        Returns:
+            int: 当前学期数 (1-8)
+        """
+        start_year, _, term_no = term_code.split("-")
+        total_semester = (int(start_year) - grade_year) * 2 + int(term_no)
+        return min(max(total_semester, 1), 8)
+
     def generate_semester_data(self) -> Dict[int, int]:
         """
         生成所有年级的学期数据字典
@@ -80,14 +107,21 @@ class SemesterCalculator:
             dict: {年级年份: 当前学期数}
         """
         current_year, current_month = self.get_current_semester_info()
+        current_term = self.get_current_term()
         semester_dict = {}
 
         # 计算当年到前五年的数据 (包含当年，共6年)
         for i in range(6):
             grade_year = current_year - i
-            semester_num = self.calculate_semester_for_grade(
-                grade_year, current_year, current_month
-            )
+            if current_term:
+                # 学期校历已知时按真实学期计算，不再依赖月份划分
+                semester_num = self.calculate_semester_from_term(
+                    grade_year, current_term
+                )
+            else:
+                semester_num = self.calculate_semester_for_grade(
+                    grade_year, current_year, current_month
+                )
             semester_dict[grade_year] = semester_num
 
         return semester_dict
@@ -100,13 +134,15 @@ class SemesterCalculator:
             force_update: 是否强制更新
         """
         current_year, current_month = self.get_current_semester_info()
+        current_term = self.get_current_term()
 
-        # 检查是否需要更新 (月份或年份发生变化时才更新)
+        # 检查是否需要更新 (月份、年份或所在学期发生变化时才更新)
         if (
             not force_update
             and self.last_update_time
             and self.current_year == current_year
             and self.current_month == current_month
+            and self.current_term == current_term
         ):
             self.logger.debug("学期数据无需更新")
             return
@@ -123,6 +159,7 @@ class SemesterCalculator:
         self.last_update_time = datetime.datetime.now()
         self.current_year = current_year
         self.current_month = current_month
+        self.current_term = current_term
 
         # 记录更新结果
         self.logger.info("学期数据更新完成:")
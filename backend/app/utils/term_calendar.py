@@ -0,0 +1,134 @@
+# app/utils/term_calendar.py
+
+import datetime
+import os
+import threading
+from typing import Dict, Optional, Tuple
+from loguru import logger
+
+# 一个学期的教学周数
+TERM_WEEKS = int(os.getenv("CLASSTABLE_SEMESTER_WEEKS", "20"))
+
+
+class TermCalendar:
+    """
+    学期校历 - 记录各学期第1周的周一，提供日期到 (学期, 周数) 的查询
+
+    学期开始日期不是写死的，而是从教务系统课程表页面上的周数反推得到，
+    持久化在 sessions.db 中，重启后直接加载。查询使用按日期展开的字典，复杂度O(1)。
+    """
+
+    def __init__(self):
+        # 学期代码 -> 第1周周一
+        self.term_starts: Dict[str, datetime.date] = {}
+        # 日期序数 -> (学期代码, 周数)
+        self._day_index: Dict[int, Tuple[str, int]] = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+        self.logger = logger
+
+    @staticmethod
+    def term_code_for_start(start: datetime.date) -> str:
+        """
+        根据学期开始日期推算学期代码
+
+        Args:
+            start: 第1周周一
+
+        Returns:
+            str: 学期代码，如 2025-2026-1（秋季）、2024-2025-2（春季）
+        """
+        if start.month >= 8:
+            return f"{start.year}-{start.year + 1}-1"
+        return f"{start.year - 1}-{start.year}-2"
+
+    def _rebuild_index(self) -> None:
+        """按学期开始日期重建日期索引，较晚的学期覆盖重叠部分"""
+        day_index = {}
+        for term_code, start in sorted(self.term_starts.items(), key=lambda x: x[1]):
+            first_day = start.toordinal()
+            for offset in range(TERM_WEEKS * 7):
+                day_index[first_day + offset] = (term_code, offset // 7 + 1)
+        self._day_index = day_index
+
+    def _ensure_loaded(self) -> None:
+        """首次使用时从数据库加载已记录的学期"""
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            from app.db.database import get_term_calendar
+
+            for term_code, start_date in get_term_calendar().items():
+                try:
+                    self.term_starts[term_code] = datetime.datetime.strptime(
+                        start_date, "%Y-%m-%d"
+                    ).date()
+                except ValueError:
+                    self.logger.warning(
+                        f"忽略无效的学期校历记录: {term_code} {start_date}"
+                    )
+            self._rebuild_index()
+            self._loaded = True
+            self.logger.info(f"学期校历加载完成，共 {len(self.term_starts)} 个学期")
+
+    def learn(self, query_date: str, week_number: int) -> None:
+        """
+        根据教务系统页面上的周数记录学期开始日期
+
+        Args:
+            query_date: 查询日期 (YYYY-MM-DD)
+            week_number: 该日期所在的教学周
+        """
+        if week_number < 1 or week_number > TERM_WEEKS:
+            return
+        self._ensure_loaded()
+
+        date_obj = datetime.datetime.strptime(query_date, "%Y-%m-%d").date()
+        monday = date_obj - datetime.timedelta(days=date_obj.weekday())
+        start = monday - datetime.timedelta(weeks=week_number - 1)
+        term_code = self.term_code_for_start(start)
+
+        with self._lock:
+            if self.term_starts.get(term_code) == start:
+                return
+            self.term_starts[term_code] = start
+            self._rebuild_index()
+
+        self.logger.info(f"学期校历更新: {term_code} 第1周开始于 {start}")
+        try:
+            from app.db.database import save_term_start
+
+            save_term_start(term_code, start.strftime("%Y-%m-%d"))
+        except Exception as e:
+            self.logger.error(f"持久化学期校历失败: {e}")
+
+    def lookup(self, query_date) -> Optional[Tuple[str, int]]:
+        """
+        查询日期所在的学期和教学周
+
+        Args:
+            query_date: 日期，YYYY-MM-DD 字符串或 date 对象
+
+        Returns:
+            Tuple[str, int]: (学期代码, 周数)，不在任何已知学期内时返回None
+        """
+        self._ensure_loaded()
+        if isinstance(query_date, str):
+            query_date = datetime.datetime.strptime(query_date, "%Y-%m-%d").date()
+        return self._day_index.get(query_date.toordinal())
+
+    def get_term_start(self, term_code: str) -> Optional[datetime.date]:
+        """获取学期第1周的周一"""
+        self._ensure_loaded()
+        return self.term_starts.get(term_code)
+
+
+# 创建全局实例
+term_calendar = TermCalendar()
+
+
+def get_term_calendar() -> TermCalendar:
+    """获取学期校历实例"""
+    return term_calendar
@@ -0,0 +1,15 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# 测试从 backend 目录导入 app 包
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# 导入 app.db 时会创建数据库文件，测试使用临时目录，不在工作区留下 data/sessions.db
+os.environ.setdefault(
+    "DATABASE_PATH",
+    os.path.join(tempfile.mkdtemp(prefix="backend-tests-"), "sessions.db"),
+)
+
+FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures"
@@ -0,0 +1,274 @@
+"""
+培养方案页面的旧版解析器（BeautifulSoup）
+
+保留改写前的实现，用于校验 CoursePlanService._extract_course_plan_from_html
+（lxml单次遍历）与其输出一致，并做基准对比：
+
+    python tests/legacy_course_plan_parser.py tests/fixtures/course_plan/*.html
+"""
+
+import re
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Dict
+
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services.course_plan import CoursePlanService  # noqa: E402
+
+
+def extract_course_plan_bs4(html_content: str) -> Dict[str, Any]:
+    """
+    改写前基于BeautifulSoup的培养方案解析器，作为lxml解析器的参照实现
+
+    Args:
+        html_content: HTML内容字符串
+
+    Returns:
+        dict: 结构化的培养方案数据
+        {
+          "modules": [ ... ],
+          "incomplete_modules": [ ... ],
+          "module_course_counts": [ ... ]
+        }
+    """
+    soup = BeautifulSoup(html_content, "html.parser")
+
+    table = soup.find("table", {"id": "dataList"})
+    if not table:
+        return {"error": "未找到课程表格，可能是教务session过期，请重新登录"}
+
+    modules = []
+    current_module = None
+
+    rows = table.find_all("tr")  # type: ignore
+    for row in rows:
+        cells = row.find_all(["td", "th"])  # type: ignore
+
+        if len(cells) > 0:
+            first_cell = cells[0]
+            first_cell_text = first_cell.get_text().strip()
+
+            if (
+                first_cell.get("rowspan")  # type: ignore
+                and "(" in first_cell_text
+                and ("应修" in first_cell_text or "已修" in first_cell_text)
+            ):
+                module_match = re.match(
+                    r"(.+?)\s*\(应修\s*(\d+\.?\d*)\s*/\s*已修\s*(\d+\.?\d*)\)",
+                    first_cell_text,
+                )
+
+                if module_match:
+                    module_name = module_match.group(1)
+                    required_credits = float(module_match.group(2))
+                    completed_credits = float(module_match.group(3))
+
+                    current_module = {
+                        "module_name": module_name,
+                        "required_credits": required_credits,
+                        "completed_credits": completed_credits,
+                        "courses": [],
+                        "subtotal": None,
+                    }
+                    modules.append(current_module)
+
+        if len(cells) >= 12 and current_module is not None:
+            if cells[0].get_text().strip() == "小计":
+
+                def clean_text(text: str) -> str:
+                    return re.sub(r"&nbsp;|\s+", " ", text).strip()
+
+                subtotal_info = {
+                    "total_credits": clean_text(cells[1].get_text()),
+                    "hours": {
+                        "lecture": clean_text(cells[2].get_text()),
+                        "practice": clean_text(cells[3].get_text()),
+                        "seminar": clean_text(cells[4].get_text()),
+                        "experiment": clean_text(cells[5].get_text()),
+                        "design": clean_text(cells[6].get_text()),
+                        "computer": clean_text(cells[7].get_text()),
+                        "discussion": clean_text(cells[8].get_text()),
+                        "extracurricular": clean_text(cells[9].get_text()),
+                        "online": clean_text(cells[10].get_text()),
+                        "total": clean_text(cells[11].get_text()),
+                    },
+                }
+
+                current_module["subtotal"] = subtotal_info
+                continue
+
+        if len(cells) >= 12 and current_module is not None:
+            first_text = cells[0].get_text().strip() if len(cells) > 0 else ""
+            has_module_cell = cells[0].get("rowspan") is not None and (  # type: ignore
+                "应修" in first_text or "已修" in first_text
+            )
+
+            base_index = 2 if has_module_cell else 1
+
+            course_code = (
+                re.sub(r"&nbsp;", "", cells[base_index].get_text().strip())
+                if len(cells) > base_index
+                else ""
+            )
+            course_name = (
+                re.sub(r"&nbsp;", "", cells[base_index + 1].get_text().strip())
+                if len(cells) > base_index + 1
+                else ""
+            )
+
+            if (
+                course_code
+                and course_name
+                and course_name != "小计"
+                and cells[0].get_text().strip() != "小计"
+                and len(course_code) >= 3
+                and re.match(r"^[A-Za-z0-9]", course_code)
+            ):
+                completion_status = (
+                    cells[base_index + 2].get_text().strip()
+                    if len(cells) > base_index + 2
+                    else ""
+                )
+                course_nature = (
+                    cells[base_index + 3].get_text().strip()
+                    if len(cells) > base_index + 3
+                    else ""
+                )
+                course_attribute = (
+                    cells[base_index + 4].get_text().strip()
+                    if len(cells) > base_index + 4
+                    else ""
+                )
+                credits = (
+                    cells[base_index + 5].get_text().strip()
+                    if len(cells) > base_index + 5
+                    else ""
+                )
+
+                lecture_hours = (
+                    cells[base_index + 6].get_text().strip()
+                    if len(cells) > base_index + 6
+                    else "0"
+                )
+                practice_hours = (
+                    cells[base_index + 7].get_text().strip()
+                    if len(cells) > base_index + 7
+                    else "0"
+                )
+                seminar_hours = (
+                    cells[base_index + 8].get_text().strip()
+                    if len(cells) > base_index + 8
+                    else "0"
+                )
+                experiment_hours = (
+                    cells[base_index + 9].get_text().strip()
+                    if len(cells) > base_index + 9
+                    else "0"
+                )
+                design_hours = (
+                    cells[base_index + 10].get_text().strip()
+                    if len(cells) > base_index + 10
+                    else "0"
+                )
+                computer_hours = (
+                    cells[base_index + 11].get_text().strip()
+                    if len(cells) > base_index + 11
+                    else "0"
+                )
+                discussion_hours = (
+                    cells[base_index + 12].get_text().strip()
+                    if len(cells) > base_index + 12
+                    else "0"
+                )
+                extracurricular_hours = (
+                    cells[base_index + 13].get_text().strip()
+                    if len(cells) > base_index + 13
+                    else "0"
+                )
+                online_hours = (
+                    cells[base_index + 14].get_text().strip()
+                    if len(cells) > base_index + 14
+                    else "0"
+                )
+                total_hours = (
+                    cells[base_index + 15].get_text().strip()
+                    if len(cells) > base_index + 15
+                    else "0"
+                )
+                semester = (
+                    cells[base_index + 16].get_text().strip()
+                    if len(cells) > base_index + 16
+                    else ""
+                )
+
+                def clean_text(text: str) -> str:
+                    return re.sub(r"&nbsp;|\s+", " ", text).strip()
+
+                course = {
+                    "course_code": clean_text(course_code),
+                    "course_name": clean_text(course_name),
+                    "completion_status": (
+                        clean_text(completion_status) if completion_status else "未修"
+                    ),
+                    "course_nature": clean_text(course_nature),
+                    "course_attribute": clean_text(course_attribute),
+                    "credits": clean_text(credits),
+                    "hours": {
+                        "lecture": clean_text(lecture_hours),
+                        "practice": clean_text(practice_hours),
+                        "seminar": clean_text(seminar_hours),
+                        "experiment": clean_text(experiment_hours),
+                        "design": clean_text(design_hours),
+                        "computer": clean_text(computer_hours),
+                        "discussion": clean_text(discussion_hours),
+                        "extracurricular": clean_text(extracurricular_hours),
+                        "online": clean_text(online_hours),
+                        "total": clean_text(total_hours),
+                    },
+                    "semester": clean_text(semester),
+                }
+
+                current_module["courses"].append(course)
+
+    return CoursePlanService._build_plan_result(modules)
+
+
+if __name__ == "__main__":
+    from loguru import logger
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    if len(sys.argv) < 2:
+        print("用法: python tests/legacy_course_plan_parser.py <培养方案HTML文件>...")
+        sys.exit(1)
+
+    rounds = 20
+    for fixture in sys.argv[1:]:
+        content = Path(fixture).read_text(encoding="utf-8")
+
+        expected = extract_course_plan_bs4(content)
+        actual = CoursePlanService._extract_course_plan_from_html(content)
+        status = "一致" if actual == expected else "不一致"
+        print(f"{fixture}: {len(content)} 字节，新旧解析结果{status}")
+
+        for name, parser in (
+            ("旧实现(BeautifulSoup)", extract_course_plan_bs4),
+            ("新实现(lxml单次遍历)", CoursePlanService._extract_course_plan_from_html),
+        ):
+            start = time.perf_counter()
+            for _ in range(rounds):
+                parser(content)
+            elapsed = (time.perf_counter() - start) / rounds * 1000
+
+            tracemalloc.start()
+            parser(content)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            print(f"  {name}: 平均 {elapsed:.2f}ms，峰值内存 {peak / 1024:.0f}KB")
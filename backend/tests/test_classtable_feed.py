@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.db import database
+from app.services.classtable_ics import ClassTableCalendarService
+from app.services.semester_timetable import (
+    CLASSTABLE_SEMESTER_WEEKS,
+    SemesterTimetableEngine,
+)
+
+TERM_START = datetime(2025, 9, 1)
+
+
+@pytest.fixture(autouse=True)
+def feed_tokens_table():
+    database.init_db()
+    yield
+    db = database.SessionLocal()
+    try:
+        db.query(database.CalendarFeedToken).delete()
+        db.commit()
+    finally:
+        db.close()
+
+
+def test_feed_token_rotation_and_revocation():
+    first = ClassTableCalendarService.issue_feed_token("hash-a")
+    assert ClassTableCalendarService.resolve_feed_token(first) == "hash-a"
+
+    second = ClassTableCalendarService.issue_feed_token("hash-a")
+    assert ClassTableCalendarService.resolve_feed_token(first) is None
+    assert ClassTableCalendarService.resolve_feed_token(second) == "hash-a"
+
+    assert ClassTableCalendarService.revoke_feed_token("hash-a")
+    assert ClassTableCalendarService.resolve_feed_token(second) is None
+    assert not ClassTableCalendarService.revoke_feed_token("hash-a")
+
+
+def _store_term(engine: SemesterTimetableEngine, student_id_hash: str, weeks: int):
+    timetable = engine._get_timetable(student_id_hash)
+    for i in range(weeks):
+        monday = (TERM_START + timedelta(weeks=i)).strftime("%Y-%m-%d")
+        engine._store_week(timetable, monday, i + 1, {})
+
+
+def test_peek_semester_needs_every_week_cached():
+    engine = SemesterTimetableEngine()
+    assert engine.peek_semester("hash-a", "2025-09-17") is None
+
+    _store_term(engine, "hash-a", CLASSTABLE_SEMESTER_WEEKS - 1)
+    assert engine.peek_semester("hash-a", "2025-09-17") is None
+
+    _store_term(engine, "hash-a", CLASSTABLE_SEMESTER_WEEKS)
+    snapshot = engine.peek_semester("hash-a", "2025-09-17")
+    assert snapshot is not None
+    assert not snapshot.pending
+    assert len(snapshot.weeks) == CLASSTABLE_SEMESTER_WEEKS
+    # 与加载session后 get_semester 生成的快照摘要（ETag）相同
+    assert snapshot.digest == engine.get_semester("hash-a", None, "2025-09-17").digest
@@ -0,0 +1,66 @@
+import re
+
+import pytest
+from lxml import html as lxml_html
+
+from app.services.classtable import ClassTableService
+from conftest import FIXTURES_DIR
+
+WEEKDAY_MAP = {"一": 1, "二": 2, "三": 3, "四": 4, "五": 5, "六": 6, "日": 7}
+
+
+def _load_titles():
+    rows = []
+    for line in (
+        (FIXTURES_DIR / "classtable_titles.txt").read_text("utf-8").splitlines()
+    ):
+        if line and not line.startswith("#"):
+            rows.append(tuple(line.split("\t", 1)))
+    return rows
+
+
+def legacy_parse(course_name: str, title: str):
+    """改写前逐字段 re.search 的提取逻辑"""
+    credits_match = re.search(r"课程学分：([^<]+)", title)
+    property_match = re.search(r"课程属性：([^<]+)", title)
+    name_match = re.search(r"课程名称：([^<]+)", title)
+    time_match = re.search(r"上课时间：([^<]+)", title)
+    location_match = re.search(r"上课地点：([^<]+)", title)
+    class_match = re.search(r"课堂名称：([^<]+)", title)
+
+    day_of_week = 0
+    period = ""
+    if time_match:
+        time_info = time_match.group(1)
+        weekday_match = re.search(r"星期([一二三四五六日])", time_info)
+        if weekday_match:
+            day_of_week = WEEKDAY_MAP.get(weekday_match.group(1), 0)
+        period_match = re.search(r"\[([^\]]+)\]节", time_info)
+        if period_match:
+            period = period_match.group(1)
+
+    return (
+        name_match.group(1) if name_match else course_name,
+        credits_match.group(1) if credits_match else "",
+        property_match.group(1) if property_match else "",
+        time_match.group(1) if time_match else "",
+        location_match.group(1) if location_match else "",
+        class_match.group(1) if class_match else "",
+        day_of_week,
+        period,
+    )
+
+
+TITLES = _load_titles()
+
+
+@pytest.mark.parametrize(
+    "course_name,title", TITLES, ids=[course_name for course_name, _ in TITLES]
+)
+def test_title_fields_match_legacy_extraction(course_name, title):
+    element = lxml_html.fragment_fromstring("<p></p>")
+    element.text = course_name
+    element.set("title", title)
+    assert ClassTableService._parse_course_fields(element) == legacy_parse(
+        course_name, title
+    )
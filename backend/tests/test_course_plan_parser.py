@@ -0,0 +1,42 @@
+import pytest
+
+from app.services.course_plan import CoursePlanService
+from conftest import FIXTURES_DIR
+from legacy_course_plan_parser import extract_course_plan_bs4
+
+COURSE_PLAN_FIXTURES = sorted((FIXTURES_DIR / "course_plan").glob("*.html"))
+
+
+@pytest.mark.parametrize(
+    "fixture", COURSE_PLAN_FIXTURES, ids=[path.stem for path in COURSE_PLAN_FIXTURES]
+)
+def test_lxml_parser_matches_bs4(fixture):
+    content = fixture.read_text(encoding="utf-8")
+    assert CoursePlanService._extract_course_plan_from_html(
+        content
+    ) == extract_course_plan_bs4(content)
+
+
+def test_sample_page_structure():
+    content = (FIXTURES_DIR / "course_plan" / "topyfamx_sample.html").read_text(
+        encoding="utf-8"
+    )
+    result = CoursePlanService._extract_course_plan_from_html(content)
+    assert [m["module_name"] for m in result["modules"]] == [
+        "通识教育必修课",
+        "专业核心课",
+        "专业选修课",
+        "创新创业教育",
+    ]
+    assert [c["course_count"] for c in result["module_course_counts"]] == [5, 4, 2, 0]
+    first = result["modules"][0]["courses"][0]
+    assert first["course_code"] == "G0901001"
+    assert first["hours"]["total"] == "48"
+    assert result["modules"][1]["courses"][2]["completion_status"] == "未修"
+
+
+def test_session_expired_page():
+    content = (FIXTURES_DIR / "course_plan" / "session_expired.html").read_text(
+        encoding="utf-8"
+    )
+    assert "error" in CoursePlanService._extract_course_plan_from_html(content)
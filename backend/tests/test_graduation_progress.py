@@ -0,0 +1,85 @@
+import pytest
+
+from app.services.graduation_progress import GraduationProgressService
+
+# get_grades 所在模块在导入时加载验证码识别库
+scraper = pytest.importorskip("app.services.scraper", exc_type=ImportError)
+
+GRADE_HEADERS = ["序号", "开课学期", "课程编号", "课程名称", "成绩", "学分", "绩点"]
+TRANSCRIPT = [
+    ["1", "2023-2024-1", "B2103001", "数据结构", "55", "4", "0"],
+    # 重修后通过，effective_gpa 只保留绩点最高的一条
+    ["2", "2023-2024-2", "B2103001", "数据结构", "81", "4", "3.1"],
+    # 绩点为空的记录按0计入学分
+    ["3", "2023-2024-1", "G1201001", "军事理论", "合格", "2", ""],
+    ["4", "2023-2024-2", "G0901001", "思想道德与法治", "92", "3", "4.2"],
+    # 课程代码大小写与培养方案不同
+    ["5", "2024-2025-1", "x2103101", "Linux系统管理", "75", "2", "2.5"],
+]
+PLAN = {
+    "modules": [
+        {
+            "module_name": "专业核心课",
+            "required_credits": "10",
+            "completed_credits": "4",
+            "courses": [
+                {"course_code": "B2103001", "course_name": "数据结构", "credits": "4"},
+                {"course_code": "B2103002", "course_name": "操作系统", "credits": "3"},
+            ],
+        },
+        {
+            "module_name": "通识教育必修课",
+            "required_credits": "5",
+            "completed_credits": "5",
+            "courses": [
+                {"course_code": "G1201001", "course_name": "军事理论", "credits": "2"},
+                {
+                    "course_code": "G0901001",
+                    "course_name": "思想道德与法治",
+                    "credits": "3",
+                },
+            ],
+        },
+    ]
+}
+
+
+class _FakeResponse:
+    status_code = 200
+
+    def __init__(self, text):
+        self.text = text
+
+
+class _FakeSession:
+    """按教务系统成绩页面的表格结构返回固定成绩单"""
+
+    def post(self, *args, **kwargs):
+        header = "".join(f"<th>{name}</th>" for name in GRADE_HEADERS)
+        rows = "".join(
+            "<tr>" + "".join(f"<td>{cell}</td>" for cell in row) + "</tr>"
+            for row in TRANSCRIPT
+        )
+        return _FakeResponse(f'<table id="dataList"><tr>{header}</tr>{rows}</table>')
+
+
+def test_progress_gpa_matches_effective_gpa():
+    grades_result = scraper.get_grades(_FakeSession())
+    assert grades_result["success"]
+
+    progress = GraduationProgressService.compute(PLAN, grades_result["data"])
+
+    effective = grades_result["effective_gpa"]
+    assert progress["gpa"]["current_gpa"] == effective["weighted_gpa"]
+    assert progress["gpa"]["graded_credits"] == effective["total_credit"]
+
+
+def test_grade_index_joins_by_normalized_code():
+    grades_result = scraper.get_grades(_FakeSession())
+    progress = GraduationProgressService.compute(PLAN, grades_result["data"])
+
+    core, general = progress["modules"]
+    assert core["passed_count"] == 1
+    assert [c["course_code"] for c in core["remaining_courses"]] == ["B2103002"]
+    assert general["passed_count"] == 2
+    assert progress["summary"]["unmatched_grade_count"] == 1
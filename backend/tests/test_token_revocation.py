@@ -0,0 +1,62 @@
+import threading
+import time
+
+import pytest
+
+from app.core.token_revocation import TokenRevocationStore
+from app.db import database
+
+
+@pytest.fixture(autouse=True)
+def revoked_tokens_table():
+    database.init_db()
+    yield
+    db = database.SessionLocal()
+    try:
+        db.query(database.RevokedToken).delete()
+        db.commit()
+    finally:
+        db.close()
+
+
+def _expires_at() -> int:
+    return int(time.time()) + 3600
+
+
+def test_second_worker_sees_revocation_on_first_lookup():
+    first, second = TokenRevocationStore(), TokenRevocationStore()
+    first.revoke("jti-revoked", _expires_at())
+
+    assert second.is_revoked("jti-revoked")
+    assert not second.is_revoked("jti-active")
+
+
+def test_first_lookup_waits_for_concurrent_load():
+    first, second = TokenRevocationStore(), TokenRevocationStore()
+    first.revoke("jti-revoked", _expires_at())
+
+    # 模拟另一个请求正在加载过滤器，首次查询必须等待而不是读取空过滤器
+    second._lock.acquire()
+    timer = threading.Timer(0.2, second._lock.release)
+    timer.start()
+    try:
+        assert second.is_revoked("jti-revoked")
+    finally:
+        timer.join()
+
+
+def test_failed_load_falls_back_to_database(monkeypatch):
+    first, second = TokenRevocationStore(), TokenRevocationStore()
+    first.revoke("jti-revoked", _expires_at())
+
+    def locked(last_id):
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(database, "get_revoked_tokens_since", locked)
+    assert second.is_revoked("jti-revoked")
+    assert not second._last_rebuild
+
+    # 数据库恢复后下一次查询重新加载，不需要等待同步间隔
+    monkeypatch.undo()
+    assert second.is_revoked("jti-revoked")
+    assert second._last_rebuild